@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 
+from __future__ import annotations
+
 import argparse
 import asyncio
 import datetime as dt
+import fnmatch
+import functools
+import inspect
 import json
+import random
+import re
 import sys
-from typing import Any
+import time
+from pathlib import Path
+from typing import Any, Callable
 
 import websockets
 
@@ -66,19 +75,475 @@ def _event_assistant_message(message_id: str, text: str) -> dict[str, Any]:
     }
 
 
+def _event_response_failed(response_id: str, code: str, message: str) -> dict[str, Any]:
+    return {
+        "type": "response.failed",
+        "response": {"id": response_id, "error": {"code": code, "message": message}},
+    }
+
+
+def _event_response_incomplete(response_id: str, reason: str) -> dict[str, Any]:
+    return {
+        "type": "response.incomplete",
+        "response": {"id": response_id, "incomplete_details": {"reason": reason}, "usage": _default_usage()},
+    }
+
+
+def _event_output_text_delta(text: str) -> dict[str, Any]:
+    return {"type": "response.output_text.delta", "delta": text}
+
+
+def _event_output_item_added(item: dict[str, Any]) -> dict[str, Any]:
+    return {"type": "response.output_item.added", "item": item}
+
+
+def _event_output_item_done(item: dict[str, Any]) -> dict[str, Any]:
+    return {"type": "response.output_item.done", "item": item}
+
+
+def _event_reasoning_summary_part_added(summary_index: int) -> dict[str, Any]:
+    return {"type": "response.reasoning_summary_part.added", "summary_index": summary_index}
+
+
+def _event_reasoning_summary_delta(text: str, summary_index: int) -> dict[str, Any]:
+    return {"type": "response.reasoning_summary_text.delta", "delta": text, "summary_index": summary_index}
+
+
+def _reasoning_item(reasoning_id: str, summary: str | None) -> dict[str, Any]:
+    return {
+        "type": "reasoning",
+        "id": reasoning_id,
+        "summary": [] if summary is None else [{"type": "summary_text", "text": summary}],
+    }
+
+
 def _dump_json(payload: Any) -> str:
     return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
 
 
-def _print_request(prefix: str, payload: Any) -> None:
+# Scenarios script what the server replies to each request of a connection. A scenario file holds
+# one scenario, a list of them, or {"scenarios": [...]} (JSON, or YAML when PyYAML is installed):
+#
+#   {"name": "shell-then-done",
+#    "match": {"model": "gpt-5*"},
+#    "requests": [
+#      {"events": [{"created": "resp-1"},
+#                  {"function_call": {"call_id": "c1", "name": "shell_command", "arguments": {"command": "ls"}}},
+#                  {"done": {}}]},
+#      {"expect": {"input.-1.type": "function_call_output"},
+#       "events": [{"created": "resp-2"}, {"delta": "do"}, {"delta": "ne"},
+#                  {"message": "done"}, {"completed": "resp-2"}]}]}
+#
+# `match` and `expect` map dotted paths into the request JSON (list indexes allowed, negative ones
+# from the end) to glob patterns (strings) or exact values. A connection is bound to the first
+# scenario whose `match` accepts its first request; a scenario without `match` accepts any. Each
+# request consumes the next entry; `expect` mismatches are logged, not fatal. The connection is
+# closed after the last entry. Events are either raw Responses events (objects with a `type`) or
+# one of the shorthands in `_SHORTHAND_EVENTS`. Every event is serialized once, at load time.
+#
+# `{"stream": {...}}` emulates token streaming: an optional reasoning summary, then the assistant
+# message, each sent as output_item.added, deltas, and output_item.done with the full text:
+#
+#   {"stream": {"text": "...", "tokens_per_second": 200, "chunk_tokens": [1, 1, 2, 3],
+#               "jitter": 0.2, "reasoning": {"lorem_tokens": 60}}}
+#
+# `text`/`reasoning` are a string or {"lorem_tokens": N}; without `text`, 200 lorem tokens are sent.
+# A token is a word with its leading whitespace. Each delta carries `chunk_tokens` tokens (a fixed
+# count, or drawn per delta from a list; repeat values to weight them), and is due chunk/rate
+# seconds after the previous one, scaled by a uniform factor in [1 - jitter, 1 + jitter]. Chunking
+# is drawn once at load (`seed`, default 0); jitter is drawn per send. Sends are paced against the
+# stream's start, so the overall rate holds even when single sleeps overshoot.
+
+_SHORTHAND_EVENTS = ("created", "delta", "message", "function_call", "done", "completed", "failed", "incomplete", "stream")
+
+_LOREM_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore "
+    "magna aliqua ut enim ad minim veniam quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo "
+    "consequat duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur"
+).split()
+_TOKEN_RE = re.compile(r"\s*\S+|\s+$")
+
+DEFAULT_SCENARIO: dict[str, Any] = {
+    # Mirrors `codex-rs/core/tests/suite/agent_websocket.rs`: a function call, then the final answer
+    # once the tool output has been appended.
+    "name": "default",
+    "requests": [
+        {
+            "events": [
+                {"created": "resp-1"},
+                {"function_call": {"call_id": CALL_ID, "name": FUNCTION_NAME, "arguments": FUNCTION_ARGS_JSON}},
+                {"done": {}},
+            ]
+        },
+        {
+            "events": [
+                {"created": "resp-2"},
+                {"message": {"id": "msg-1", "text": ASSISTANT_TEXT}},
+                {"completed": "resp-2"},
+            ]
+        },
+    ],
+}
+
+
+def _default_scenario(stream_tps: float | None) -> dict[str, Any]:
+    if stream_tps is None:
+        return DEFAULT_SCENARIO
+    stream = {
+        "tokens_per_second": stream_tps,
+        "chunk_tokens": [1, 1, 1, 2, 2, 3, 4],
+        "jitter": 0.2,
+        "reasoning": {"lorem_tokens": 60},
+    }
+    answer = {"events": [{"created": "resp-2"}, {"stream": stream}, {"completed": "resp-2"}]}
+    return {**DEFAULT_SCENARIO, "requests": [DEFAULT_SCENARIO["requests"][0], answer]}
+
+
+# (seconds after the previous frame, jitter) per frame of a paced turn.
+Pauses = list[tuple[float, float]]
+
+
+class Scenario:
+    """A scripted conversation: which first requests it accepts and the frames sent per request."""
+
+    def __init__(
+        self,
+        name: str,
+        match: dict[str, Any],
+        turns: list[tuple[dict[str, Any], list[str]]],
+        pauses: list[Pauses | None] | None = None,
+    ) -> None:
+        self.name = name
+        self.match = match
+        # (expect, pre-serialized frames) per request.
+        self.turns = turns
+        # The same frames as UTF-8, for connections that can send bytes as text frames (--load).
+        self.encoded = [[frame.encode("utf-8") for frame in frames] for _expect, frames in turns]
+        # Per request: None when its frames go out back to back (no `stream` events).
+        self.pauses = pauses if pauses is not None else [None] * len(turns)
+
+    def matches(self, request: Any) -> bool:
+        return all(_field_matches(_request_field(request, path), want) for path, want in self.match.items())
+
+
+def _request_field(payload: Any, path: str) -> Any:
+    value = payload
+    for key in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list):
+            try:
+                value = value[int(key)]
+            except (ValueError, IndexError):
+                return None
+        else:
+            return None
+    return value
+
+
+def _field_matches(got: Any, want: Any) -> bool:
+    if isinstance(want, str):
+        return isinstance(got, str) and fnmatch.fnmatchcase(got, want)
+    return got == want
+
+
+def _mismatched_fields(request: Any, expected: dict[str, Any]) -> list[str]:
+    mismatched: list[str] = []
+    for path, want in expected.items():
+        got = _request_field(request, path)
+        if not _field_matches(got, want):
+            mismatched.append(f"{path}={_dump_json(got)} (expected {_dump_json(want)})")
+    return mismatched
+
+
+def _expand_event(spec: Any, where: str) -> dict[str, Any]:
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}: expected an event object, got {_dump_json(spec)}")
+    if "type" in spec:
+        return spec
+    if len(spec) != 1 or next(iter(spec)) not in _SHORTHAND_EVENTS:
+        raise ValueError(f"{where}: expected a raw event with `type` or one of {', '.join(_SHORTHAND_EVENTS)}")
+    kind, value = next(iter(spec.items()))
+    if kind == "created":
+        return _event_response_created(str(value))
+    if kind == "delta":
+        return _event_output_text_delta(str(value))
+    if kind == "message":
+        if isinstance(value, str):
+            value = {"text": value}
+        return _event_assistant_message(str(value.get("id", "msg-1")), str(value["text"]))
+    if kind == "function_call":
+        arguments = value.get("arguments", {})
+        if not isinstance(arguments, str):
+            arguments = _dump_json(arguments)
+        return _event_function_call(str(value["call_id"]), str(value["name"]), arguments)
+    if kind == "done":
+        event = _event_response_done()
+        if isinstance(value, dict) and "usage" in value:
+            event["response"]["usage"] = value["usage"]
+        return event
+    if kind == "completed":
+        if isinstance(value, str):
+            value = {"id": value}
+        event = _event_response_completed(str(value["id"]))
+        if "usage" in value:
+            event["response"]["usage"] = value["usage"]
+        return event
+    if kind == "failed":
+        return _event_response_failed(
+            str(value.get("id", "resp-failed")),
+            str(value.get("code", "server_error")),
+            str(value.get("message", "mock failure")),
+        )
+    if isinstance(value, str):
+        value = {"reason": value}
+    return _event_response_incomplete(str(value.get("id", "resp-incomplete")), str(value.get("reason", "max_output_tokens")))
+
+
+def _stream_text(value: Any, rng: random.Random, where: str) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and isinstance(value.get("lorem_tokens"), int):
+        words = [_LOREM_WORDS[rng.randrange(len(_LOREM_WORDS))] for _ in range(value["lorem_tokens"])]
+        return " ".join(words).capitalize() + "."
+    raise ValueError(f"{where}: expected a string or {{\"lorem_tokens\": N}}")
+
+
+def _chunk_text(text: str, chunk_tokens: Any, rng: random.Random) -> list[tuple[str, int]]:
+    """Split `text` into `(delta, tokens)` chunks."""
+    tokens = _TOKEN_RE.findall(text)
+    chunks: list[tuple[str, int]] = []
+    i = 0
+    while i < len(tokens):
+        n = chunk_tokens if isinstance(chunk_tokens, int) else rng.choice(chunk_tokens)
+        n = max(1, int(n))
+        chunks.append(("".join(tokens[i : i + n]), len(tokens[i : i + n])))
+        i += n
+    return chunks
+
+
+def _expand_stream(spec: Any, where: str) -> list[tuple[dict[str, Any], float, float]]:
+    """`(event, seconds after the previous event, jitter)` for a `stream` shorthand."""
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}: `stream` must be an object")
+    rng = random.Random(spec.get("seed", 0))
+    rate = float(spec.get("tokens_per_second", 50))
+    jitter = float(spec.get("jitter", 0.0))
+    chunk_tokens = spec.get("chunk_tokens", 1)
+    if rate <= 0 or not 0 <= jitter < 1:
+        raise ValueError(f"{where}: needs tokens_per_second > 0 and 0 <= jitter < 1")
+    if not (isinstance(chunk_tokens, int) or (isinstance(chunk_tokens, list) and chunk_tokens)):
+        raise ValueError(f"{where}: `chunk_tokens` must be a count or a non-empty list of counts")
+    message_id = str(spec.get("id", "msg-1"))
+    text = _stream_text(spec.get("text", {"lorem_tokens": 200}), rng, where)
+    events: list[tuple[dict[str, Any], float, float]] = []
+    if spec.get("reasoning") is not None:
+        reasoning_id = f"rs-{message_id}"
+        summary = _stream_text(spec["reasoning"], rng, where)
+        events.append((_event_output_item_added(_reasoning_item(reasoning_id, None)), 0.0, 0.0))
+        events.append((_event_reasoning_summary_part_added(0), 0.0, 0.0))
+        for delta, n in _chunk_text(summary, chunk_tokens, rng):
+            events.append((_event_reasoning_summary_delta(delta, 0), n / rate, jitter))
+        events.append((_event_output_item_done(_reasoning_item(reasoning_id, summary)), 0.0, 0.0))
+    message = _event_assistant_message(message_id, text)["item"]
+    events.append((_event_output_item_added({**message, "content": []}), 0.0, 0.0))
+    for delta, n in _chunk_text(text, chunk_tokens, rng):
+        events.append((_event_output_text_delta(delta), n / rate, jitter))
+    events.append((_event_output_item_done(message), 0.0, 0.0))
+    return events
+
+
+def _compile_scenario(spec: Any, where: str) -> Scenario:
+    if not isinstance(spec, dict) or not isinstance(spec.get("requests"), list) or not spec["requests"]:
+        raise ValueError(f"{where}: a scenario needs a non-empty `requests` list")
+    name = str(spec.get("name", where))
+    match = spec.get("match") or {}
+    if not isinstance(match, dict):
+        raise ValueError(f"{where}: `match` must be an object")
+    turns: list[tuple[dict[str, Any], list[str]]] = []
+    pauses: list[Pauses | None] = []
+    for i, turn in enumerate(spec["requests"], start=1):
+        turn_where = f"{where} ({name}) request {i}"
+        if not isinstance(turn, dict) or not isinstance(turn.get("events"), list):
+            raise ValueError(f"{turn_where}: expected an object with an `events` list")
+        expect = turn.get("expect") or {}
+        if not isinstance(expect, dict):
+            raise ValueError(f"{turn_where}: `expect` must be an object")
+        frames: list[str] = []
+        turn_pauses: Pauses = []
+        for j, ev in enumerate(turn["events"], start=1):
+            try:
+                if isinstance(ev, dict) and len(ev) == 1 and "stream" in ev:
+                    expanded = _expand_stream(ev["stream"], f"{turn_where} event {j}")
+                else:
+                    expanded = [(_expand_event(ev, f"{turn_where} event {j}"), 0.0, 0.0)]
+            except (AttributeError, KeyError, TypeError) as err:
+                raise ValueError(f"{turn_where} event {j}: malformed {_dump_json(ev)} ({err!r})") from None
+            for event, pause, jitter in expanded:
+                frames.append(_dump_json(event))
+                turn_pauses.append((pause, jitter))
+        turns.append((expect, frames))
+        pauses.append(turn_pauses if any(pause for pause, _jitter in turn_pauses) else None)
+    return Scenario(name, match, turns, pauses)
+
+
+def _read_scenario_file(path: Path) -> Any:
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{path}: YAML scenarios need the `PyYAML` package (or use JSON)") from None
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def load_scenarios(paths: list[Path]) -> list[Scenario]:
+    """Compile the scenario files (or directories of *.json/*.yaml/*.yml files), in order."""
+    files: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in (".json", ".yaml", ".yml")))
+        else:
+            files.append(path)
+    scenarios: list[Scenario] = []
+    for path in files:
+        data = _read_scenario_file(path)
+        if isinstance(data, dict) and "scenarios" in data:
+            data = data["scenarios"]
+        specs = data if isinstance(data, list) else [data]
+        scenarios.extend(_compile_scenario(spec, f"{path}[{i}]") for i, spec in enumerate(specs))
+    return scenarios
+
+
+def _select_scenario(scenarios: list[Scenario], request: Any) -> Scenario | None:
+    for scenario in scenarios:
+        if scenario.matches(request):
+            return scenario
+    return None
+
+
+def _format_request(prefix: str, payload: Any) -> str:
     pretty = json.dumps(payload, ensure_ascii=False, indent=2, sort_keys=True)
-    sys.stdout.write(f"{prefix} {_utc_iso()}\n{pretty}\n")
+    return f"{prefix} {_utc_iso()}\n{pretty}\n"
+
+
+def _write_stdout(text: str) -> None:
+    sys.stdout.write(text)
     sys.stdout.flush()
 
+
+class _QueuedLog:
+    """
+    --load logging: only every Nth connection is logged (none with N=0), and its lines go through
+    a bounded queue drained by one task that writes in batches off the event loop, so a slow
+    terminal never stalls the connections. Lines are dropped (and counted) when the queue is full.
+    """
+
+    def __init__(self, every: int, max_lines: int = 10_000) -> None:
+        self.every = every
+        self.dropped = 0
+        self._connections = 0
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_lines)
+
+    def for_connection(self) -> Callable[[str], None] | None:
+        self._connections += 1
+        if self.every <= 0 or self._connections % self.every:
+            return None
+        return self._put
+
+    def _put(self, text: str) -> None:
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await loop.run_in_executor(None, _write_stdout, "".join(batch))
+
+
+class _LoadStats:
+    """Connection and frame counters for --load, sampled by `_report_load`."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.connections = 0
+        self.active = 0
+        self.peak_active = 0
+        self.aborted = 0
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.peak_connection_rate = 0.0
+        self.peak_frame_rate = 0.0
+
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"[load] {self.connections} connections ({self.aborted} aborted by the client), "
+            f"{self.frames_sent} frames sent, {self.frames_received} received in {elapsed:.1f}s: "
+            f"avg {self.connections / elapsed:.1f} conn/s, {self.frames_sent / elapsed:.1f} frames/s; "
+            f"peak {self.peak_connection_rate:.1f} conn/s, {self.peak_frame_rate:.1f} frames/s, "
+            f"{self.peak_active} concurrent\n"
+        )
+
+
+async def _report_load(stats: _LoadStats, interval: float) -> None:
+    last_time = stats.started
+    last_connections = last_frames = 0
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        elapsed = max(now - last_time, 1e-9)
+        connection_rate = (stats.connections - last_connections) / elapsed
+        frame_rate = (stats.frames_sent - last_frames) / elapsed
+        stats.peak_connection_rate = max(stats.peak_connection_rate, connection_rate)
+        stats.peak_frame_rate = max(stats.peak_frame_rate, frame_rate)
+        last_time, last_connections, last_frames = now, stats.connections, stats.frames_sent
+        sys.stdout.write(
+            f"[load] {_utc_iso()} active={stats.active} peak={stats.peak_active} "
+            f"conn/s={connection_rate:.1f} frames/s={frame_rate:.1f}\n"
+        )
+        sys.stdout.flush()
+
+
+@functools.lru_cache(maxsize=None)
+def _sends_bytes_as_text(connection_type: type) -> bool:
+    """Whether `send(bytes, text=True)` is available (newer websockets) to skip per-send encoding."""
+    try:
+        return "text" in inspect.signature(connection_type.send).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _raise_open_file_limit() -> int | None:
+    """Raise the soft open-file limit to the hard limit (one descriptor per connection)."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: no RLIMIT_NOFILE.
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard if hard != resource.RLIM_INFINITY else max(soft, 1 << 20)
+    if soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
 async def _handle_connection(
     websocket: Any,
     *,
+    scenarios: list[Scenario],
     expected_path: str = PATH,
+    log: Callable[[str], None] | None = _write_stdout,
+    stats: _LoadStats | None = None,
 ) -> None:
     # websockets v15 exposes the request path here.
     path = getattr(getattr(websocket, "request", None), "path", None)
@@ -86,55 +551,115 @@ async def _handle_connection(
         # Older handler signatures could pass `path` separately; accept if unavailable.
         path = "(unknown)"
 
-    sys.stdout.write(f"[conn] {_utc_iso()} connected path={path}\n")
-    sys.stdout.flush()
+    if log is not None:
+        log(f"[conn] {_utc_iso()} connected path={path}\n")
 
     path_no_qs = path.split("?", 1)[0] if path != "(unknown)" else path
     if path_no_qs != "(unknown)" and path_no_qs != expected_path:
-        sys.stdout.write(f"[conn] {_utc_iso()} rejecting unexpected path (expected {expected_path})\n")
-        sys.stdout.flush()
+        if log is not None:
+            log(f"[conn] {_utc_iso()} rejecting unexpected path (expected {expected_path})\n")
         await websocket.close(code=1008, reason="unexpected websocket path")
         return
 
-    async def recv_json(label: str) -> Any:
+    async def recv_json(label: str, *, decode: bool) -> Any:
         msg = await websocket.recv()
+        if stats is not None:
+            stats.frames_received += 1
+        if not decode:
+            return None
         if isinstance(msg, bytes):
             payload = json.loads(msg.decode("utf-8"))
         else:
             payload = json.loads(msg)
-        _print_request(f"[{label}] recv", payload)
+        if log is not None:
+            log(_format_request(f"[{label}] recv", payload))
         return payload
 
-    async def send_event(ev: dict[str, Any]) -> None:
-        sys.stdout.write(f"[conn] {_utc_iso()} send {_dump_json(ev)}\n")
-        await websocket.send(_dump_json(ev))
-
-    # Request 1: provoke a function call (mirrors `codex-rs/core/tests/suite/agent_websocket.rs`).
-    await recv_json("req1")
-    await send_event(_event_response_created("resp-1"))
-    await send_event(_event_function_call(CALL_ID, FUNCTION_NAME, FUNCTION_ARGS_JSON))
-    await send_event(_event_response_done())
-
-    # Request 2: expect appended tool output; send final assistant message.
-    await recv_json("req2")
-    await send_event(_event_response_created("resp-2"))
-    await send_event(_event_assistant_message("msg-1", ASSISTANT_TEXT))
-    await send_event(_event_response_completed("resp-2"))
-
-    sys.stdout.write(f"[conn] {_utc_iso()} closing\n")
-    sys.stdout.flush()
+    # Pre-encoded frames skip the UTF-8 encoding websockets would otherwise do on every send.
+    encoded = stats is not None and _sends_bytes_as_text(type(websocket))
+    loop = asyncio.get_running_loop()
+    scenario: Scenario | None = None
+    turn = 0
+    while scenario is None or turn < len(scenario.turns):
+        # Unlogged requests are only decoded to pick the scenario; `expect` is only reported in logs.
+        request = await recv_json(f"req{turn + 1}", decode=scenario is None or log is not None)
+        if scenario is None:
+            scenario = _select_scenario(scenarios, request)
+            if scenario is None:
+                if log is not None:
+                    log(f"[conn] {_utc_iso()} no scenario matches the first request; closing\n")
+                await websocket.close(code=1008, reason="no matching mock scenario")
+                return
+            if log is not None:
+                log(f"[conn] {_utc_iso()} scenario {scenario.name}\n")
+        expect, frames = scenario.turns[turn]
+        if log is not None:
+            for mismatch in _mismatched_fields(request, expect):
+                log(f"[conn] {_utc_iso()} req{turn + 1} does not match the scenario: {mismatch}\n")
+        outgoing: list[Any] = scenario.encoded[turn] if encoded else frames
+        pauses = scenario.pauses[turn]
+        due = loop.time()
+        for i, data in enumerate(outgoing):
+            if pauses is not None:
+                pause, jitter = pauses[i]
+                if pause:
+                    due += pause * random.uniform(1 - jitter, 1 + jitter) if jitter else pause
+                    delay = due - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+            if log is not None:
+                # Logged as it goes out, so paced frames carry their actual send time.
+                log(f"[conn] {_utc_iso()} send {frames[i]}\n")
+            await (websocket.send(data, text=True) if encoded else websocket.send(data))
+        if stats is not None:
+            stats.frames_sent += len(frames)
+        turn += 1
+
+    if log is not None:
+        log(f"[conn] {_utc_iso()} closing\n")
     await websocket.close()
 
 
-async def _serve(port: int) -> int:
+async def _serve(port: int, scenarios: list[Scenario], load: argparse.Namespace | None = None) -> int:
+    stats = _LoadStats() if load is not None else None
+    queued_log = _QueuedLog(load.log_every) if load is not None else None
+
     async def handler(ws: Any) -> None:
+        if stats is None or queued_log is None:
+            try:
+                await _handle_connection(ws, scenarios=scenarios, expected_path=PATH)
+            except websockets.exceptions.ConnectionClosedOK:
+                pass
+            return
+        stats.connections += 1
+        stats.active += 1
+        stats.peak_active = max(stats.peak_active, stats.active)
         try:
-            await _handle_connection(ws, expected_path=PATH)
+            await _handle_connection(
+                ws,
+                scenarios=scenarios,
+                expected_path=PATH,
+                log=queued_log.for_connection(),
+                stats=stats,
+            )
         except websockets.exceptions.ConnectionClosedOK:
             return
+        except websockets.exceptions.ConnectionClosedError:
+            # Load generators drop connections abruptly; count them instead of logging tracebacks.
+            stats.aborted += 1
+        finally:
+            stats.active -= 1
+
+    serve_options: dict[str, Any] = {}
+    if load is not None:
+        serve_options = {"compression": None, "ping_interval": None, "backlog": load.backlog}
+        if load.write_limit is not None:
+            serve_options["write_limit"] = load.write_limit
+        if load.max_queue is not None:
+            serve_options["max_queue"] = load.max_queue
 
     try:
-        server = await websockets.serve(handler, HOST, port)
+        server = await websockets.serve(handler, HOST, port, **serve_options)
     except OSError as err:
         sys.stderr.write(f"[server] failed to bind ws://{HOST}:{port}: {err}\n")
         return 2
@@ -161,11 +686,32 @@ start codex with `codex --profile localapi_ws`
 """)
     sys.stdout.flush()
 
+    tasks: list[asyncio.Task[None]] = []
+    if stats is not None and queued_log is not None and load is not None:
+        sys.stdout.write(
+            f"[load] logging {f'every {load.log_every}th connection' if load.log_every > 0 else 'disabled'}, "
+            f"open file limit {_raise_open_file_limit() or 'unknown'}, report every {load.report_interval}s\n"
+        )
+        sys.stdout.flush()
+        tasks = [
+            asyncio.create_task(queued_log.run()),
+            asyncio.create_task(_report_load(stats, load.report_interval)),
+        ]
     try:
-        await asyncio.Future()
+        if load is not None and load.duration is not None:
+            await asyncio.sleep(load.duration)
+        else:
+            await asyncio.Future()
     finally:
         server.close()
         await server.wait_closed()
+        for task in tasks:
+            task.cancel()
+        if stats is not None and queued_log is not None:
+            if queued_log.dropped:
+                sys.stdout.write(f"[load] {queued_log.dropped} log lines dropped (queue full)\n")
+            sys.stdout.write(stats.summary())
+            sys.stdout.flush()
     return 0
 
 
@@ -183,10 +729,108 @@ def main() -> int:
         default=DEFAULT_PORT,
         help=f"Bind port (default: {DEFAULT_PORT}; use 0 for random free port).",
     )
+    parser.add_argument(
+        "--scenario",
+        type=Path,
+        action="append",
+        metavar="PATH",
+        help=(
+            "Scenario file, or directory of *.json/*.yaml/*.yml scenario files (repeatable; first match wins).\n"
+            "Default: the built-in function-call-then-answer flow. See the format notes in this script."
+        ),
+    )
+    parser.add_argument(
+        "--stream-tps",
+        type=float,
+        metavar="TPS",
+        help=(
+            "Built-in scenario only: stream the final answer (200 lorem tokens, after a 60-token reasoning\n"
+            "summary) as deltas at TPS tokens/sec, in 1-4 token chunks with 20%% jitter."
+        ),
+    )
+    parser.add_argument(
+        "--load",
+        action="store_true",
+        help=(
+            "Load-test mode for many concurrent clients: pre-encoded frames, no compression or pings,\n"
+            "sampled logging through an async queue, a raised open-file limit, and a periodic\n"
+            "connections/frames per second report (plus a summary on exit)."
+        ),
+    )
+    parser.add_argument(
+        "--log-every",
+        type=int,
+        default=0,
+        metavar="N",
+        help="With --load: log every Nth connection in full (default: 0, logging disabled).",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help="With --load: seconds between throughput reports (default: 5).",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        metavar="SECONDS",
+        help="With --load: stop after SECONDS and print the summary (default: run until Ctrl-C).",
+    )
+    parser.add_argument(
+        "--uvloop",
+        action="store_true",
+        help="Run on uvloop (requires the `uvloop` package).",
+    )
+    parser.add_argument(
+        "--write-limit",
+        type=int,
+        metavar="BYTES",
+        help="With --load: per-connection write buffer high-water mark (default: the websockets default).",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        metavar="N",
+        help="With --load: incoming frames buffered per connection (default: the websockets default).",
+    )
+    parser.add_argument(
+        "--backlog",
+        type=int,
+        default=4096,
+        metavar="N",
+        help="With --load: listen backlog for bursts of new connections (default: 4096).",
+    )
     args = parser.parse_args()
+    if not args.load and (
+        args.log_every or args.duration is not None or args.write_limit is not None or args.max_queue is not None
+    ):
+        parser.error("--log-every, --duration, --write-limit and --max-queue require --load")
+    if args.report_interval <= 0:
+        parser.error("--report-interval must be > 0")
+
+    run: Callable[[Any], int] = asyncio.run
+    if args.uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            sys.stderr.write("[server] --uvloop requires the `uvloop` package\n")
+            return 2
+        run = uvloop.run
+
+    if args.stream_tps is not None and (args.scenario or args.stream_tps <= 0):
+        parser.error("--stream-tps must be > 0 and only applies to the built-in scenario (use `stream` events in scenario files)")
+
+    try:
+        scenarios = load_scenarios(args.scenario) if args.scenario else [_compile_scenario(_default_scenario(args.stream_tps), "built-in")]
+    except (OSError, ValueError) as err:
+        sys.stderr.write(f"[server] invalid scenario: {err}\n")
+        return 2
+    if args.scenario:
+        sys.stdout.write(f"[server] loaded {len(scenarios)} scenarios\n")
 
     try:
-        return asyncio.run(_serve(args.port))
+        return run(_serve(args.port, scenarios, args if args.load else None))
     except KeyboardInterrupt:
         return 0
 
@@ -0,0 +1,328 @@
+"""Behaviour tests for mock_responses_websocket_server.py: scenarios served to a real WebSocket client."""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+import websockets
+
+import mock_responses_websocket_server as mock
+
+TERMINAL_EVENTS = ("response.done", "response.completed", "response.failed", "response.incomplete")
+
+
+def converse(
+    scenarios: list[mock.Scenario],
+    requests: list[dict[str, Any]],
+    *,
+    path: str = mock.PATH,
+) -> tuple[list[list[dict[str, Any]]], int | None]:
+    """Send `requests` on one connection; returns the events received per request and the close code."""
+
+    async def run() -> tuple[list[list[dict[str, Any]]], int | None]:
+        server = await websockets.serve(lambda ws: mock._handle_connection(ws, scenarios=scenarios), mock.HOST, 0)
+        port = server.sockets[0].getsockname()[1]
+        replies: list[list[dict[str, Any]]] = []
+        close_code: int | None = None
+        try:
+            async with websockets.connect(f"ws://{mock.HOST}:{port}{path}") as ws:
+                try:
+                    for request in requests:
+                        await ws.send(json.dumps(request))
+                        events: list[dict[str, Any]] = []
+                        replies.append(events)
+                        while not events or events[-1]["type"] not in TERMINAL_EVENTS:
+                            events.append(json.loads(await ws.recv()))
+                    await ws.recv()
+                except websockets.exceptions.ConnectionClosed as closed:
+                    close_code = closed.rcvd.code if closed.rcvd is not None else None
+        finally:
+            server.close()
+            await server.wait_closed()
+        return replies, close_code
+
+    return asyncio.run(run())
+
+
+def compile_scenario(spec: dict[str, Any]) -> mock.Scenario:
+    return mock._compile_scenario(spec, "test")
+
+
+def test_default_scenario_calls_a_tool_then_answers() -> None:
+    scenario = compile_scenario(mock.DEFAULT_SCENARIO)
+    replies, close_code = converse([scenario], [{"model": "gpt-5.2", "input": []}] * 2)
+    assert [[event["type"] for event in events] for events in replies] == [
+        ["response.created", "response.output_item.done", "response.done"],
+        ["response.created", "response.output_item.done", "response.completed"],
+    ]
+    call = replies[0][1]["item"]
+    assert (call["type"], call["call_id"], call["name"]) == ("function_call", mock.CALL_ID, mock.FUNCTION_NAME)
+    assert json.loads(call["arguments"]) == {"command": "echo websocket"}
+    assert replies[1][1]["item"]["content"] == [{"type": "output_text", "text": mock.ASSISTANT_TEXT}]
+    assert close_code == 1000
+
+
+def test_first_request_selects_the_scenario() -> None:
+    scenarios = [
+        compile_scenario({"name": "mini", "match": {"model": "*-mini"}, "requests": [{"events": [{"failed": {}}]}]}),
+        compile_scenario({
+            "name": "tagged",
+            "match": {"metadata.suite": "smoke", "input.-1.type": "message"},
+            "requests": [{"events": [{"created": "r"}, {"delta": "o"}, {"delta": "k"}, {"completed": "r"}]}],
+        }),
+    ]
+    replies, _code = converse(scenarios, [{"model": "gpt-5-mini"}])
+    assert replies[0][0]["response"]["error"]["code"] == "server_error"
+    request = {
+        "model": "gpt-5",
+        "metadata": {"suite": "smoke"},
+        "input": [{"type": "function_call"}, {"type": "message"}],
+    }
+    replies, _code = converse(scenarios, [request])
+    assert [event.get("delta") for event in replies[0] if event["type"] == "response.output_text.delta"] == ["o", "k"]
+    replies, close_code = converse(scenarios, [{"model": "gpt-5"}])
+    assert replies == [[]] and close_code == 1008
+
+
+def test_expect_mismatches_are_logged_not_fatal(capsys: pytest.CaptureFixture[str]) -> None:
+    scenario = compile_scenario({
+        "requests": [
+            {"events": [{"done": {}}]},
+            {"expect": {"input.-1.type": "function_call_output"}, "events": [{"incomplete": "max_output_tokens"}]},
+        ],
+    })
+    replies, _code = converse([scenario], [{"input": []}, {"input": [{"type": "message"}]}])
+    assert replies[1][0]["response"]["incomplete_details"] == {"reason": "max_output_tokens"}
+    mismatch = 'req2 does not match the scenario: input.-1.type="message" (expected "function_call_output")'
+    assert mismatch in capsys.readouterr().out
+
+
+def test_unexpected_path_is_rejected() -> None:
+    replies, close_code = converse([compile_scenario(mock.DEFAULT_SCENARIO)], [{}], path="/v1/other")
+    assert close_code == 1008
+
+
+def test_shorthands_expand_and_raw_events_pass_through() -> None:
+    raw = {"type": "response.output_text.done", "text": "x"}
+    scenario = compile_scenario({
+        "requests": [{
+            "events": [
+                raw,
+                {"function_call": {"call_id": "c", "name": "f", "arguments": {"a": 1}}},
+                {"message": {"id": "m", "text": "hi"}},
+                {"completed": {"id": "r", "usage": {"total_tokens": 3}}},
+            ],
+        }],
+    })
+    _expect, frames = scenario.turns[0]
+    events = [json.loads(frame) for frame in frames]
+    assert events[0] == raw
+    assert events[1]["item"]["arguments"] == '{"a":1}'
+    assert events[2]["item"]["id"] == "m"
+    assert events[3]["response"] == {"id": "r", "usage": {"total_tokens": 3}}
+
+
+@pytest.mark.parametrize(
+    ("spec", "message"),
+    [
+        ({"requests": []}, "non-empty `requests` list"),
+        ({"requests": [{"events": [{"shout": "x"}]}]}, "expected a raw event with `type`"),
+        ({"requests": [{"events": [{"function_call": {"name": "f"}}]}]}, "malformed"),
+        ({"match": "gpt-5", "requests": [{"events": []}]}, "`match` must be an object"),
+    ],
+)
+def test_invalid_scenarios_are_rejected(spec: dict[str, Any], message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        compile_scenario(spec)
+
+
+def test_scenario_files_and_directories_load_in_order(tmp_path: Path) -> None:
+    (tmp_path / "a.json").write_text(json.dumps({"scenarios": [{"name": "one", "requests": [{"events": []}]}]}))
+    (tmp_path / "b.yaml").write_text("- name: two\n  requests:\n    - events: [{created: r}]\n")
+    (tmp_path / "notes.txt").write_text("ignored\n")
+    (tmp_path / "c.json").write_text(json.dumps({"name": "three", "requests": [{"events": []}]}))
+    scenarios = mock.load_scenarios([tmp_path, tmp_path / "a.json"])
+    assert [s.name for s in scenarios] == ["one", "two", "three", "one"]
+    assert json.loads(scenarios[1].turns[0][1][0]) == {"type": "response.created", "response": {"id": "r"}}
+
+
+# --- Load mode (--load) --------------------------------------------------------------------------
+
+
+SCRIPT = Path(mock.__file__).resolve()
+
+
+def test_load_connections_send_pre_encoded_text_frames() -> None:
+    scenario = compile_scenario(mock.DEFAULT_SCENARIO)
+    stats = mock._LoadStats()
+
+    async def run() -> list[Any]:
+        async def handler(ws: Any) -> None:
+            await mock._handle_connection(ws, scenarios=[scenario], log=None, stats=stats)
+
+        async with websockets.serve(handler, mock.HOST, 0, compression=None) as server:
+            port = server.sockets[0].getsockname()[1]
+            async with websockets.connect(f"ws://{mock.HOST}:{port}{mock.PATH}") as ws:
+                frames: list[Any] = []
+                for _request in range(2):
+                    await ws.send(json.dumps({"model": "m"}))
+                    frames.extend([await ws.recv() for _frame in range(3)])
+                return frames
+
+    frames = asyncio.run(run())
+    assert mock._sends_bytes_as_text(websockets.asyncio.server.ServerConnection)
+    assert all(isinstance(frame, str) for frame in frames)
+    assert frames == [frame for _expect, turn in scenario.turns for frame in turn]
+    assert (stats.frames_sent, stats.frames_received) == (6, 2)
+
+
+def test_queued_log_samples_connections_and_drops_overflow(capsys: pytest.CaptureFixture[str]) -> None:
+    async def run() -> mock._QueuedLog:
+        log = mock._QueuedLog(every=3, max_lines=2)
+        writers = [log.for_connection() for _connection in range(7)]
+        assert [writer is not None for writer in writers] == [False, False, True, False, False, True, False]
+        writer = writers[2]
+        assert writer is not None
+        for line in ("a\n", "b\n", "c\n"):
+            writer(line)
+        drain = asyncio.create_task(log.run())
+        while not log._queue.empty():
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        drain.cancel()
+        return log
+
+    log = asyncio.run(run())
+    assert log.dropped == 1 and capsys.readouterr().out == "a\nb\n"
+    assert mock._QueuedLog(every=0).for_connection() is None
+
+
+def test_load_mode_reports_and_counts_aborted_clients() -> None:
+    proc = subprocess.Popen(
+        [sys.executable, str(SCRIPT), "--port", "0", "--load", "--duration", "2", "--report-interval", "0.5"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            m = re.search(r'base_url = "(ws://[^"]+)/v1"', line)
+            if m is not None:
+                uri = m.group(1) + mock.PATH
+                break
+
+        async def clients() -> None:
+            for _client in range(3):
+                async with websockets.connect(uri) as ws:
+                    for _request in range(2):
+                        await ws.send(json.dumps({"model": "m"}))
+                        for _frame in range(3):
+                            await ws.recv()
+            ws = await websockets.connect(uri)
+            await ws.send(json.dumps({"model": "m"}))
+            await ws.recv()
+            ws.transport.abort()
+
+        asyncio.run(clients())
+        out, err = proc.communicate(timeout=30)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.communicate()
+    assert proc.returncode == 0, err
+    assert re.search(r"\[load\] .* active=\d+ peak=\d+ conn/s=[\d.]+ frames/s=[\d.]+", out)
+    assert "[load] 4 connections (1 aborted by the client), 21 frames sent, 7 received" in out
+    assert "[conn]" not in out and "Traceback" not in err
+
+
+def test_load_options_require_load() -> None:
+    for args in (("--log-every", "2"), ("--duration", "1"), ("--max-queue", "4")):
+        result = subprocess.run([sys.executable, str(SCRIPT), *args], capture_output=True, text=True)
+        assert result.returncode == 2 and "require --load" in result.stderr
+
+
+# --- Token streaming (`stream` events, --stream-tps) ---------------------------------------------
+
+
+def stream_events(stream: dict[str, Any]) -> list[dict[str, Any]]:
+    scenario = compile_scenario({"requests": [{"events": [{"stream": stream}]}]})
+    return [json.loads(frame) for frame in scenario.turns[0][1]]
+
+
+def test_stream_sends_reasoning_then_message_as_deltas() -> None:
+    events = stream_events({"text": "Hello there, streaming world.", "chunk_tokens": 2, "reasoning": "Think it over"})
+    assert [event["type"] for event in events] == [
+        "response.output_item.added",
+        "response.reasoning_summary_part.added",
+        "response.reasoning_summary_text.delta",
+        "response.reasoning_summary_text.delta",
+        "response.output_item.done",
+        "response.output_item.added",
+        "response.output_text.delta",
+        "response.output_text.delta",
+        "response.output_item.done",
+    ]
+    assert [event["delta"] for event in events[2:4]] == ["Think it", " over"]
+    assert events[4]["item"]["summary"] == [{"type": "summary_text", "text": "Think it over"}]
+    assert [event["delta"] for event in events[6:8]] == ["Hello there,", " streaming world."]
+    assert events[5]["item"]["content"] == []
+    assert events[8]["item"]["content"] == [{"type": "output_text", "text": "Hello there, streaming world."}]
+
+
+def test_stream_chunking_is_seeded() -> None:
+    stream = {"text": {"lorem_tokens": 50}, "chunk_tokens": [1, 2, 3], "seed": 5}
+    events = stream_events(stream)
+    assert events == stream_events(stream) != stream_events({**stream, "seed": 6})
+    deltas = [event["delta"] for event in events if event["type"] == "response.output_text.delta"]
+    assert "".join(deltas) == events[-1]["item"]["content"][0]["text"]
+    assert len(events[-1]["item"]["content"][0]["text"].split()) == 50
+    assert {len(delta.split()) for delta in deltas} <= {1, 2, 3}
+
+
+def test_stream_is_paced_and_logged_as_sent(capsys: pytest.CaptureFixture[str]) -> None:
+    stream = {"text": " ".join(["tok"] * 10), "tokens_per_second": 50, "jitter": 0.1}
+    scenario = compile_scenario({"requests": [{"events": [{"created": "r"}, {"stream": stream}, {"completed": "r"}]}]})
+    assert scenario.pauses[0] is not None and sum(pause for pause, _jitter in scenario.pauses[0]) == pytest.approx(0.2)
+    started = time.monotonic()
+    replies, _code = converse([scenario], [{}])
+    assert time.monotonic() - started >= 0.18
+    assert sum(event["type"] == "response.output_text.delta" for event in replies[0]) == 10
+    sent = re.findall(r"^\[conn\] (\S+) send \{\"type\":\"response.output_text.delta\"", capsys.readouterr().out, re.M)
+    stamps = [dt.datetime.fromisoformat(stamp) for stamp in sent]
+    assert len(stamps) == 10 and (stamps[-1] - stamps[0]).total_seconds() >= 0.15
+
+
+@pytest.mark.parametrize(
+    ("stream", "message"),
+    [
+        ({"tokens_per_second": 0}, "tokens_per_second > 0"),
+        ({"jitter": 1}, "0 <= jitter < 1"),
+        ({"chunk_tokens": []}, "non-empty list of counts"),
+        ({"text": 3}, "expected a string or"),
+    ],
+)
+def test_invalid_streams_are_rejected(stream: dict[str, Any], message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        stream_events(stream)
+
+
+def test_stream_tps_applies_to_the_built_in_scenario(tmp_path: Path) -> None:
+    scenario = compile_scenario(mock._default_scenario(400.0))
+    answer = [json.loads(frame)["type"] for frame in scenario.turns[1][1]]
+    assert answer[0] == "response.created" and answer[-1] == "response.completed"
+    assert answer.count("response.output_text.delta") >= 200 // 4
+    assert scenario.pauses[0] is None and scenario.pauses[1] is not None
+    (tmp_path / "s.json").write_text(json.dumps(mock.DEFAULT_SCENARIO))
+    for args in (("--stream-tps", "0"), ("--stream-tps", "10", "--scenario", str(tmp_path / "s.json"))):
+        result = subprocess.run([sys.executable, str(SCRIPT), *args], capture_output=True, text=True)
+        assert result.returncode == 2 and "--stream-tps must be > 0" in result.stderr
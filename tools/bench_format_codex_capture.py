@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for format_codex_capture.py.
+
+Generates deterministic synthetic captures (see synthetic_capture.py), shaped like the
+requests/events JSONL that client.rs writes, and runs every formatter mode on them as a separate process, recording wall time and peak
+RSS per run. Results are printed as a table and can be written as JSON for tracking over time:
+
+    python tools/bench_format_codex_capture.py --scales 1e3,1e5,1e7 --json bench.json
+    python tools/bench_format_codex_capture.py --scales 1e5 --modes render,reports --baseline HEAD~1
+
+With --baseline REV the formatter as of that git revision is timed on the same captures (modes it
+does not support are reported as such) and its `render` Markdown must match byte for byte.
+`--generate DIR` only writes a capture, e.g. to reproduce a slow case by hand.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Iterator
+
+import codex_capture as cc
+import format_codex_capture as fcc
+from synthetic_capture import DEFAULT_TOOL_MIX, CaptureSpec, generate_capture, parse_tool_mix
+
+
+def parse_count(value: str) -> int:
+    # Accepts `100000` as well as `1e5`.
+    return int(float(value))
+
+
+# --- Benchmark runs -----------------------------------------------------------------------------
+
+# Formatter modes, as argument templates. Modes marked `warm_index` get an untimed run first so the
+# timed runs reuse the index sidecar instead of building it.
+MODES: dict[str, tuple[list[str], bool]] = {
+    "decode-full": ([], False),
+    "decode-selective": ([], False),
+    "render": (["--out-readable", "{out}/readable.md", "--out-simplified", "{out}/simplified.md"], False),
+    "render-delta": (
+        ["--delta-inputs", "--out-readable", "{out}/readable.md", "--out-simplified", "{out}/simplified.md"],
+        False,
+    ),
+    "render-jobs": (
+        ["--jobs", "{jobs}", "--index", "{out}/idx.json", "--out-readable", "{out}/readable.md", "--out-simplified", "{out}/simplified.md"],
+        True,
+    ),
+    "build-index": (["--build-index", "--index", "{out}/idx.json"], False),
+    "call": (
+        ["--call", "{mid}", "--index", "{out}/idx.json", "--out-readable", "{out}/readable.md", "--out-simplified", "{out}/simplified.md"],
+        True,
+    ),
+    "reports": (
+        ["--latency-report", "{out}/latency", "--tool-report", "{out}/tools", "--cache-report", "{out}/cache"],
+        False,
+    ),
+    "size-report": (["--size-report", "{out}/size"], False),
+    "token-ledger": (["--token-ledger", "{out}/ledger"], False),
+    # Diffs the capture against itself, so both sides are profiled.
+    "diff-report": (
+        ["--diff-report", "{out}/diff", "--baseline-requests", "{requests}", "--baseline-events", "{events}"],
+        False,
+    ),
+    "compact": (["--compact", "{out}/requests.cca"], False),
+    "trace": (["--trace", "{out}/trace.json"], False),
+    "join": (
+        ["--join", "conversation", "--out-readable", "{out}/readable.md", "--out-simplified", "{out}/simplified.md"],
+        False,
+    ),
+    # A selective filter: most calls are rejected on their request line or event-line prefixes.
+    "where": (
+        ["--where", "tool=apply_patch and duration>=2s", "--out-readable", "{out}/readable.md", "--out-simplified", "{out}/simplified.md"],
+        False,
+    ),
+    "fleet": (["--fleet", "{capture_dir}", "--fleet-report", "{out}/fleet", "--jobs", "{jobs}"], False),
+    # A full load into a fresh database; reruns append nothing, so each run starts from scratch.
+    "sqlite": (["--sqlite", "{out}/capture.db"], False),
+    "render-paged": (
+        ["--page-size", "1000", "--out-readable", "{out}/readable", "--out-simplified", "{out}/simplified.md"],
+        False,
+    ),
+    # Tails the finished capture and is interrupted once the last call is written: catch-up time.
+    "follow": (
+        ["--follow", "--follow-interval", "0.01", "--out-readable", "{out}/readable.md", "--out-simplified", "{out}/simplified.md"],
+        False,
+    ),
+}
+DECODE_MODES = ("decode-full", "decode-selective")
+
+
+def full_summaries(path: Path) -> Iterator[dict[str, Any]]:
+    cur: list[dict[str, Any]] = []
+    for row in cc.iter_jsonl(path):
+        cur.append(row)
+        if cc.parse_event_obj(row.get("event"))[0] == "Completed":
+            yield cc.summarize_event_segment(cur)
+            cur = []
+    if cur:
+        yield cc.summarize_event_segment(cur)
+
+
+def selective_summaries(path: Path) -> Iterator[dict[str, Any]]:
+    for seg in cc.iter_event_segments(cc.iter_capture_lines(path)):
+        yield seg.summary()
+
+
+def decode_digest(mode: str, events: Path) -> str:
+    """Reduce every event segment with one decoding path and return a digest of the summaries."""
+    summaries = full_summaries(events) if mode == "decode-full" else selective_summaries(events)
+    digest = hashlib.sha1()
+    for summary in summaries:
+        digest.update(json.dumps(summary, ensure_ascii=False, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+# On Linux scripts run under this stub, which records the process's own VmHWM at exit: a child's
+# ru_maxrss starts out at the parent's high-water mark, while VmHWM is reset by exec.
+PEAK_RSS_STUB = """
+import atexit, os, runpy, sys
+def record_peak():
+    with open("/proc/self/status") as f:
+        kib = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    with open(os.environ["BENCH_PEAK_RSS_FILE"], "w") as f:
+        f.write(str(kib))
+atexit.register(record_peak)
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def run_process(argv: list[str], env: dict[str, str] | None, stop_when: tuple[Path, str] | None) -> int:
+    """Run `argv`; with `stop_when`, interrupt it like Ctrl-C once the text shows up in the file."""
+    if stop_when is None:
+        return subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env).returncode
+    path, text = stop_when
+    needle = text.encode("utf-8")
+    scanned = 0
+    proc = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    while proc.poll() is None:
+        if path.exists():
+            # Only the bytes appended since the last look are searched.
+            start = max(0, scanned - len(needle) + 1)
+            with path.open("rb") as f:
+                f.seek(start)
+                data = f.read()
+            if needle in data:
+                proc.send_signal(signal.SIGINT)
+                break
+            scanned = start + len(data)
+        time.sleep(0.01)
+    return proc.wait()
+
+
+def run_measured(cmd: list[str], stop_when: tuple[Path, str] | None = None) -> tuple[int, float, float | None]:
+    """Run the Python script `cmd[0]` with arguments; returns exit code, seconds and peak RSS in MiB."""
+    if not Path("/proc/self/status").exists():
+        start = time.perf_counter()
+        returncode = run_process([sys.executable, *cmd], None, stop_when)
+        return returncode, time.perf_counter() - start, None
+    with tempfile.NamedTemporaryFile("r", suffix=".peak") as peak_file:
+        env = dict(os.environ, BENCH_PEAK_RSS_FILE=peak_file.name)
+        start = time.perf_counter()
+        returncode = run_process([sys.executable, "-c", PEAK_RSS_STUB, *cmd], env, stop_when)
+        elapsed = time.perf_counter() - start
+        recorded = peak_file.read().strip()
+    return returncode, elapsed, round(int(recorded) / 1024, 1) if recorded else None
+
+
+def mode_command(mode: str, script: Path, requests: Path, events: Path, out: Path, calls: int, jobs: int) -> list[str]:
+    if mode in DECODE_MODES:
+        return [str(Path(__file__).resolve()), "--decode", mode, str(events)]
+    args, _warm = MODES[mode]
+    values = {
+        "out": str(out),
+        "mid": str(max(1, calls // 2)),
+        "jobs": str(jobs),
+        "requests": str(requests),
+        "events": str(events),
+        "capture_dir": str(requests.parent),
+    }
+    if "--fleet" in args:
+        # --fleet discovers the capture pair itself and rejects --requests/--events.
+        return [str(script)] + [a.format(**values) for a in args]
+    return [str(script), "--requests", str(requests), "--events", str(events)] + [a.format(**values) for a in args]
+
+
+def bench_mode(
+    mode: str,
+    script: Path,
+    requests: Path,
+    events: Path,
+    out: Path,
+    calls: int,
+    jobs: int,
+    repeat: int,
+) -> dict[str, Any]:
+    if out.exists():
+        shutil.rmtree(out)
+    out.mkdir(parents=True)
+    cmd = mode_command(mode, script, requests, events, out, calls, jobs)
+    stop_when = (out / "readable.md", f"### GPT Call #{calls}\n") if mode == "follow" else None
+
+    def failure(code: int) -> dict[str, Any]:
+        # argparse exits with 2 on unknown flags, i.e. a --baseline formatter without this mode.
+        return {"mode": mode, "error": "unsupported" if code == 2 else f"exit {code}"}
+
+    if mode == "follow" and os.name == "nt":
+        # Stopping a follow run needs SIGINT.
+        return {"mode": mode, "error": "posix only"}
+    if mode not in DECODE_MODES and MODES[mode][1]:
+        code, _elapsed, _peak = run_measured(cmd)
+        if code != 0:
+            return failure(code)
+    times: list[float] = []
+    peaks: list[float] = []
+    for _ in range(repeat):
+        if mode == "build-index":
+            (out / "idx.json").unlink(missing_ok=True)
+        elif mode == "sqlite":
+            (out / "capture.db").unlink(missing_ok=True)
+        code, elapsed, peak = run_measured(cmd, stop_when)
+        if code != 0:
+            return failure(code)
+        times.append(elapsed)
+        if peak is not None:
+            peaks.append(peak)
+    return {
+        "mode": mode,
+        "seconds": round(min(times), 4),
+        "seconds_all": [round(t, 4) for t in times],
+        "peak_rss_mb": max(peaks) if peaks else None,
+    }
+
+
+def git_revision(cwd: Path) -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd, check=True, capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def print_table(results: list[dict[str, Any]]) -> None:
+    header = f"{'events':>10} {'calls':>8} {'formatter':<10} {'mode':<17} {'seconds':>9} {'rows/s':>10} {'peak MiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['events']:>10} {r['calls']:>8} {r['formatter']:<10} {r['mode']:<17} {r['error']:>9}")
+            continue
+        rate = round(r["events"] / r["seconds"]) if r["seconds"] else 0
+        peak = "-" if r["peak_rss_mb"] is None else r["peak_rss_mb"]
+        print(f"{r['events']:>10} {r['calls']:>8} {r['formatter']:<10} {r['mode']:<17} {r['seconds']:>9.3f} {rate:>10} {peak:>9}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", default="1e3,1e5,1e7", help="Comma-separated event-row counts (default: 1e3,1e5,1e7).")
+    ap.add_argument("--modes", default=",".join(MODES), help=f"Comma-separated modes (default: all of {', '.join(MODES)}).")
+    ap.add_argument("--repeat", type=int, default=3, help="Timed runs per mode; the fastest is reported.")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker count for the render-jobs mode.")
+    ap.add_argument("--baseline", metavar="REV", help="Also benchmark the formatter as of this git revision.")
+    ap.add_argument("--workdir", type=Path, help="Where captures and outputs are written (default: a temp dir).")
+    ap.add_argument("--json", type=Path, help="Write machine-readable results to this path.")
+    ap.add_argument("--generate", type=Path, metavar="DIR", help="Only write a synthetic capture to DIR and exit.")
+    ap.add_argument("--calls", type=parse_count, help="With --generate: number of calls (default: use --events).")
+    ap.add_argument("--events", type=parse_count, default=100_000, help="With --generate: event rows to write.")
+    ap.add_argument("--conversations", type=int, default=CaptureSpec.conversations)
+    ap.add_argument("--history", type=int, default=CaptureSpec.history, help="Max input[] items resent per request.")
+    ap.add_argument("--deltas", type=int, default=CaptureSpec.deltas, help="Average OutputTextDelta events per message.")
+    ap.add_argument("--reasoning-deltas", type=int, default=CaptureSpec.reasoning_deltas)
+    ap.add_argument("--tool-mix", type=str, default=CaptureSpec.tool_mix, help=f"Output item weights (default: {DEFAULT_TOOL_MIX}).")
+    ap.add_argument("--tools", type=int, default=CaptureSpec.tools, help="Tool schemas per request.")
+    ap.add_argument("--instructions-bytes", type=int, default=CaptureSpec.instructions_bytes)
+    ap.add_argument("--output-bytes", type=int, default=CaptureSpec.output_bytes, help="Size of each tool output.")
+    ap.add_argument("--encrypted-reasoning-bytes", type=int, default=CaptureSpec.encrypted_reasoning_bytes)
+    ap.add_argument("--seed", type=int, default=CaptureSpec.seed)
+    ap.add_argument("--decode", nargs=2, metavar=("MODE", "EVENTS"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.decode is not None:
+        print(decode_digest(args.decode[0], Path(args.decode[1])))
+        return 0
+    try:
+        parse_tool_mix(args.tool_mix)
+    except ValueError as e:
+        ap.error(str(e))
+    spec = CaptureSpec(
+        conversations=args.conversations,
+        history=args.history,
+        deltas=args.deltas,
+        reasoning_deltas=args.reasoning_deltas,
+        tool_mix=args.tool_mix,
+        tools=args.tools,
+        instructions_bytes=args.instructions_bytes,
+        output_bytes=args.output_bytes,
+        encrypted_reasoning_bytes=args.encrypted_reasoning_bytes,
+        seed=args.seed,
+    )
+    if args.generate is not None:
+        spec.calls, spec.events = args.calls, None if args.calls is not None else args.events
+        requests, events = generate_capture(args.generate, spec)
+        print(f"wrote {requests} ({requests.stat().st_size} bytes) and {events} ({events.stat().st_size} bytes)")
+        return 0
+
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        ap.error(f"unknown modes: {', '.join(unknown)}")
+    scales = [parse_count(s) for s in args.scales.split(",") if s]
+    script = Path(fcc.__file__).resolve()
+    workdir_ctx = tempfile.TemporaryDirectory() if args.workdir is None else None
+    workdir = Path(workdir_ctx.name) if workdir_ctx is not None else args.workdir
+    formatters = {"current": script}
+    results: list[dict[str, Any]] = []
+    try:
+        if args.baseline is not None:
+            baseline_dir = workdir / "baseline"
+            baseline_dir.mkdir(parents=True, exist_ok=True)
+            # The formatter imports the modules next to it (absent in older revisions).
+            for name in (script.name, "codex_capture.py", "capture_reports.py", "capture_fleet.py"):
+                shown = subprocess.run(
+                    ["git", "show", f"{args.baseline}:./{name}"],
+                    cwd=script.parent,
+                    check=name == script.name,
+                    capture_output=True,
+                )
+                if shown.returncode == 0:
+                    (baseline_dir / name).write_bytes(shown.stdout)
+            formatters["baseline"] = baseline_dir / script.name
+        for scale in scales:
+            spec.calls, spec.events = None, scale
+            capture_dir = workdir / f"capture-{scale}"
+            requests, events = generate_capture(capture_dir, spec)
+            events_rows = sum(1 for _line in cc.iter_capture_lines(events))
+            calls = sum(1 for _line in cc.iter_capture_lines(requests))
+            digests: set[str] = set()
+            for mode in modes:
+                for name, formatter in formatters.items():
+                    if name != "current" and mode in DECODE_MODES:
+                        continue
+                    out = workdir / f"out-{scale}-{name}-{mode}"
+                    result = bench_mode(mode, formatter, requests, events, out, calls, args.jobs, args.repeat)
+                    result.update(
+                        {
+                            "formatter": name,
+                            "events": events_rows,
+                            "calls": calls,
+                            "requests_bytes": requests.stat().st_size,
+                            "events_bytes": events.stat().st_size,
+                        }
+                    )
+                    results.append(result)
+                    print_table([result])
+                    if mode in DECODE_MODES and "error" not in result:
+                        digest = subprocess.run(
+                            [sys.executable, *mode_command(mode, formatter, requests, events, out, calls, args.jobs)],
+                            check=True,
+                            capture_output=True,
+                            text=True,
+                        ).stdout.strip()
+                        digests.add(digest)
+                if mode == "render" and "baseline" in formatters:
+                    current = workdir / f"out-{scale}-current-render"
+                    baseline = workdir / f"out-{scale}-baseline-render"
+                    for name in ("readable.md", "simplified.md"):
+                        if (baseline / name).exists() and (current / name).read_bytes() != (baseline / name).read_bytes():
+                            raise RuntimeError(f"{name} differs from the {args.baseline} formatter at {scale} events")
+            if len(digests) > 1:
+                raise RuntimeError(f"full and selective decoding disagree at {scale} events")
+    finally:
+        if workdir_ctx is not None:
+            workdir_ctx.cleanup()
+
+    print()
+    print_table(results)
+    if args.json is not None:
+        doc = {
+            "generated_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "git_revision": git_revision(script.parent),
+            "baseline": args.baseline,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+            "spec": {k: v for k, v in asdict(spec).items() if k not in ("calls", "events")},
+            "results": results,
+        }
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(doc, indent=2) + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
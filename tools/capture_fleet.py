@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Fleet aggregation over the captures of many runs (`format_codex_capture.py --fleet`).
+
+`--fleet` aggregates the captures of many runs (e.g. one requests/events pair per CI job). Each
+pair is reduced to mergeable aggregates in a worker process, while the parent runs a single k-way
+merge of every file by ts_ms (through a bounded read buffer per file) for the fleet-wide
+timeline: requests per minute and calls in flight across all runs.
+"""
+
+from __future__ import annotations
+
+import glob
+import heapq
+import json
+import multiprocessing
+import operator
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any
+
+from capture_reports import counter_percentile, md_table, write_report_files
+from codex_capture import (
+    TOKEN_KEYS,
+    EventSegment,
+    event_line_name,
+    fmt_ts_ms,
+    is_completed_line,
+    iter_capture_lines,
+    iter_pair_calls,
+    iter_stamped_lines,
+    normalize_token_usage,
+    parse_event_obj,
+    peek_row_header,
+    tool_call_name,
+)
+
+
+FLEET_READ_BUFFER = 64 * 1024
+FLEET_CAPTURE_SUFFIXES = (".jsonl", ".jsonl.gz", ".jsonl.zst", ".cca", ".cca.gz", ".cca.zst")
+_FLEET_ROLE_RE = re.compile(r"requests?|events?")
+
+
+CapturePair = tuple[Path | None, Path | None]
+
+
+def discover_capture_pairs(patterns: list[str]) -> list[CapturePair]:
+    """
+    Expand --fleet globs and directories into `(requests, events)` capture pairs.
+
+    A file's role comes from its name (`*request*` / `*event*`); a requests and an events file in
+    the same directory are paired when their names match with that word swapped, e.g.
+    `job-17/capture_requests.jsonl` and `job-17/capture_events.jsonl.zst`.
+    """
+    files: set[Path] = set()
+    for pattern in patterns:
+        for match in [Path(m) for m in glob.glob(pattern, recursive=True)]:
+            if match.is_dir():
+                files.update(p for p in match.rglob("*") if p.is_file())
+            elif match.is_file():
+                files.add(match)
+    pairs: dict[tuple[Path, str], list[Path | None]] = {}
+    for path in sorted(files):
+        suffix = next((x for x in FLEET_CAPTURE_SUFFIXES if path.name.endswith(x)), None)
+        if suffix is None:
+            continue
+        stem = path.name[: -len(suffix)]
+        m = _FLEET_ROLE_RE.search(stem)
+        if m is None:
+            continue
+        slot = pairs.setdefault((path.parent, f"{stem[: m.start()]}*{stem[m.end() :]}"), [None, None])
+        slot[0 if m.group().startswith("request") else 1] = path
+    return [(requests, events) for requests, events in pairs.values()]
+
+
+class FleetStats:
+    """Calls per model, token totals, latency histograms and tool frequency; mergeable across files."""
+
+    LATENCY_METRICS = (
+        ("request_to_first_delta_ms", "request -> first OutputTextDelta (ms)"),
+        ("request_to_completed_ms", "request -> Completed (ms)"),
+    )
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.requests = 0
+        self.completed = 0
+        self.first_ts_ms: int | None = None
+        self.last_ts_ms: int | None = None
+        self.model_calls: Counter[str] = Counter()
+        self.model_tokens: dict[str, Counter[str]] = defaultdict(Counter)
+        # Millisecond histograms, so percentiles stay exact after merging.
+        self.latency: dict[str, Counter[int]] = {key: Counter() for key, _label in self.LATENCY_METRICS}
+        self.model_latency: dict[str, Counter[int]] = defaultdict(Counter)
+        self.tools: Counter[str] = Counter()
+
+    def add_call(self, index: int, req_row: dict[str, Any] | None, seg: EventSegment | None) -> None:
+        self.calls += 1
+        request_ts = req_row.get("ts_ms") if req_row is not None else None
+        req = req_row.get("request") if req_row is not None else None
+        model = "(no request)"
+        if req_row is not None:
+            self.requests += 1
+            model = str(req.get("model")) if isinstance(req, dict) and req.get("model") is not None else "(unknown)"
+        self.model_calls[model] += 1
+        first_delta_ts: int | None = None
+        completed_ts: int | None = None
+        completed: Any = None
+        for line in seg.lines if seg is not None else []:
+            # Past the first delta only item and Completed rows matter; a substring test skips the rest.
+            if first_delta_ts is not None and b"OutputItemDone" not in line and b"Completed" not in line:
+                continue
+            name = event_line_name(line)
+            if name == "OutputTextDelta":
+                if first_delta_ts is None:
+                    first_delta_ts = peek_row_header(line)[0]
+            elif name in ("OutputItemDone", "Completed"):
+                row = json.loads(line.decode("utf-8"))
+                _name, payload = parse_event_obj(row.get("event"))
+                if name == "Completed":
+                    completed_ts, completed = row.get("ts_ms"), payload
+                else:
+                    tool = tool_call_name(payload)
+                    if tool is not None:
+                        self.tools[tool] += 1
+        usage = normalize_token_usage(completed)
+        if completed is not None:
+            self.completed += 1
+        if usage is not None:
+            self.model_tokens[model].update(usage)
+        if isinstance(request_ts, int):
+            self.first_ts_ms = request_ts if self.first_ts_ms is None else min(self.first_ts_ms, request_ts)
+            self.last_ts_ms = request_ts if self.last_ts_ms is None else max(self.last_ts_ms, request_ts)
+            if isinstance(first_delta_ts, int):
+                self.latency["request_to_first_delta_ms"][first_delta_ts - request_ts] += 1
+            if isinstance(completed_ts, int):
+                self.latency["request_to_completed_ms"][completed_ts - request_ts] += 1
+                self.model_latency[model][completed_ts - request_ts] += 1
+
+    def merge(self, other: FleetStats) -> None:
+        self.calls += other.calls
+        self.requests += other.requests
+        self.completed += other.completed
+        for ts_ms in (other.first_ts_ms, other.last_ts_ms):
+            if ts_ms is not None:
+                self.first_ts_ms = ts_ms if self.first_ts_ms is None else min(self.first_ts_ms, ts_ms)
+                self.last_ts_ms = ts_ms if self.last_ts_ms is None else max(self.last_ts_ms, ts_ms)
+        self.model_calls.update(other.model_calls)
+        for model, tokens in other.model_tokens.items():
+            self.model_tokens[model].update(tokens)
+        for key, counts in other.latency.items():
+            self.latency[key].update(counts)
+        for model, counts in other.model_latency.items():
+            self.model_latency[model].update(counts)
+        self.tools.update(other.tools)
+
+    def tokens(self) -> dict[str, int]:
+        totals: Counter[str] = Counter()
+        for tokens in self.model_tokens.values():
+            totals.update(tokens)
+        return {key: totals[key] for key in TOKEN_KEYS}
+
+
+def histogram_distribution(counts: Counter[int]) -> dict[str, Any]:
+    n = sum(counts.values())
+    return {
+        "count": n,
+        "p50": counter_percentile(counts, 50),
+        "p90": counter_percentile(counts, 90),
+        "p99": counter_percentile(counts, 99),
+        "max": max(counts) if counts else None,
+        "mean": round(sum(value * k for value, k in counts.items()) / n, 3) if n else None,
+    }
+
+
+def summarize_capture_pair(task: tuple[Path | None, Path | None, str]) -> FleetStats:
+    """Worker entry point: aggregate one capture pair."""
+    requests_path, events_path, join = task
+    stats = FleetStats()
+    for call in iter_pair_calls(requests_path, events_path, join):
+        stats.add_call(*call)
+    return stats
+
+
+def fleet_timeline(pairs: list[CapturePair]) -> dict[str, Any]:
+    """
+    Merge every capture file by ts_ms in one pass and track fleet-wide load.
+
+    Only row headers and event tags are read. A call is in flight from its request until the
+    Completed of the same file and conversation_id (or that conversation's next request).
+    """
+    streams = [
+        iter_stamped_lines(iter_capture_lines(requests_path, FLEET_READ_BUFFER), 2 * i)
+        for i, (requests_path, _events_path) in enumerate(pairs)
+        if requests_path is not None
+    ]
+    # Event streams come last so a request sorts before events stamped with the same millisecond.
+    streams += [
+        iter_stamped_lines(iter_capture_lines(events_path, FLEET_READ_BUFFER), 2 * i + 1)
+        for i, (_requests_path, events_path) in enumerate(pairs)
+        if events_path is not None
+    ]
+    # Runs captured without events never close a call, so they only count towards requests/minute.
+    with_events = {i for i, (_requests_path, events_path) in enumerate(pairs) if events_path is not None}
+    in_flight: set[tuple[int, str | None]] = set()
+    requests_per_minute: Counter[int] = Counter()
+    peak_in_flight = 0
+    peak_in_flight_ts: int | None = None
+    rows = 0
+    first_ts: int | None = None
+    last_ts: int | None = None
+    for ts_ms, kind, conversation_id, line in heapq.merge(*streams, key=operator.itemgetter(0)):
+        rows += 1
+        if ts_ms:
+            first_ts = ts_ms if first_ts is None else min(first_ts, ts_ms)
+            last_ts = ts_ms if last_ts is None else max(last_ts, ts_ms)
+        key = (kind >> 1, conversation_id)
+        if kind & 1 == 0:
+            requests_per_minute[ts_ms // 60_000] += 1
+            if key[0] not in with_events:
+                continue
+            in_flight.add(key)
+            if len(in_flight) > peak_in_flight:
+                peak_in_flight, peak_in_flight_ts = len(in_flight), ts_ms
+        elif is_completed_line(line):
+            in_flight.discard(key)
+    busiest = max(requests_per_minute.items(), key=operator.itemgetter(1), default=(None, 0))
+    return {
+        "rows": rows,
+        "first_ts_ms": first_ts,
+        "last_ts_ms": last_ts,
+        "peak_in_flight_calls": peak_in_flight,
+        "peak_in_flight_ts_ms": peak_in_flight_ts,
+        "peak_requests_per_minute": busiest[1],
+        "peak_minute_ts_ms": busiest[0] * 60_000 if busiest[0] is not None else None,
+        "requests_per_minute": [
+            {"minute_ts_ms": minute * 60_000, "requests": count} for minute, count in sorted(requests_per_minute.items())
+        ],
+    }
+
+
+def write_fleet_report(path: Path, pairs: list[CapturePair], join: str, jobs: int) -> None:
+    tasks = [(requests_path, events_path, join) for requests_path, events_path in pairs]
+    if jobs > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            # Workers aggregate the files while this process runs the merge pass.
+            pending = pool.imap(summarize_capture_pair, tasks)
+            timeline = fleet_timeline(pairs)
+            parts = list(pending)
+    else:
+        timeline = fleet_timeline(pairs)
+        parts = [summarize_capture_pair(task) for task in tasks]
+
+    total = FleetStats()
+    files: list[dict[str, Any]] = []
+    for (requests_path, events_path), part in zip(pairs, parts):
+        total.merge(part)
+        files.append(
+            {
+                "requests": str(requests_path) if requests_path is not None else None,
+                "events": str(events_path) if events_path is not None else None,
+                "calls": part.calls,
+                "requests_rows": part.requests,
+                "completed": part.completed,
+                "total_tokens": part.tokens()["total_tokens"],
+                "first_request_ts_ms": part.first_ts_ms,
+                "last_request_ts_ms": part.last_ts_ms,
+            }
+        )
+    models = [
+        {
+            "model": model,
+            "calls": calls,
+            **{key: total.model_tokens[model][key] for key in TOKEN_KEYS},
+            "request_to_completed_ms": histogram_distribution(total.model_latency[model]),
+        }
+        for model, calls in total.model_calls.most_common()
+    ]
+    tool_calls = sum(total.tools.values())
+    tools = [
+        {"tool": tool, "calls": count, "share": round(count / tool_calls, 4)} for tool, count in total.tools.most_common()
+    ]
+    latency = {key: histogram_distribution(total.latency[key]) for key, _label in FleetStats.LATENCY_METRICS}
+    data = {
+        "files": len(pairs),
+        "calls": total.calls,
+        "requests": total.requests,
+        "completed": total.completed,
+        "tokens": total.tokens(),
+        "models": models,
+        "latency": latency,
+        "tools": tools,
+        "timeline": timeline,
+        "captures": files,
+    }
+
+    md: list[str] = ["# Codex Fleet Report", ""]
+    md.append(f"- capture pairs: `{len(pairs)}`")
+    md.append(f"- calls: `{total.calls}` ({total.requests} requests, {total.completed} completed)")
+    md.append(f"- span: `{fmt_ts_ms(timeline['first_ts_ms'])}` -> `{fmt_ts_ms(timeline['last_ts_ms'])}`")
+    md.append(
+        f"- peak calls in flight: `{timeline['peak_in_flight_calls']}` at `{fmt_ts_ms(timeline['peak_in_flight_ts_ms'])}`"
+    )
+    md.append(
+        f"- peak requests/minute: `{timeline['peak_requests_per_minute']}` at `{fmt_ts_ms(timeline['peak_minute_ts_ms'])}`"
+    )
+    md.extend(["", "## Calls per model", ""])
+    md.extend(
+        md_table(
+            ["model", "calls", "input", "cached input", "output", "reasoning", "total tokens", "p50/p90/p99 request -> Completed (ms)"],
+            (
+                [
+                    m["model"],
+                    m["calls"],
+                    m["input_tokens"],
+                    m["cached_input_tokens"],
+                    m["output_tokens"],
+                    m["reasoning_output_tokens"],
+                    m["total_tokens"],
+                    "/".join("-" if m["request_to_completed_ms"][q] is None else str(m["request_to_completed_ms"][q]) for q in ("p50", "p90", "p99")),
+                ]
+                for m in models
+            ),
+        )
+    )
+    tokens = data["tokens"]
+    md.extend(["", "## Token usage", ""])
+    md.extend(md_table(list(TOKEN_KEYS), [[tokens[key] for key in TOKEN_KEYS]]))
+    md.extend(["", "## Latency", ""])
+    md.extend(
+        md_table(
+            ["metric", "n", "p50", "p90", "p99", "max"],
+            (
+                [label, latency[key]["count"], latency[key]["p50"], latency[key]["p90"], latency[key]["p99"], latency[key]["max"]]
+                for key, label in FleetStats.LATENCY_METRICS
+            ),
+        )
+    )
+    md.extend(["", "## Tool frequency", ""])
+    md.extend(md_table(["tool", "calls", "share"], ([t["tool"], t["calls"], f"{t['share']:.1%}"] for t in tools)))
+    md.extend(["", "## Busiest minutes", ""])
+    busiest = sorted(timeline["requests_per_minute"], key=lambda m: (-m["requests"], m["minute_ts_ms"]))[:10]
+    md.extend(md_table(["minute", "requests"], ([fmt_ts_ms(m["minute_ts_ms"]), m["requests"]] for m in busiest)))
+    md.extend(["", "## Captures", ""])
+    md.extend(
+        md_table(
+            ["requests", "events", "calls", "completed", "total tokens", "first request", "last request"],
+            (
+                [
+                    f["requests"],
+                    f["events"],
+                    f["calls"],
+                    f["completed"],
+                    f["total_tokens"],
+                    fmt_ts_ms(f["first_request_ts_ms"]),
+                    fmt_ts_ms(f["last_request_ts_ms"]),
+                ]
+                for f in files
+            ),
+        )
+    )
+    write_report_files(path, data, md)
@@ -0,0 +1,1459 @@
+#!/usr/bin/env python3
+"""
+Analysis reports over Codex capture calls, used by format_codex_capture.py.
+
+Reports are fed every `(call_index, request_row, event_segment)` record as the pipeline streams,
+so no request or event payload is held, but most keep one small summary dict per call (the
+per-call tables in their output): memory grows with the call count, unlike rendering.
+"""
+
+from __future__ import annotations
+
+import csv
+import difflib
+import itertools
+import json
+import math
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+from codex_capture import (
+    TOKEN_KEYS,
+    TOOL_CALL_ITEM_TYPES,
+    TOOL_OUTPUT_ITEM_TYPES,
+    CallFilter,
+    CallRecord,
+    EventSegment,
+    canonical_json,
+    common_prefix_len,
+    content_digest,
+    event_line_name,
+    is_completed_line,
+    iter_pair_calls,
+    normalize_token_usage,
+    parse_event_obj,
+    peek_row_header,
+    summarize_tools,
+    tool_call_name,
+)
+
+
+def feed_reports(calls: Iterable[CallRecord], reports: list[CallReport]) -> Iterator[CallRecord]:
+    for call in calls:
+        for report in reports:
+            report.add_call(*call)
+        yield call
+
+
+def percentile(sorted_values: list[Any], q: float) -> Any:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def counter_percentile(counts: Counter[int], q: float) -> int | None:
+    """Nearest-rank percentile over a value histogram (exact for integer millisecond gaps)."""
+    total = sum(counts.values())
+    if total == 0:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * total))
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= rank:
+            return value
+    return None
+
+
+def distribution(values: list[Any]) -> dict[str, Any]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else None,
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else None,
+    }
+
+
+def md_table(header: list[str], rows: Iterable[list[Any]]) -> list[str]:
+    def cell(value: Any) -> str:
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return f"{value:.1f}"
+        return str(value).replace("|", "\\|")
+
+    lines = [f"| {' | '.join(header)} |", f"|{'|'.join('---' for _ in header)}|"]
+    lines.extend(f"| {' | '.join(cell(v) for v in row)} |" for row in rows)
+    return lines
+
+
+def write_report_files(path: Path, data: dict[str, Any], markdown: list[str]) -> None:
+    """Write `<path>.json` and `<path>.md` side by side."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.with_suffix(".json").write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    path.with_suffix(".md").write_text("\n".join(markdown) + "\n", encoding="utf-8")
+
+
+class CallReport:
+    """
+    Base for the analysis reports.
+
+    Subclasses see every call through `add_call`, then `write` turns `data()` into `<path>.json` and
+    `markdown(data)` (the body below the `TITLE` heading) into `<path>.md`.
+    """
+
+    TITLE = ""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def add_call(
+        self,
+        index: int,
+        req_row: dict[str, Any] | None,
+        seg: list[dict[str, Any]] | None,
+    ) -> None:
+        raise NotImplementedError
+
+    def data(self) -> dict[str, Any]:
+        raise NotImplementedError
+
+    def markdown(self, data: dict[str, Any]) -> list[str]:
+        raise NotImplementedError
+
+    def write(self) -> None:
+        data = self.data()
+        write_report_files(self.path, data, [f"# {self.TITLE}", "", *self.markdown(data)])
+
+
+class LatencyReport(CallReport):
+    """Per-call and aggregate timings derived from capture `ts_ms` values."""
+
+    TITLE = "Codex Capture Latency Report"
+
+    METRICS = (
+        ("request_to_first_event_ms", "request -> first event (ms)"),
+        ("request_to_first_delta_ms", "request -> first OutputTextDelta (ms)"),
+        ("streaming_ms", "streaming duration (ms)"),
+        ("request_to_completed_ms", "request -> Completed (ms)"),
+        ("output_tokens_per_sec", "output tokens/sec"),
+    )
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self.calls: list[dict[str, Any]] = []
+        self.gap_counts: Counter[int] = Counter()
+
+    def add_call(
+        self,
+        index: int,
+        req_row: dict[str, Any] | None,
+        seg: EventSegment | None,
+    ) -> None:
+        request_ts = req_row.get("ts_ms") if req_row is not None else None
+        req = req_row.get("request") if req_row is not None else None
+        first_event: int | None = None
+        last_event: int | None = None
+        completed_ts: int | None = None
+        completed: Any = None
+        delta_ts: list[int] = []
+        for r in seg or []:
+            ts_ms = r.get("ts_ms")
+            if not isinstance(ts_ms, int):
+                continue
+            first_event = ts_ms if first_event is None else min(first_event, ts_ms)
+            last_event = ts_ms if last_event is None else max(last_event, ts_ms)
+            name, payload = parse_event_obj(r.get("event"))
+            if name == "OutputTextDelta":
+                delta_ts.append(ts_ms)
+            elif name == "Completed":
+                completed_ts = ts_ms
+                completed = payload
+        gaps = sorted(b - a for a, b in zip(delta_ts, delta_ts[1:]))
+        self.gap_counts.update(gaps)
+
+        def since_request(ts_ms: int | None) -> int | None:
+            if not isinstance(request_ts, int) or ts_ms is None:
+                return None
+            return ts_ms - request_ts
+
+        streaming_ms = last_event - first_event if first_event is not None and last_event is not None else None
+        usage = normalize_token_usage(completed)
+        output_tokens = usage["output_tokens"] if usage is not None else None
+        tokens_per_sec = None
+        if output_tokens is not None and streaming_ms:
+            tokens_per_sec = round(output_tokens * 1000.0 / streaming_ms, 3)
+        self.calls.append(
+            {
+                "call": index,
+                "conversation_id": req_row.get("conversation_id") if req_row is not None else None,
+                "model": req.get("model") if isinstance(req, dict) else None,
+                "request_ts_ms": request_ts,
+                "request_to_first_event_ms": since_request(first_event),
+                "request_to_first_delta_ms": since_request(delta_ts[0] if delta_ts else None),
+                "request_to_completed_ms": since_request(completed_ts),
+                "streaming_ms": streaming_ms,
+                "deltas": len(delta_ts),
+                "delta_gap_ms": {
+                    "p50": percentile(gaps, 50),
+                    "p90": percentile(gaps, 90),
+                    "p99": percentile(gaps, 99),
+                    "max": gaps[-1] if gaps else None,
+                },
+                "output_tokens": output_tokens,
+                "output_tokens_per_sec": tokens_per_sec,
+            }
+        )
+
+    def aggregate(self) -> dict[str, Any]:
+        out: dict[str, Any] = {"calls": len(self.calls)}
+        for key, _label in self.METRICS:
+            out[key] = distribution([c[key] for c in self.calls if c[key] is not None])
+        out["delta_gap_ms"] = {
+            "count": sum(self.gap_counts.values()),
+            "p50": counter_percentile(self.gap_counts, 50),
+            "p90": counter_percentile(self.gap_counts, 90),
+            "p99": counter_percentile(self.gap_counts, 99),
+            "max": max(self.gap_counts) if self.gap_counts else None,
+        }
+        return out
+
+    def data(self) -> dict[str, Any]:
+        return {"aggregate": self.aggregate(), "calls": self.calls}
+
+    def markdown(self, data: dict[str, Any]) -> list[str]:
+        aggregate = data["aggregate"]
+        md: list[str] = [f"- calls: `{len(self.calls)}`", "", "## Aggregate", ""]
+        rows = [
+            [label, aggregate[key]["count"], aggregate[key]["p50"], aggregate[key]["p90"], aggregate[key]["p99"], aggregate[key]["max"]]
+            for key, label in self.METRICS
+        ]
+        gaps = aggregate["delta_gap_ms"]
+        rows.append(["inter-delta gap (ms)", gaps["count"], gaps["p50"], gaps["p90"], gaps["p99"], gaps["max"]])
+        md.extend(md_table(["metric", "n", "p50", "p90", "p99", "max"], rows))
+        md.extend(["", "## Per call", ""])
+        md.extend(
+            md_table(
+                [
+                    "call",
+                    "model",
+                    "first event (ms)",
+                    "first delta (ms)",
+                    "gap p50/p90/p99/max (ms)",
+                    "streaming (ms)",
+                    "output tokens",
+                    "tokens/sec",
+                ],
+                (
+                    [
+                        c["call"],
+                        c["model"],
+                        c["request_to_first_event_ms"],
+                        c["request_to_first_delta_ms"],
+                        "/".join("-" if v is None else str(v) for v in c["delta_gap_ms"].values()),
+                        c["streaming_ms"],
+                        c["output_tokens"],
+                        c["output_tokens_per_sec"],
+                    ]
+                    for c in self.calls
+                ),
+            )
+        )
+        return md
+
+
+def call_conversation_id(req_row: dict[str, Any] | None, seg: EventSegment | None) -> str | None:
+    if req_row is not None and req_row.get("conversation_id") is not None:
+        return req_row.get("conversation_id")
+    for r in seg or []:
+        if r.get("conversation_id") is not None:
+            return r.get("conversation_id")
+    return None
+
+
+def iter_timed_events(seg: EventSegment | list[dict[str, Any]] | None) -> Iterator[tuple[Any, str | None, Any]]:
+    """`(ts_ms, event name, payload)` per row; of raw lines only item and Completed payloads are decoded."""
+    if isinstance(seg, EventSegment):
+        for line in seg.lines:
+            name = event_line_name(line)
+            if name in ("OutputItemDone", "Completed"):
+                row = json.loads(line.decode("utf-8"))
+                yield (row.get("ts_ms"), *parse_event_obj(row.get("event")))
+            else:
+                yield peek_row_header(line)[0], name, None
+        return
+    for r in seg or []:
+        yield (r.get("ts_ms"), *parse_event_obj(r.get("event")))
+
+
+def call_timing(request_ts: Any, seg: EventSegment | list[dict[str, Any]] | None) -> dict[str, Any]:
+    """
+    Critical-path timestamps of one call; the tool report and the diff report both build on them.
+
+    - `tool_calls`: `(call_id, tool, emitted_ts)` of every function/custom tool call emitted
+    - `end_ts`: `Completed` (or the last event of a cut-off segment)
+    - `tool_start_ts`: when the last tool call was emitted, or `end_ts` when none was. Codex starts a
+      tool as soon as its item is done, so the stream tail up to `Completed` overlaps tool execution.
+    - `overhead_ms`: request sent -> first event (connection, queueing, client-side request building)
+    - `model_ms`: first event -> `tool_start_ts`
+    """
+    tool_calls: list[tuple[str, str, int | None]] = []
+    first_ts: int | None = None
+    completed_ts: int | None = None
+    last_ts: int | None = None
+    for ts_ms, name, payload in iter_timed_events(seg):
+        if isinstance(ts_ms, int):
+            if first_ts is None:
+                first_ts = ts_ms
+            last_ts = ts_ms
+        else:
+            ts_ms = None
+        if name == "Completed":
+            completed_ts = ts_ms
+        elif name == "OutputItemDone" and isinstance(payload, dict):
+            if payload.get("type") in TOOL_CALL_ITEM_TYPES and payload.get("call_id") is not None:
+                tool_calls.append((payload["call_id"], str(payload.get("name", "<missing-name>")), ts_ms))
+    end_ts = completed_ts if completed_ts is not None else last_ts
+    emitted = [ts for _call_id, _tool, ts in tool_calls if ts is not None]
+    tool_start_ts = max(emitted) if emitted else end_ts
+    overhead_ms = model_ms = None
+    if isinstance(request_ts, int) and tool_start_ts is not None:
+        model_start_ts = request_ts
+        if first_ts is not None and first_ts >= request_ts:
+            overhead_ms = first_ts - request_ts
+            model_start_ts = first_ts
+        model_ms = tool_start_ts - model_start_ts
+    return {
+        "tool_calls": tool_calls,
+        "end_ts": end_ts,
+        "tool_start_ts": tool_start_ts,
+        "overhead_ms": overhead_ms,
+        "model_ms": model_ms,
+    }
+
+
+class ToolTimingReport(CallReport):
+    """
+    Critical-path split of each turn into model, tool and client time.
+
+    A tool call emitted in an `OutputItemDone` is joined by `call_id` to the first later request in
+    the same conversation whose `input[]` carries its output. A turn is a chain of calls linked
+    that way; it ends with a call that emits no tool calls. Per call, the spans are those of
+    `call_timing`, plus last tool call emitted -> next request as tool time, so model, tool and
+    client time add up to the turn's wall-clock time.
+    """
+
+    TITLE = "Codex Capture Tool Timing Report"
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self.tool_durations: defaultdict[str, list[int]] = defaultdict(list)
+        self.unmatched: Counter[str] = Counter()
+        self.turns: list[dict[str, Any]] = []
+        # conversation_id -> {"pending": {call_id: (tool, emitted_ts)}, "tool_start_ts": int, "turn": dict}
+        self._state: dict[Any, dict[str, Any]] = {}
+
+    def add_call(
+        self,
+        index: int,
+        req_row: dict[str, Any] | None,
+        seg: EventSegment | None,
+    ) -> None:
+        conv = call_conversation_id(req_row, seg)
+        state = self._state.setdefault(conv, {"pending": {}, "tool_start_ts": None, "turn": None})
+        pending: dict[str, tuple[str, int | None]] = state["pending"]
+        request_ts = req_row.get("ts_ms") if req_row is not None else None
+        req = req_row.get("request") if req_row is not None else None
+
+        matched = 0
+        if isinstance(req, dict) and isinstance(req.get("input"), list) and pending:
+            for item in req["input"]:
+                if not isinstance(item, dict) or item.get("type") not in TOOL_OUTPUT_ITEM_TYPES:
+                    continue
+                hit = pending.pop(item.get("call_id"), None)
+                if hit is None:
+                    continue
+                tool, emitted_ts = hit
+                matched += 1
+                if isinstance(request_ts, int) and isinstance(emitted_ts, int):
+                    self.tool_durations[tool].append(request_ts - emitted_ts)
+
+        turn = state["turn"]
+        if turn is not None and matched:
+            if isinstance(request_ts, int) and isinstance(state["tool_start_ts"], int):
+                turn["tool_ms"] += request_ts - state["tool_start_ts"]
+        else:
+            self._finish_turn(conv)
+            turn = state["turn"] = {
+                "conversation_id": conv,
+                "first_call": index,
+                "last_call": index,
+                "calls": 0,
+                "start_ts_ms": request_ts,
+                "end_ts_ms": None,
+                "model_ms": 0,
+                "tool_ms": 0,
+                "client_overhead_ms": 0,
+                "tools": Counter(),
+            }
+        turn["calls"] += 1
+        turn["last_call"] = index
+        if turn["start_ts_ms"] is None:
+            turn["start_ts_ms"] = request_ts
+
+        timing = call_timing(request_ts, seg)
+        pending = state["pending"]
+        for call_id, tool, emitted_ts in timing["tool_calls"]:
+            pending[call_id] = (tool, emitted_ts)
+            turn["tools"][tool] += 1
+        turn["model_ms"] += timing["model_ms"] or 0
+        turn["client_overhead_ms"] += timing["overhead_ms"] or 0
+        state["tool_start_ts"] = timing["tool_start_ts"]
+        if timing["end_ts"] is not None:
+            turn["end_ts_ms"] = timing["end_ts"]
+        if not timing["tool_calls"]:
+            self._finish_turn(conv)
+
+    def _finish_turn(self, conv: Any) -> None:
+        state = self._state.get(conv)
+        if state is None:
+            return
+        pending = state["pending"]
+        for tool, _emitted_ts in pending.values():
+            self.unmatched[tool] += 1
+        state["pending"] = {}
+        turn = state["turn"]
+        state["turn"] = None
+        if turn is None:
+            return
+        start, end = turn["start_ts_ms"], turn["end_ts_ms"]
+        tool_start = state["tool_start_ts"]
+        if pending and isinstance(end, int) and isinstance(tool_start, int):
+            # No request ever carried the outputs: the stream tail is all that is left of the turn.
+            turn["client_overhead_ms"] += end - tool_start
+        wall_ms = end - start if isinstance(start, int) and isinstance(end, int) else None
+        turn["wall_ms"] = wall_ms
+        if wall_ms is None:
+            turn["client_overhead_ms"] = None
+        turn["tools"] = dict(turn["tools"])
+        self.turns.append(turn)
+
+    def data(self) -> dict[str, Any]:
+        for conv in list(self._state):
+            self._finish_turn(conv)
+        tools = {
+            tool: {**distribution(durations), "total_ms": sum(durations), "unmatched": self.unmatched.get(tool, 0)}
+            for tool, durations in sorted(self.tool_durations.items(), key=lambda kv: -sum(kv[1]))
+        }
+        for tool, count in self.unmatched.items():
+            tools.setdefault(tool, {**distribution([]), "total_ms": 0, "unmatched": count})
+        totals = {
+            key: sum(t[key] for t in self.turns if t.get(key) is not None)
+            for key in ("wall_ms", "model_ms", "tool_ms", "client_overhead_ms")
+        }
+        return {"totals": totals, "tools": tools, "turns": self.turns}
+
+    def markdown(self, data: dict[str, Any]) -> list[str]:
+        totals, tools = data["totals"], data["tools"]
+
+        def share(key: str) -> float | None:
+            return round(100.0 * totals[key] / totals["wall_ms"], 1) if totals["wall_ms"] else None
+
+        md: list[str] = [
+            "- client overhead: request sent -> first event (connection, queueing, client-side request building)",
+            "- model: first event -> last tool call emitted, or -> Completed when the call emits none",
+            "- tool: last tool call emitted -> next request carrying the tool outputs (local tool execution)",
+            "",
+            "## Turn split",
+            "",
+        ]
+        md.extend(
+            md_table(
+                ["turns", "wall (ms)", "model (ms)", "tool (ms)", "client overhead (ms)"],
+                [
+                    [
+                        len(self.turns),
+                        totals["wall_ms"],
+                        f"{totals['model_ms']} ({share('model_ms')}%)",
+                        f"{totals['tool_ms']} ({share('tool_ms')}%)",
+                        f"{totals['client_overhead_ms']} ({share('client_overhead_ms')}%)",
+                    ]
+                ],
+            )
+        )
+        md.extend(["", "## Per tool (tool call emitted -> next request sent)", ""])
+        md.extend(
+            md_table(
+                ["tool", "calls", "total (ms)", "p50", "p90", "max", "no output seen"],
+                (
+                    [tool, t["count"], t["total_ms"], t["p50"], t["p90"], t["max"], t["unmatched"]]
+                    for tool, t in tools.items()
+                ),
+            )
+        )
+        md.extend(["", "## Per turn", ""])
+        md.extend(
+            md_table(
+                ["conversation_id", "calls", "wall (ms)", "model (ms)", "tool (ms)", "client overhead (ms)", "tools"],
+                (
+                    [
+                        t["conversation_id"],
+                        f"#{t['first_call']}..#{t['last_call']}",
+                        t["wall_ms"],
+                        t["model_ms"],
+                        t["tool_ms"],
+                        t["client_overhead_ms"],
+                        ", ".join(f"{k}x{v}" for k, v in t["tools"].items()),
+                    ]
+                    for t in self.turns
+                ),
+            )
+        )
+        return md
+
+
+class CacheReport(CallReport):
+    """
+    Expected vs actual prompt-cache reuse per call.
+
+    The cacheable prefix of a request is `tools`, then `instructions`, then `input[]`. Each part is
+    hashed, the prefix shared with the previous request of the same conversation is measured in
+    serialized bytes, and `input_tokens` is scaled by that byte share to estimate the tokens that
+    should have been served from cache. That estimate is compared to `cached_input_tokens`.
+    """
+
+    TITLE = "Codex Capture Prompt Cache Report"
+    # Responses only caches prompts of at least this many tokens.
+    MIN_CACHEABLE_TOKENS = 1024
+    MISS_RATIO = 0.5
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self.calls: list[dict[str, Any]] = []
+        # conversation_id -> (prompt_cache_key, tools digest, instructions digest, input item digests)
+        self._previous: dict[Any, tuple[Any, str, str, list[str]]] = {}
+
+    def add_call(
+        self,
+        index: int,
+        req_row: dict[str, Any] | None,
+        seg: EventSegment | None,
+    ) -> None:
+        req = req_row.get("request") if req_row is not None else None
+        if not isinstance(req, dict):
+            return
+        conv = req_row.get("conversation_id")
+        tools_bytes = canonical_json(req.get("tools"))
+        instructions_bytes = canonical_json(req.get("instructions"))
+        items = req.get("input") if isinstance(req.get("input"), list) else []
+        item_bytes = [canonical_json(item) for item in items]
+        tools_digest = content_digest(tools_bytes)
+        instructions_digest = content_digest(instructions_bytes)
+        item_digests = [content_digest(b) for b in item_bytes]
+        cache_key = req.get("prompt_cache_key")
+
+        shared_bytes = 0
+        prefix_items = 0
+        previous = self._previous.get(conv)
+        if previous is not None and previous[0] == cache_key:
+            _key, prev_tools, prev_instructions, prev_items = previous
+            if prev_tools == tools_digest:
+                shared_bytes += len(tools_bytes)
+                if prev_instructions == instructions_digest:
+                    shared_bytes += len(instructions_bytes)
+                    prefix_items = common_prefix_len(prev_items, item_digests)
+                    shared_bytes += sum(len(b) for b in item_bytes[:prefix_items])
+        self._previous[conv] = (cache_key, tools_digest, instructions_digest, item_digests)
+
+        total_bytes = len(tools_bytes) + len(instructions_bytes) + sum(len(b) for b in item_bytes)
+        usage = None
+        for r in reversed(seg or []):
+            name, payload = parse_event_obj(r.get("event"))
+            if name == "Completed":
+                usage = normalize_token_usage(payload)
+                break
+        input_tokens = usage["input_tokens"] if usage is not None else None
+        cached_tokens = usage["cached_input_tokens"] if usage is not None else None
+        expected = None
+        if input_tokens is not None and total_bytes:
+            expected = int(input_tokens * shared_bytes / total_bytes)
+            if expected < self.MIN_CACHEABLE_TOKENS:
+                expected = 0
+        miss = (
+            expected is not None
+            and cached_tokens is not None
+            and expected > 0
+            and cached_tokens < expected * self.MISS_RATIO
+        )
+        self.calls.append(
+            {
+                "call": index,
+                "conversation_id": conv,
+                "prompt_cache_key": cache_key,
+                "input_items": len(items),
+                "prefix_items": prefix_items,
+                "new_items": len(items) - prefix_items,
+                "prefix_bytes": shared_bytes,
+                "request_bytes": total_bytes,
+                "input_tokens": input_tokens,
+                "cached_tokens": cached_tokens,
+                "expected_cached_tokens": expected,
+                "miss": miss,
+            }
+        )
+
+    def misses(self) -> list[dict[str, Any]]:
+        """Flagged calls, largest shortfall first."""
+        return sorted(
+            (c for c in self.calls if c["miss"]),
+            key=lambda c: c["expected_cached_tokens"] - c["cached_tokens"],
+            reverse=True,
+        )
+
+    def data(self) -> dict[str, Any]:
+        with_usage = [c for c in self.calls if c["input_tokens"] is not None]
+        input_tokens = sum(c["input_tokens"] for c in with_usage)
+        cached_tokens = sum(c["cached_tokens"] for c in with_usage)
+        expected_tokens = sum(c["expected_cached_tokens"] or 0 for c in with_usage)
+        misses = self.misses()
+        summary = {
+            "calls": len(self.calls),
+            "calls_with_usage": len(with_usage),
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "expected_cached_tokens": expected_tokens,
+            "actual_cache_ratio": round(cached_tokens / input_tokens, 4) if input_tokens else None,
+            "expected_cache_ratio": round(expected_tokens / input_tokens, 4) if input_tokens else None,
+            "misses": len(misses),
+            "missed_tokens": sum(c["expected_cached_tokens"] - c["cached_tokens"] for c in misses),
+        }
+        return {"summary": summary, "calls": self.calls}
+
+    def markdown(self, data: dict[str, Any]) -> list[str]:
+        md: list[str] = [
+            "Expected reuse scales `input_tokens` by the serialized-byte share of the prefix (tools, instructions, "
+            "input[]) shared with the previous request of the same conversation and `prompt_cache_key`.",
+            "",
+            "## Summary",
+            "",
+        ]
+        md.extend(
+            md_table(
+                ["metric", "value"],
+                ([k, f"{v:.1%}" if k.endswith("_ratio") and v is not None else v] for k, v in data["summary"].items()),
+            )
+        )
+        md.extend(["", "## Largest misses", ""])
+        md.extend(
+            md_table(
+                ["call", "conversation_id", "prefix items", "new items", "input tokens", "expected cached", "cached"],
+                (
+                    [
+                        c["call"],
+                        c["conversation_id"],
+                        c["prefix_items"],
+                        c["new_items"],
+                        c["input_tokens"],
+                        c["expected_cached_tokens"],
+                        c["cached_tokens"],
+                    ]
+                    for c in self.misses()[:50]
+                ),
+            )
+        )
+        md.extend(["", "## Per call", ""])
+        md.extend(
+            md_table(
+                ["call", "conversation_id", "items", "prefix items", "prefix bytes", "request bytes", "input tokens", "expected cached", "cached", "miss"],
+                (
+                    [
+                        c["call"],
+                        c["conversation_id"],
+                        c["input_items"],
+                        c["prefix_items"],
+                        c["prefix_bytes"],
+                        c["request_bytes"],
+                        c["input_tokens"],
+                        c["expected_cached_tokens"],
+                        c["cached_tokens"],
+                        "yes" if c["miss"] else "",
+                    ]
+                    for c in self.calls
+                ),
+            )
+        )
+        return md
+
+
+class SizeReport(CallReport):
+    """
+    Where the upload bytes of each request go.
+
+    Every part of a request is measured as compact serialized JSON: `instructions`, each tool
+    schema, each `input[]` item by type (the `encrypted_content` of reasoning items separately),
+    and the remaining fields. Items are re-sent with every request of a conversation, so large
+    items are tracked by content digest and reported once, with how often they were uploaded.
+    """
+
+    TITLE = "Codex Capture Request Size Report"
+    LARGE_ITEM_BYTES = 1024
+    TOP_ITEMS = 25
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self.calls: list[dict[str, Any]] = []
+        self.part_bytes: Counter[str] = Counter()
+        # tool name -> [latest schema bytes, requests carrying it, total bytes]
+        self.tools: dict[str, list[int]] = {}
+        # content digest -> {"bytes", "part", "detail", "first_call", "sends"}
+        self.large_items: dict[str, dict[str, Any]] = {}
+
+    @staticmethod
+    def input_part(item: Any) -> tuple[str, str]:
+        """`(part, detail)` labels of one input item."""
+        if not isinstance(item, dict):
+            return "input: <unknown>", ""
+        item_type = str(item.get("type", "<missing-type>"))
+        if item_type == "message":
+            return f"input: message ({item.get('role')})", ""
+        detail = item.get("call_id") or item.get("name") or item.get("id") or ""
+        return f"input: {item_type}", str(detail)
+
+    def _track_large(self, data: bytes, index: int, part: str, detail: str) -> None:
+        if len(data) < self.LARGE_ITEM_BYTES:
+            return
+        entry = self.large_items.setdefault(
+            content_digest(data),
+            {"bytes": len(data), "part": part, "detail": detail, "first_call": index, "sends": 0},
+        )
+        entry["sends"] += 1
+
+    def add_call(
+        self,
+        index: int,
+        req_row: dict[str, Any] | None,
+        seg: EventSegment | None,
+    ) -> None:
+        req = req_row.get("request") if req_row is not None else None
+        if not isinstance(req, dict):
+            return
+        parts: Counter[str] = Counter()
+        request_bytes = len(canonical_json(req))
+        instructions = canonical_json(req.get("instructions"))
+        parts["instructions"] = len(instructions)
+        self._track_large(instructions, index, "instructions", "")
+
+        tools = req.get("tools") if isinstance(req.get("tools"), list) else []
+        for tool in tools:
+            data = canonical_json(tool)
+            name = summarize_tools([tool])[0]
+            parts["tools"] += len(data)
+            entry = self.tools.setdefault(name, [0, 0, 0])
+            entry[0] = len(data)
+            entry[1] += 1
+            entry[2] += len(data)
+            self._track_large(data, index, "tool schema", name)
+
+        items = req.get("input") if isinstance(req.get("input"), list) else []
+        largest: tuple[int, str] = (0, "")
+        for item in items:
+            data = canonical_json(item)
+            part, detail = self.input_part(item)
+            size = len(data)
+            encrypted = item.get("encrypted_content") if isinstance(item, dict) else None
+            if isinstance(encrypted, str):
+                encrypted_size = len(canonical_json(encrypted))
+                parts[f"{part} encrypted_content"] += encrypted_size
+                size -= encrypted_size
+            parts[part] += size
+            largest = max(largest, (len(data), part))
+            self._track_large(data, index, part, detail)
+
+        parts["other fields"] = request_bytes - sum(parts.values())
+        self.part_bytes.update(parts)
+        self.calls.append(
+            {
+                "call": index,
+                "conversation_id": req_row.get("conversation_id"),
+                "request_bytes": request_bytes,
+                "input_items": len(items),
+                "parts": dict(parts),
+                "largest_item_bytes": largest[0],
+                "largest_item_part": largest[1] or None,
+            }
+        )
+
+    def data(self) -> dict[str, Any]:
+        total = sum(c["request_bytes"] for c in self.calls)
+        parts = [
+            {
+                "part": part,
+                "bytes": size,
+                "share": round(size / total, 4) if total else None,
+                "mean_per_call": round(size / len(self.calls), 1),
+            }
+            for part, size in self.part_bytes.most_common()
+        ]
+        tools = [
+            {"tool": name, "schema_bytes": latest, "requests": sends, "total_bytes": sent}
+            for name, (latest, sends, sent) in sorted(self.tools.items(), key=lambda kv: -kv[1][2])
+        ]
+        largest = sorted(self.large_items.values(), key=lambda e: (-e["bytes"], e["first_call"]))[: self.TOP_ITEMS]
+        for entry in largest:
+            entry["total_bytes"] = entry["bytes"] * entry["sends"]
+        summary = {
+            "calls": len(self.calls),
+            "request_bytes": total,
+            "mean_request_bytes": round(total / len(self.calls), 1) if self.calls else None,
+            "max_request_bytes": max((c["request_bytes"] for c in self.calls), default=None),
+        }
+        return {"summary": summary, "parts": parts, "tools": tools, "largest_items": largest, "calls": self.calls}
+
+    def markdown(self, data: dict[str, Any]) -> list[str]:
+        parts, tools, largest = data["parts"], data["tools"], data["largest_items"]
+        md: list[str] = [
+            "Sizes are compact serialized JSON bytes of each part of the request body; `other fields` is the "
+            "remainder (model, reasoning, include, keys and separators).",
+            "",
+            "## Summary",
+            "",
+        ]
+        md.extend(md_table(["metric", "value"], ([k, v] for k, v in data["summary"].items())))
+        md.extend(["", "## Where the bytes go", ""])
+        md.extend(
+            md_table(
+                ["part", "bytes", "share", "mean per call"],
+                ([p["part"], p["bytes"], f"{p['share']:.1%}" if p["share"] is not None else None, p["mean_per_call"]] for p in parts),
+            )
+        )
+        md.extend(["", "## Tool schemas", ""])
+        md.extend(
+            md_table(
+                ["tool", "schema bytes", "requests", "total bytes"],
+                ([t["tool"], t["schema_bytes"], t["requests"], t["total_bytes"]] for t in tools),
+            )
+        )
+        md.extend(["", f"## Largest items (>= {self.LARGE_ITEM_BYTES} bytes, each distinct item once)", ""])
+        md.extend(
+            md_table(
+                ["bytes", "part", "detail", "first call", "uploads", "total bytes"],
+                ([e["bytes"], e["part"], e["detail"] or None, e["first_call"], e["sends"], e["total_bytes"]] for e in largest),
+            )
+        )
+        md.extend(["", "## Per call", ""])
+        md.extend(
+            md_table(
+                ["call", "request bytes", "instructions", "tools", "input items", "input bytes", "largest item"],
+                (
+                    [
+                        c["call"],
+                        c["request_bytes"],
+                        c["parts"].get("instructions", 0),
+                        c["parts"].get("tools", 0),
+                        c["input_items"],
+                        sum(v for k, v in c["parts"].items() if k.startswith("input: ")),
+                        f"{c['largest_item_bytes']} ({c['largest_item_part']})" if c["largest_item_part"] else None,
+                    ]
+                    for c in data["calls"]
+                ),
+            )
+        )
+        return md
+
+
+class TokenLedger(CallReport):
+    """
+    Token usage per call and per conversation from the Completed events, with running totals.
+
+    Only each segment's Completed row is decoded; timestamps and, for calls without a request row,
+    the conversation id are read from the row headers. Output tokens/sec is measured against the
+    segment duration (first to last event), as in the latency report.
+    """
+
+    TITLE = "Codex Capture Token Ledger"
+
+    CSV_FIELDS = (
+        "call",
+        "conversation_id",
+        "model",
+        "request_ts_ms",
+        "input_tokens",
+        "cached_input_tokens",
+        "output_tokens",
+        "reasoning_output_tokens",
+        "total_tokens",
+        "segment_ms",
+        "output_tokens_per_sec",
+        "running_total_tokens",
+        "conversation_running_total_tokens",
+    )
+    TOP_CALLS = 20
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self.calls: list[dict[str, Any]] = []
+        self.running_total = 0
+        self.conversations: dict[Any, dict[str, Any]] = {}
+
+    def add_call(
+        self,
+        index: int,
+        req_row: dict[str, Any] | None,
+        seg: EventSegment | None,
+    ) -> None:
+        lines = seg.lines if seg is not None else []
+        usage = None
+        for line in reversed(lines):
+            if is_completed_line(line):
+                _name, payload = parse_event_obj(json.loads(line.decode("utf-8")).get("event"))
+                usage = normalize_token_usage(payload)
+                break
+        if req_row is None and usage is None:
+            return
+        req = req_row.get("request") if req_row is not None else None
+        conv = req_row.get("conversation_id") if req_row is not None else None
+        if conv is None:
+            conv = next((c for c in (peek_row_header(line)[1] for line in lines) if c is not None), None)
+        segment_ms = None
+        if lines:
+            first_ts, last_ts = peek_row_header(lines[0])[0], peek_row_header(lines[-1])[0]
+            if isinstance(first_ts, int) and isinstance(last_ts, int):
+                segment_ms = last_ts - first_ts
+        tokens = usage or {key: 0 for key in TOKEN_KEYS}
+        self.running_total += tokens["total_tokens"]
+        totals = self.conversations.get(conv)
+        if totals is None:
+            totals = self.conversations[conv] = {
+                "conversation_id": conv,
+                "calls": 0,
+                "calls_with_usage": 0,
+                **{key: 0 for key in TOKEN_KEYS},
+                "max_input_tokens": 0,
+                "segment_ms": 0,
+                "first_call": index,
+                "last_call": index,
+            }
+        totals["calls"] += 1
+        totals["last_call"] = index
+        if usage is not None:
+            totals["calls_with_usage"] += 1
+            for key in TOKEN_KEYS:
+                totals[key] += usage[key]
+            totals["max_input_tokens"] = max(totals["max_input_tokens"], usage["input_tokens"])
+            totals["segment_ms"] += segment_ms or 0
+        self.calls.append(
+            {
+                "call": index,
+                "conversation_id": conv,
+                "model": req.get("model") if isinstance(req, dict) else None,
+                "request_ts_ms": req_row.get("ts_ms") if req_row is not None else None,
+                **{key: usage[key] if usage is not None else None for key in TOKEN_KEYS},
+                "segment_ms": segment_ms,
+                "output_tokens_per_sec": (
+                    round(usage["output_tokens"] * 1000.0 / segment_ms, 3) if usage is not None and segment_ms else None
+                ),
+                "running_total_tokens": self.running_total,
+                "conversation_running_total_tokens": totals["total_tokens"],
+            }
+        )
+
+    def data(self) -> dict[str, Any]:
+        with_usage = [c for c in self.calls if c["total_tokens"] is not None]
+        totals = {key: sum(c[key] for c in with_usage) for key in TOKEN_KEYS}
+        segment_ms = sum(c["segment_ms"] or 0 for c in with_usage)
+        summary = {
+            "calls": len(self.calls),
+            "calls_with_usage": len(with_usage),
+            "conversations": len(self.conversations),
+            **totals,
+            "cache_ratio": round(totals["cached_input_tokens"] / totals["input_tokens"], 4) if totals["input_tokens"] else None,
+            "output_tokens_per_sec": round(totals["output_tokens"] * 1000.0 / segment_ms, 3) if segment_ms else None,
+        }
+        conversations = sorted(self.conversations.values(), key=lambda c: -c["total_tokens"])
+        for conv in conversations:
+            conv["output_tokens_per_sec"] = (
+                round(conv["output_tokens"] * 1000.0 / conv["segment_ms"], 3) if conv["segment_ms"] else None
+            )
+        expensive = sorted(with_usage, key=lambda c: (-c["total_tokens"], c["call"]))[: self.TOP_CALLS]
+        return {
+            "summary": summary,
+            "conversations": conversations,
+            "most_expensive_calls": expensive,
+            "calls": self.calls,
+        }
+
+    def markdown(self, data: dict[str, Any]) -> list[str]:
+        md: list[str] = ["## Summary", ""]
+        md.extend(
+            md_table(
+                ["metric", "value"],
+                ([k, f"{v:.1%}" if k == "cache_ratio" and v is not None else v] for k, v in data["summary"].items()),
+            )
+        )
+        md.extend(["", "## Per conversation", ""])
+        md.extend(
+            md_table(
+                ["conversation_id", "calls", "input", "cached", "output", "reasoning", "total", "max input", "output tokens/sec"],
+                (
+                    [
+                        c["conversation_id"],
+                        c["calls"],
+                        c["input_tokens"],
+                        c["cached_input_tokens"],
+                        c["output_tokens"],
+                        c["reasoning_output_tokens"],
+                        c["total_tokens"],
+                        c["max_input_tokens"],
+                        c["output_tokens_per_sec"],
+                    ]
+                    for c in data["conversations"]
+                ),
+            )
+        )
+        md.extend(["", f"## Most expensive calls (top {self.TOP_CALLS} by total tokens)", ""])
+        md.extend(
+            md_table(
+                ["call", "conversation_id", "model", "input", "cached", "output", "reasoning", "total", "output tokens/sec"],
+                (
+                    [
+                        c["call"],
+                        c["conversation_id"],
+                        c["model"],
+                        c["input_tokens"],
+                        c["cached_input_tokens"],
+                        c["output_tokens"],
+                        c["reasoning_output_tokens"],
+                        c["total_tokens"],
+                        c["output_tokens_per_sec"],
+                    ]
+                    for c in data["most_expensive_calls"]
+                ),
+            )
+        )
+        md.extend(["", "## Per call", ""])
+        md.extend(
+            md_table(
+                ["call", "conversation_id", "input", "cached", "output", "total", "segment (ms)", "tokens/sec", "running total", "conversation total"],
+                (
+                    [
+                        c["call"],
+                        c["conversation_id"],
+                        c["input_tokens"],
+                        c["cached_input_tokens"],
+                        c["output_tokens"],
+                        c["total_tokens"],
+                        c["segment_ms"],
+                        c["output_tokens_per_sec"],
+                        c["running_total_tokens"],
+                        c["conversation_running_total_tokens"],
+                    ]
+                    for c in data["calls"]
+                ),
+            )
+        )
+        return md
+
+    def write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.with_suffix(".csv").open("w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.calls)
+        super().write()
+
+
+class CaptureProfile:
+    """
+    Per-call performance profile of one capture.
+
+    `tool_ms` of a call is tool time as the tool report measures it: from the last tool call the
+    call emitted (see `call_timing`) to the next request of the same conversation that carries one
+    of those calls' outputs. It stays None for calls whose tool outputs never come back.
+    """
+
+    def __init__(self) -> None:
+        self.calls: list[dict[str, Any]] = []
+        # conversation_id -> (profile of the last call, its tool_start_ts, call_ids it emitted)
+        self._pending: dict[Any, tuple[dict[str, Any], int | None, set[Any]]] = {}
+
+    def add_call(self, index: int, req_row: dict[str, Any] | None, seg: EventSegment | None) -> None:
+        conv = call_conversation_id(req_row, seg)
+        request_ts = req_row.get("ts_ms") if req_row is not None else None
+        req = req_row.get("request") if req_row is not None else None
+        pending = self._pending.pop(conv, None)
+        if pending is not None and isinstance(req, dict) and isinstance(req.get("input"), list):
+            previous, tool_start_ts, call_ids = pending
+            carried = any(
+                isinstance(item, dict) and item.get("type") in TOOL_OUTPUT_ITEM_TYPES and item.get("call_id") in call_ids
+                for item in req["input"]
+            )
+            if carried and isinstance(request_ts, int) and isinstance(tool_start_ts, int):
+                previous["tool_ms"] = request_ts - tool_start_ts
+
+        timing = call_timing(request_ts, seg)
+        tools: list[str] = []
+        first_delta_ts: int | None = None
+        completed: Any = None
+        lines = seg.lines if seg is not None else []
+        for line in lines:
+            if first_delta_ts is not None and b"OutputItemDone" not in line and b"Completed" not in line:
+                continue
+            name = event_line_name(line)
+            if name == "OutputTextDelta":
+                if first_delta_ts is None:
+                    first_delta_ts = peek_row_header(line)[0]
+            elif name in ("OutputItemDone", "Completed"):
+                _name, payload = parse_event_obj(json.loads(line.decode("utf-8")).get("event"))
+                if name == "Completed":
+                    completed = payload
+                    continue
+                tool = tool_call_name(payload)
+                if tool is not None:
+                    tools.append(tool)
+        first_ts = peek_row_header(lines[0])[0] if lines else None
+        end_ts = peek_row_header(lines[-1])[0] if lines else None
+        usage = normalize_token_usage(completed)
+        profile = {
+            "call": index,
+            "conversation_id": conv,
+            "tools": tools,
+            "request_bytes": len(canonical_json(req)) if isinstance(req, dict) else 0,
+            "input_tokens": usage["input_tokens"] if usage is not None else None,
+            "output_tokens": usage["output_tokens"] if usage is not None else None,
+            "ttft_ms": (
+                first_delta_ts - request_ts if isinstance(request_ts, int) and isinstance(first_delta_ts, int) else None
+            ),
+            "streaming_ms": end_ts - first_ts if isinstance(first_ts, int) and isinstance(end_ts, int) else None,
+            "tool_ms": None,
+        }
+        self.calls.append(profile)
+        if timing["tool_calls"]:
+            call_ids = {call_id for call_id, _tool, _ts in timing["tool_calls"]}
+            self._pending[conv] = (profile, timing["tool_start_ts"], call_ids)
+
+    def summary(self) -> dict[str, Any]:
+        def total(key: str) -> int:
+            return sum(c[key] or 0 for c in self.calls)
+
+        ttft = sorted(c["ttft_ms"] for c in self.calls if c["ttft_ms"] is not None)
+        return {
+            "calls": len(self.calls),
+            "request_bytes": total("request_bytes"),
+            "input_tokens": total("input_tokens"),
+            "output_tokens": total("output_tokens"),
+            "ttft_p50_ms": percentile(ttft, 50),
+            "ttft_p90_ms": percentile(ttft, 90),
+            "streaming_ms": total("streaming_ms"),
+            "tool_ms": total("tool_ms"),
+        }
+
+
+DIFF_METRICS = (
+    "calls",
+    "request_bytes",
+    "input_tokens",
+    "output_tokens",
+    "ttft_p50_ms",
+    "ttft_p90_ms",
+    "streaming_ms",
+    "tool_ms",
+)
+
+
+DIFF_CALL_METRICS = ("request_bytes", "input_tokens", "output_tokens", "ttft_ms", "streaming_ms", "tool_ms")
+
+
+# (metric, limit, relative): fail when the metric grows by more than `limit` (percent if relative).
+DiffThreshold = tuple[str, float, bool]
+
+
+def align_calls(old: list[dict[str, Any]], new: list[dict[str, Any]]) -> list[tuple[dict[str, Any] | None, dict[str, Any] | None]]:
+    """Align two runs' calls by order and the tools each call emitted; unmatched calls pair with None."""
+    matcher = difflib.SequenceMatcher(
+        None,
+        [tuple(c["tools"]) for c in old],
+        [tuple(c["tools"]) for c in new],
+        autojunk=False,
+    )
+    pairs: list[tuple[dict[str, Any] | None, dict[str, Any] | None]] = []
+    for _tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        olds, news = old[i1:i2], new[j1:j2]
+        pairs.extend(itertools.zip_longest(olds, news))
+    return pairs
+
+
+def diff_tools_cell(before: list[str] | None, after: list[str] | None) -> str | None:
+    if before is not None and after is not None and before != after:
+        return f"{', '.join(before) or '(none)'} -> {', '.join(after) or '(none)'}"
+    tools = after if after is not None else before
+    return ", ".join(tools) if tools else None
+
+
+class DiffReport(CallReport):
+    """
+    Performance diff of this capture against a baseline capture of the same scripted task.
+
+    Calls are aligned by order and tool sequence; totals and TTFT percentiles are compared and
+    checked against the --diff-threshold gates.
+    """
+
+    TITLE = "Codex Capture Performance Diff"
+
+    def __init__(
+        self,
+        path: Path,
+        baseline_requests: Path,
+        baseline_events: Path | None,
+        join: str,
+        thresholds: list[DiffThreshold],
+        call_filter: CallFilter | None = None,
+    ) -> None:
+        super().__init__(path)
+        self.baseline_requests = baseline_requests
+        self.baseline_events = baseline_events
+        self.join = join
+        self.thresholds = thresholds
+        self.call_filter = call_filter
+        self.current = CaptureProfile()
+        self.exceeded: list[str] = []
+
+    def add_call(
+        self,
+        index: int,
+        req_row: dict[str, Any] | None,
+        seg: EventSegment | None,
+    ) -> None:
+        self.current.add_call(index, req_row, seg)
+
+    def data(self) -> dict[str, Any]:
+        baseline = CaptureProfile()
+        for call in iter_pair_calls(self.baseline_requests, self.baseline_events, self.join, self.call_filter):
+            baseline.add_call(*call)
+        old, new = baseline.summary(), self.current.summary()
+        metrics: list[dict[str, Any]] = []
+        for metric in DIFF_METRICS:
+            before, after = old[metric], new[metric]
+            delta = after - before if before is not None and after is not None else None
+            change = round(delta / before, 4) if delta is not None and before else None
+            metrics.append({"metric": metric, "baseline": before, "current": after, "delta": delta, "change": change})
+        by_metric = {m["metric"]: m for m in metrics}
+
+        self.exceeded = []
+        gates: list[dict[str, Any]] = []
+        for metric, limit, relative in self.thresholds:
+            m = by_metric[metric]
+            if m["delta"] is None:
+                failed = False
+            elif relative:
+                failed = m["delta"] > 0 and (not m["baseline"] or m["delta"] * 100.0 / m["baseline"] > limit)
+            else:
+                failed = m["delta"] > limit
+            threshold = f"{metric} +{limit:g}{'%' if relative else ''}"
+            gates.append({"threshold": threshold, "delta": m["delta"], "change": m["change"], "exceeded": failed})
+            if failed:
+                self.exceeded.append(threshold)
+
+        aligned = []
+        for before_call, after_call in align_calls(baseline.calls, self.current.calls):
+            row: dict[str, Any] = {
+                "baseline_call": before_call["call"] if before_call is not None else None,
+                "current_call": after_call["call"] if after_call is not None else None,
+                "baseline_tools": before_call["tools"] if before_call is not None else None,
+                "current_tools": after_call["tools"] if after_call is not None else None,
+            }
+            for key in DIFF_CALL_METRICS:
+                a = before_call[key] if before_call is not None else None
+                b = after_call[key] if after_call is not None else None
+                row[key] = {"baseline": a, "current": b, "delta": b - a if a is not None and b is not None else None}
+            aligned.append(row)
+        return {"metrics": metrics, "thresholds": gates, "exceeded": self.exceeded, "calls": aligned}
+
+    def markdown(self, data: dict[str, Any]) -> list[str]:
+        md: list[str] = []
+        md.append(f"- baseline: `{self.baseline_requests}`" + (f", `{self.baseline_events}`" if self.baseline_events else ""))
+        md.append(f"- result: `{'FAIL: ' + ', '.join(self.exceeded) if self.exceeded else 'ok'}`")
+        md.extend(["", "## Totals", ""])
+        md.extend(
+            md_table(
+                ["metric", "baseline", "current", "delta", "change"],
+                (
+                    [m["metric"], m["baseline"], m["current"], m["delta"], f"{m['change']:+.1%}" if m["change"] is not None else None]
+                    for m in data["metrics"]
+                ),
+            )
+        )
+        if data["thresholds"]:
+            md.extend(["", "## Thresholds", ""])
+            md.extend(
+                md_table(
+                    ["threshold", "delta", "change", "exceeded"],
+                    (
+                        [g["threshold"], g["delta"], f"{g['change']:+.1%}" if g["change"] is not None else None, "yes" if g["exceeded"] else ""]
+                        for g in data["thresholds"]
+                    ),
+                )
+            )
+        md.extend(["", "## Aligned calls", ""])
+        md.extend(
+            md_table(
+                ["baseline", "current", "tools", *(f"Δ {key}" for key in DIFF_CALL_METRICS)],
+                (
+                    [
+                        r["baseline_call"],
+                        r["current_call"],
+                        diff_tools_cell(r["baseline_tools"], r["current_tools"]),
+                        *(r[key]["delta"] for key in DIFF_CALL_METRICS),
+                    ]
+                    for r in data["calls"]
+                ),
+            )
+        )
+        return md
+
+
+class TraceExport:
+    """
+    Chrome Trace Event Format timeline of the session, for chrome://tracing or ui.perfetto.dev.
+
+    Each conversation is a trace process with two tracks. `GPT calls` has a span per call, from its
+    request to its Completed event, with instants for the first OutputTextDelta and every
+    OutputItemDone. `tools` has a span per tool call, from the OutputItemDone that emitted it to the
+    request carrying its output (joined by `call_id` as in the tool report). All spans of one turn
+    end at the same request, so they nest. Events are streamed to the file as calls arrive.
+    """
+
+    CALL_TID = 1
+    TOOL_TID = 2
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._out: IO[str] | None = None
+        self._pids: dict[Any, int] = {}
+        # conversation_id -> {call_id: (tool, emitted_ts_ms, emitting call index)}
+        self._pending: dict[Any, dict[str, tuple[str, int, int]]] = {}
+
+    def _emit(self, event: dict[str, Any]) -> None:
+        if self._out is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._out = self.path.open("w", encoding="utf-8")
+            self._out.write('{"displayTimeUnit":"ms","traceEvents":[\n')
+        else:
+            self._out.write(",\n")
+        self._out.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+
+    def _pid(self, conv: Any) -> int:
+        pid = self._pids.get(conv)
+        if pid is None:
+            pid = self._pids[conv] = len(self._pids) + 1
+            label = f"conversation {conv}" if conv is not None else "unknown conversation"
+            self._emit({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": label}})
+            self._emit({"name": "process_sort_index", "ph": "M", "pid": pid, "args": {"sort_index": pid}})
+            for tid, name in ((self.CALL_TID, "GPT calls"), (self.TOOL_TID, "tools")):
+                self._emit({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        return pid
+
+    def add_call(
+        self,
+        index: int,
+        req_row: dict[str, Any] | None,
+        seg: EventSegment | None,
+    ) -> None:
+        conv = call_conversation_id(req_row, seg)
+        pid = self._pid(conv)
+        pending = self._pending.setdefault(conv, {})
+        request_ts = req_row.get("ts_ms") if req_row is not None else None
+        req = req_row.get("request") if req_row is not None else None
+        if not isinstance(request_ts, int):
+            request_ts = None
+
+        if request_ts is not None and pending and isinstance(req, dict) and isinstance(req.get("input"), list):
+            for item in req["input"]:
+                if not isinstance(item, dict) or item.get("type") not in TOOL_OUTPUT_ITEM_TYPES:
+                    continue
+                hit = pending.pop(item.get("call_id"), None)
+                if hit is None:
+                    continue
+                tool, emitted_ts, emitted_by = hit
+                self._emit(
+                    {
+                        "name": tool,
+                        "cat": "tool",
+                        "ph": "X",
+                        "ts": emitted_ts * 1000,
+                        "dur": max(0, request_ts - emitted_ts) * 1000,
+                        "pid": pid,
+                        "tid": self.TOOL_TID,
+                        "args": {"call_id": item.get("call_id"), "emitted_by_call": emitted_by, "output_sent_by_call": index},
+                    }
+                )
+
+        first_ts: int | None = None
+        last_ts: int | None = None
+        completed_ts: int | None = None
+        completed: Any = None
+        first_delta_ts: int | None = None
+        for r in seg or []:
+            ts_ms = r.get("ts_ms")
+            if not isinstance(ts_ms, int):
+                continue
+            first_ts = ts_ms if first_ts is None else min(first_ts, ts_ms)
+            last_ts = ts_ms if last_ts is None else max(last_ts, ts_ms)
+            name, payload = parse_event_obj(r.get("event"))
+            if name == "OutputTextDelta" and first_delta_ts is None:
+                first_delta_ts = ts_ms
+                ttft = ts_ms - request_ts if request_ts is not None else None
+                self._emit(
+                    {"name": "first token", "ph": "i", "s": "t", "ts": ts_ms * 1000, "pid": pid, "tid": self.CALL_TID, "args": {"call": index, "ttft_ms": ttft}}
+                )
+            elif name == "Completed":
+                completed_ts = ts_ms
+                completed = payload
+            elif name == "OutputItemDone" and isinstance(payload, dict):
+                item_type = payload.get("type")
+                args = {"call": index, "type": item_type}
+                if item_type in TOOL_CALL_ITEM_TYPES:
+                    args.update({"tool": payload.get("name"), "call_id": payload.get("call_id")})
+                    if payload.get("call_id") is not None:
+                        pending[payload["call_id"]] = (str(payload.get("name", "<missing-name>")), ts_ms, index)
+                self._emit(
+                    {"name": f"OutputItemDone {item_type}", "ph": "i", "s": "t", "ts": ts_ms * 1000, "pid": pid, "tid": self.CALL_TID, "args": args}
+                )
+
+        start = request_ts if request_ts is not None else first_ts
+        end = completed_ts if completed_ts is not None else last_ts
+        if start is None:
+            return
+        self._emit(
+            {
+                "name": f"GPT call #{index}",
+                "cat": "call",
+                "ph": "X",
+                "ts": start * 1000,
+                "dur": max(0, (end if end is not None else start) - start) * 1000,
+                "pid": pid,
+                "tid": self.CALL_TID,
+                "args": {
+                    "call": index,
+                    "model": req.get("model") if isinstance(req, dict) else None,
+                    "events": len(seg) if seg is not None else 0,
+                    "completed": completed_ts is not None,
+                    "response_id": completed.get("response_id") if isinstance(completed, dict) else None,
+                    "token_usage": normalize_token_usage(completed),
+                },
+            }
+        )
+
+    def write(self) -> None:
+        if self._out is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._out = self.path.open("w", encoding="utf-8")
+            self._out.write('{"displayTimeUnit":"ms","traceEvents":[')
+        self._out.write("\n]}\n")
+        self._out.close()
+        self._out = None
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Incremental SQLite export of a capture pair (`format_codex_capture.py --sqlite DB`).
+
+The captures are loaded into normalized tables for ad-hoc SQL. Calls are paired by position, as
+with the index: each side keeps its read state in the database (plus the number of calls it has
+loaded) and the next load resumes at the byte offset where the previous one stopped. The events
+side stops at the start of the still-open segment, so a call's events are loaded once its
+Completed row has been written. The whole load, including the new read states, is one
+transaction; rows are inserted with batched executemany. A capture that was truncated or replaced
+(or a different capture pair) reloads the database from scratch.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+from codex_capture import (
+    ARCHIVE_RECORD_PREFIX,
+    FINGERPRINT_BYTES,
+    ArchiveResolver,
+    EventRow,
+    RequestRow,
+    canonical_json,
+    content_digest,
+    empty_read_state,
+    file_fingerprint,
+    is_capture_archive,
+    is_completed_line,
+    iter_complete_lines,
+    normalize_token_usage,
+    open_capture,
+    read_state_is_reusable,
+    tool_call_name,
+)
+
+
+SQLITE_VERSION = 1
+SQLITE_BATCH_ROWS = 5000
+
+SQLITE_TABLES = """
+CREATE TABLE IF NOT EXISTS load_state (kind TEXT PRIMARY KEY, state TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS calls (
+    call INTEGER PRIMARY KEY,
+    conversation_id TEXT,
+    ts_ms INTEGER,
+    model TEXT,
+    request_bytes INTEGER,
+    input_items INTEGER,
+    first_event_ts_ms INTEGER,
+    first_delta_ts_ms INTEGER,
+    completed_ts_ms INTEGER,
+    event_rows INTEGER,
+    response_id TEXT
+);
+CREATE TABLE IF NOT EXISTS input_items (
+    call INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    type TEXT,
+    role TEXT,
+    call_id TEXT,
+    name TEXT,
+    bytes INTEGER,
+    digest TEXT,
+    PRIMARY KEY (call, position)
+);
+CREATE TABLE IF NOT EXISTS output_items (
+    call INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    ts_ms INTEGER,
+    type TEXT,
+    role TEXT,
+    call_id TEXT,
+    name TEXT,
+    bytes INTEGER,
+    PRIMARY KEY (call, position)
+);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    call INTEGER NOT NULL,
+    call_id TEXT,
+    name TEXT,
+    type TEXT,
+    ts_ms INTEGER,
+    arguments_bytes INTEGER
+);
+CREATE TABLE IF NOT EXISTS usage (
+    call INTEGER PRIMARY KEY,
+    input_tokens INTEGER,
+    cached_input_tokens INTEGER,
+    output_tokens INTEGER,
+    reasoning_output_tokens INTEGER,
+    total_tokens INTEGER
+);
+"""
+# Created after the tables are loaded, so a first load does not maintain them row by row.
+SQLITE_INDEXES = """
+CREATE INDEX IF NOT EXISTS calls_conversation_id ON calls (conversation_id, call);
+CREATE INDEX IF NOT EXISTS calls_ts_ms ON calls (ts_ms);
+CREATE INDEX IF NOT EXISTS input_items_call_id ON input_items (call_id);
+CREATE INDEX IF NOT EXISTS output_items_call_id ON output_items (call_id);
+CREATE INDEX IF NOT EXISTS tool_calls_name ON tool_calls (name);
+CREATE INDEX IF NOT EXISTS tool_calls_call_id ON tool_calls (call_id);
+CREATE INDEX IF NOT EXISTS tool_calls_call ON tool_calls (call);
+"""
+SQLITE_DATA_TABLES = ("calls", "input_items", "output_items", "tool_calls", "usage")
+
+_SQL_CALL_REQUEST = """
+INSERT INTO calls (call, conversation_id, ts_ms, model, request_bytes, input_items) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (call) DO UPDATE SET
+    conversation_id = excluded.conversation_id, ts_ms = excluded.ts_ms, model = excluded.model,
+    request_bytes = excluded.request_bytes, input_items = excluded.input_items
+"""
+_SQL_CALL_EVENTS = """
+INSERT INTO calls (call, conversation_id, first_event_ts_ms, first_delta_ts_ms, completed_ts_ms, event_rows, response_id)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (call) DO UPDATE SET
+    conversation_id = coalesce(calls.conversation_id, excluded.conversation_id),
+    first_event_ts_ms = excluded.first_event_ts_ms, first_delta_ts_ms = excluded.first_delta_ts_ms,
+    completed_ts_ms = excluded.completed_ts_ms, event_rows = excluded.event_rows, response_id = excluded.response_id
+"""
+_SQL_INPUT_ITEM = "INSERT INTO input_items VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_SQL_OUTPUT_ITEM = "INSERT INTO output_items VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_SQL_TOOL_CALL = "INSERT INTO tool_calls VALUES (?, ?, ?, ?, ?, ?)"
+_SQL_USAGE = "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def empty_load_state(path: Path | None) -> dict[str, Any]:
+    return {**empty_read_state(path), "calls": 0}
+
+
+class SqliteExport:
+    """Incremental loader of a capture pair into a SQLite database."""
+
+    def __init__(self, db_path: Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SQLITE_VERSION):
+            self.conn.close()
+            raise RuntimeError(f"{db_path} was written by an incompatible --sqlite version ({version})")
+        self.conn.executescript(SQLITE_TABLES)
+        self.conn.execute(f"PRAGMA user_version = {SQLITE_VERSION}")
+        self._pending: dict[str, list[tuple[Any, ...]]] = defaultdict(list)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _queue(self, sql: str, row: tuple[Any, ...]) -> None:
+        rows = self._pending[sql]
+        rows.append(row)
+        if len(rows) >= SQLITE_BATCH_ROWS:
+            self.conn.executemany(sql, rows)
+            rows.clear()
+
+    def _flush(self) -> None:
+        for sql, rows in self._pending.items():
+            if rows:
+                self.conn.executemany(sql, rows)
+                rows.clear()
+
+    def _load_state(self, kind: str, path: Path | None) -> dict[str, Any] | None:
+        """The stored state for one side, or None when it does not match the capture on disk."""
+        row = self.conn.execute("SELECT state FROM load_state WHERE kind = ?", (kind,)).fetchone()
+        state = json.loads(row[0]) if row is not None else empty_load_state(path)
+        return state if read_state_is_reusable(state, path) else None
+
+    def add_request(self, call: int, line: bytes) -> None:
+        req = RequestRow(line)
+        items = req.input
+        self._queue(_SQL_CALL_REQUEST, (call, req.conversation_id, req.ts_ms, req.model, len(line), len(items)))
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                item = {"type": None}
+            data = canonical_json(item)
+            self._queue(
+                _SQL_INPUT_ITEM,
+                (call, position, item.get("type"), item.get("role"), item.get("call_id"), item.get("name"), len(data), content_digest(data)),
+            )
+
+    def add_segment(self, call: int, lines: list[bytes]) -> None:
+        events = [EventRow(line) for line in lines]
+        first_delta_ts_ms = next((event.ts_ms for event in events if event.name == "OutputTextDelta"), None)
+        completed: Any = None
+        completed_ts_ms: int | None = None
+        position = 0
+        for event in events:
+            if event.name == "Completed":
+                completed, completed_ts_ms = event.payload, event.ts_ms
+            elif event.name == "OutputItemDone" and isinstance(event.payload, dict):
+                item = event.payload
+                self._queue(
+                    _SQL_OUTPUT_ITEM,
+                    (call, position, event.ts_ms, item.get("type"), item.get("role"), item.get("call_id"), item.get("name"), len(canonical_json(item))),
+                )
+                position += 1
+                name = tool_call_name(item)
+                if name is not None:
+                    arguments = item.get("arguments", item.get("input"))
+                    self._queue(
+                        _SQL_TOOL_CALL,
+                        (call, item.get("call_id"), name, item.get("type"), event.ts_ms, len(str(arguments)) if arguments is not None else None),
+                    )
+        conversation_id = next((event.conversation_id for event in events if event.conversation_id is not None), None)
+        response_id = completed.get("response_id") if isinstance(completed, dict) else None
+        self._queue(
+            _SQL_CALL_EVENTS,
+            (call, conversation_id, events[0].ts_ms, first_delta_ts_ms, completed_ts_ms, len(events), response_id),
+        )
+        usage = normalize_token_usage(completed)
+        if usage is not None:
+            self._queue(_SQL_USAGE, (call, *usage.values()))
+
+    def _load_requests(self, path: Path, state: dict[str, Any]) -> int:
+        loaded = 0
+        resolver = ArchiveResolver(open_capture(path)) if is_capture_archive(path) else None
+        try:
+            for line, end in iter_complete_lines(path, state["scanned"]):
+                state["scanned"] = end
+                if resolver is not None:
+                    # Archive blobs and the header are skipped; records resolve to the original line.
+                    if not line.startswith(ARCHIVE_RECORD_PREFIX):
+                        continue
+                    line = resolver.resolve(line)
+                if not line.strip():
+                    continue
+                state["calls"] += 1
+                state["rows"] += 1
+                loaded += 1
+                self.add_request(state["calls"], line)
+        finally:
+            if resolver is not None:
+                resolver.close()
+        return loaded
+
+    def _load_events(self, path: Path, state: dict[str, Any]) -> int:
+        loaded = 0
+        lines: list[bytes] = []
+        for line, end in iter_complete_lines(path, state["scanned"]):
+            if not line.strip():
+                continue
+            lines.append(line)
+            if is_completed_line(line):
+                state["calls"] += 1
+                state["rows"] += len(lines)
+                state["scanned"] = end
+                loaded += 1
+                self.add_segment(state["calls"], lines)
+                lines = []
+        return loaded
+
+    def load(self, requests_path: Path, events_path: Path | None) -> dict[str, int]:
+        """Append the calls written since the last load; returns the request/segment counts loaded."""
+        stats = {"requests": 0, "segments": 0, "reset": 0}
+        with self.conn:
+            requests_state = self._load_state("requests", requests_path)
+            events_state = self._load_state("events", events_path)
+            if requests_state is None or events_state is None:
+                # Pairing is positional, so a replaced capture on either side invalidates every call.
+                for table in (*SQLITE_DATA_TABLES, "load_state"):
+                    self.conn.execute(f"DELETE FROM {table}")
+                requests_state = empty_load_state(requests_path)
+                events_state = empty_load_state(events_path)
+                stats["reset"] = 1
+            for kind, path, state in (("requests", requests_path, requests_state), ("events", events_path, events_state)):
+                if path is None or not path.exists() or path.stat().st_size == state["size"]:
+                    continue
+                if kind == "requests":
+                    stats["requests"] = self._load_requests(path, state)
+                else:
+                    stats["segments"] = self._load_events(path, state)
+                state["size"] = path.stat().st_size
+                if state["fingerprint"] is None and state["scanned"]:
+                    state["fingerprint"] = file_fingerprint(path, min(state["scanned"], FINGERPRINT_BYTES))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO load_state VALUES (?, ?)",
+                    (kind, json.dumps(state, ensure_ascii=False, separators=(",", ":"))),
+                )
+            self._flush()
+        self.conn.executescript(SQLITE_INDEXES)
+        return stats
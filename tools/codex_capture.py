@@ -0,0 +1,1228 @@
+#!/usr/bin/env python3
+"""
+Typed, streaming reader for Codex capture JSONL files.
+
+Shared by format_codex_capture.py and ad-hoc analysis scripts:
+- CODEX_CAPTURE_RESPONSES_REQUESTS_PATH (outgoing ResponsesApiRequest bodies)
+- CODEX_CAPTURE_RESPONSES_EVENTS_PATH   (incoming ResponseEvent stream)
+
+Captures may be plain, `.gz`/`.zst` compressed, or `--compact` archives; all of them read the same.
+
+    import codex_capture as cc
+
+    for call in cc.iter_calls(Path("requests.jsonl"), Path("events.jsonl"), join="conversation"):
+        usage = call.token_usage
+        print(call.index, call.conversation_id, call.request and call.request.model, usage)
+
+Records keep the raw line and decode it only when a payload is asked for.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import fnmatch
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import operator
+import re
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, Iterator
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def capture_compression(path: Path) -> str | None:
+    """`"gzip"`/`"zstd"` for compressed captures (magic bytes first, then the file extension)."""
+    with path.open("rb") as f:
+        head = f.read(4)
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head == ZSTD_MAGIC:
+        return "zstd"
+    if len(head) < 4:
+        suffix = path.suffix.lower()
+        if suffix in (".gz", ".gzip"):
+            return "gzip"
+        if suffix in (".zst", ".zstd"):
+            return "zstd"
+    return None
+
+
+class _ProcessStream:
+    """stdout of a decompressor subprocess, closed together with the process."""
+
+    def __init__(self, argv: list[str]) -> None:
+        self._proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        assert self._proc.stdout is not None
+        self._stdout = self._proc.stdout
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stdout.read(size)
+
+    def close(self) -> None:
+        self._stdout.close()
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+
+
+def _open_decompressed_stream(path: Path, compression: str) -> Any:
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+    if zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(path.open("rb"), read_across_frames=True, closefd=True)
+    try:
+        return _ProcessStream(["zstd", "-dc", "--", str(path)])
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"{path} is zstd-compressed: install the `zstandard` Python package or the `zstd` CLI"
+        ) from None
+
+
+class DecompressedReader(io.RawIOBase):
+    """
+    Read-only, seekable view of a compressed capture; the decompressed data never touches disk.
+
+    Forward seeks decompress and discard, backward seeks restart the stream, so random access is
+    only cheap in ascending offset order (which is how the index readers use it).
+    """
+
+    def __init__(self, path: Path, compression: str) -> None:
+        self._path = path
+        self._compression = compression
+        self._stream: Any = None
+        self._pos = 0
+        self._restart()
+
+    def _restart(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+        self._stream = _open_decompressed_stream(self._path, self._compression)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data = self._stream.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self._pos += n
+        return n
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("compressed captures cannot seek from the end")
+        if offset < self._pos:
+            self._restart()
+        while self._pos < offset:
+            chunk = self._stream.read(min(1 << 20, offset - self._pos))
+            if not chunk:
+                break
+            self._pos += len(chunk)
+        return self._pos
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        super().close()
+
+
+def open_capture(path: Path, buffer_size: int = -1) -> IO[bytes]:
+    """Open a capture file for binary reading, decompressing `.gz`/`.zst` captures as a stream."""
+    compression = capture_compression(path)
+    if compression is None:
+        return path.open("rb", buffering=buffer_size)
+    return io.BufferedReader(DecompressedReader(path, compression), buffer_size=buffer_size if buffer_size > 0 else 1 << 20)
+
+
+def read_span(f: IO[bytes], offset: int, length: int) -> bytes:
+    f.seek(offset)
+    return f.read(length)
+
+
+# --- Reading `--compact` archives ---------------------------------------------------------------
+#
+# The archive layout is described next to the writer in format_codex_capture.py. Readers only need
+# the record/blob prefixes: a record is resolved back to the original request line by seeking to
+# the byte spans of its blobs.
+
+ARCHIVE_VERSION = 1
+ARCHIVE_MAGIC = b'{"codex_capture_archive":'
+ARCHIVE_HEADER = ARCHIVE_MAGIC + str(ARCHIVE_VERSION).encode() + b"}\n"
+ARCHIVE_BLOB_PREFIX = b'{"b":"'
+ARCHIVE_RECORD_PREFIX = b'{"r":'
+ARCHIVE_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def is_capture_archive(path: Path) -> bool:
+    if not path.exists():
+        return False
+    with open_capture(path) as f:
+        return f.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+
+class ArchiveResolver:
+    """Rebuild original request lines from archive records by seeking to blob spans."""
+
+    def __init__(self, f: IO[bytes]) -> None:
+        self._file = f
+        self._cache: dict[int, bytes] = {}
+        self._cache_bytes = 0
+
+    def remember(self, offset: int, raw: bytes) -> None:
+        if self._cache_bytes + len(raw) > ARCHIVE_CACHE_BYTES:
+            return
+        self._cache[offset] = raw
+        self._cache_bytes += len(raw)
+
+    def _blob(self, ref: list[int]) -> bytes:
+        offset, length = ref
+        raw = self._cache.get(offset)
+        if raw is None:
+            if self._cache_bytes + length > ARCHIVE_CACHE_BYTES:
+                self._cache.clear()
+                self._cache_bytes = 0
+            raw = self._cache[offset] = read_span(self._file, offset, length)
+            self._cache_bytes += length
+        return raw
+
+    def resolve(self, record_line: bytes) -> bytes:
+        out: list[bytes] = []
+        for part in json.loads(record_line)["r"]:
+            if isinstance(part, str):
+                out.append(part.encode("utf-8", "surrogateescape"))
+            elif "v" in part:
+                out.append(self._blob(part["v"]))
+            else:
+                out.append(b"[" + b",".join(self._blob(ref) for ref in part["a"]) + b"]")
+        return b"".join(out)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def archive_record_skeleton(record_line: bytes) -> str:
+    """The original line with every blob replaced by `null`: enough to read ts_ms/conversation_id."""
+    return "".join(p if isinstance(p, str) else "null" for p in json.loads(record_line)["r"])
+
+
+def iter_archive_lines(path: Path) -> Iterator[bytes]:
+    """Yield the original capture lines (with their line endings) stored in an archive."""
+    with open_capture(path) as f, open_capture(path) as blob_file:
+        resolver = ArchiveResolver(blob_file)
+        offset = 0
+        for line in f:
+            if line.startswith(ARCHIVE_RECORD_PREFIX):
+                yield resolver.resolve(line)
+            elif line.startswith(ARCHIVE_BLOB_PREFIX):
+                # Blobs precede their first use: keep them as they stream by instead of seeking back.
+                value_start = line.index(b'"v":') + 4
+                resolver.remember(offset + value_start, line[value_start : len(line) - 2])
+            offset += len(line)
+
+
+class CaptureLineReader:
+    """Read raw capture lines by byte span; archive records are resolved transparently."""
+
+    def __init__(self, path: Path) -> None:
+        self._file = open_capture(path)
+        self._resolver = ArchiveResolver(open_capture(path)) if is_capture_archive(path) else None
+
+    def read(self, offset: int, length: int) -> bytes:
+        raw = read_span(self._file, offset, length)
+        return self._resolver.resolve(raw) if self._resolver is not None else raw
+
+    def close(self) -> None:
+        self._file.close()
+        if self._resolver is not None:
+            self._resolver.close()
+
+    def __enter__(self) -> CaptureLineReader:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# --- Lines and rows ------------------------------------------------------------------------------
+
+
+def iter_capture_lines(path: Path, buffer_size: int = -1) -> Iterator[bytes]:
+    """Yield the non-blank raw lines of a capture; archives are resolved back to request lines."""
+    if not path.exists():
+        return
+    if is_capture_archive(path):
+        for line in iter_archive_lines(path):
+            if line.strip():
+                yield line
+        return
+    with open_capture(path, buffer_size) as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def iter_jsonl(path: Path) -> Iterator[dict[str, Any]]:
+    """Yield JSONL rows one at a time so large captures are never fully materialized."""
+    for line in iter_capture_lines(path):
+        yield json.loads(line.decode("utf-8"))
+
+
+def load_jsonl(path: Path) -> list[dict[str, Any]]:
+    return list(iter_jsonl(path))
+
+
+def parse_event_obj(event_obj: Any) -> tuple[str, Any]:
+    """
+    ResponseEvent is serde-serialized as an externally-tagged enum by default, e.g.:
+      {"OutputTextDelta": "..."}
+      {"Completed": {"response_id": "...", ...}}
+    """
+    if isinstance(event_obj, str):
+        return event_obj, None
+    if isinstance(event_obj, dict) and len(event_obj) == 1:
+        name, payload = next(iter(event_obj.items()))
+        return str(name), payload
+    return "<unknown>", event_obj
+
+
+def extract_message_text(content: Any) -> str:
+    if not isinstance(content, list):
+        return ""
+    parts: list[str] = []
+    for c in content:
+        if not isinstance(c, dict):
+            continue
+        if "text" in c:
+            parts.append(str(c["text"]))
+    return "".join(parts)
+
+
+TOKEN_KEYS = ("input_tokens", "cached_input_tokens", "output_tokens", "reasoning_output_tokens", "total_tokens")
+
+
+def normalize_token_usage(completed: Any) -> dict[str, int] | None:
+    """
+    Token usage from a Completed payload.
+
+    Captures serialize codex `TokenUsage` under `token_usage`; a raw Responses API `usage` object
+    (`input_tokens_details.cached_tokens`, ...) is accepted as well.
+    """
+    if not isinstance(completed, dict):
+        return None
+    usage = completed.get("token_usage")
+    if isinstance(usage, dict):
+        return {key: int(usage.get(key) or 0) for key in TOKEN_KEYS}
+    usage = completed.get("usage")
+    if isinstance(usage, dict):
+        input_details = usage.get("input_tokens_details") or {}
+        output_details = usage.get("output_tokens_details") or {}
+        return {
+            "input_tokens": int(usage.get("input_tokens") or 0),
+            "cached_input_tokens": int(input_details.get("cached_tokens") or 0),
+            "output_tokens": int(usage.get("output_tokens") or 0),
+            "reasoning_output_tokens": int(output_details.get("reasoning_tokens") or 0),
+            "total_tokens": int(usage.get("total_tokens") or 0),
+        }
+    return None
+
+
+def fmt_ts_ms(ts_ms: int | None) -> str:
+    if ts_ms is None:
+        return "unknown"
+    try:
+        t = dt.datetime.fromtimestamp(ts_ms / 1000.0, tz=dt.timezone.utc)
+        return t.isoformat()
+    except Exception:
+        return str(ts_ms)
+
+
+def truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}… <truncated {len(text) - limit} chars>"
+
+
+def canonical_json(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=12).hexdigest()
+
+
+def common_prefix_len(a: list[str], b: list[str]) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def summarize_tools(tools: list[Any]) -> list[str]:
+    names: list[str] = []
+    for tool in tools:
+        if isinstance(tool, dict) and "name" in tool:
+            names.append(str(tool["name"]))
+        elif isinstance(tool, dict) and tool.get("type") == "web_search":
+            names.append("web_search")
+        else:
+            names.append("<unknown>")
+    # de-dupe while preserving order
+    seen: set[str] = set()
+    out: list[str] = []
+    for n in names:
+        if n not in seen:
+            out.append(n)
+            seen.add(n)
+    return out
+
+
+TOOL_CALL_ITEM_TYPES = ("function_call", "custom_tool_call")
+TOOL_OUTPUT_ITEM_TYPES = ("function_call_output", "custom_tool_call_output", "call_output")
+
+
+def tool_call_name(item: Any) -> str | None:
+    """The tool an output item calls (`web_search` for web_search_call), or None for other items."""
+    if not isinstance(item, dict):
+        return None
+    if item.get("type") in TOOL_CALL_ITEM_TYPES:
+        return str(item.get("name", "<missing-name>"))
+    if item.get("type") == "web_search_call":
+        return "web_search"
+    return None
+
+
+def format_tool_event(ts: str, name: str, payload: dict[str, Any]) -> str | None:
+    """Render one OutputItemAdded/OutputItemDone payload as a tool-call line, or None if it is not a tool call."""
+    item_type = payload.get("type")
+    if item_type == "function_call":
+        tool_name = payload.get("name", "<missing-name>")
+        call_id = payload.get("call_id", "<missing-call-id>")
+        args = payload.get("arguments", "")
+        return f"- ts=`{ts}` `{name}` `function_call`: `{tool_name}` call_id=`{call_id}` args={truncate(str(args), 200)}"
+    if item_type == "custom_tool_call":
+        tool_name = payload.get("name", "<missing-name>")
+        call_id = payload.get("call_id", "<missing-call-id>")
+        status = payload.get("status", "<missing-status>")
+        tool_input = payload.get("input", "")
+        return f"- ts=`{ts}` `{name}` `custom_tool_call`: `{tool_name}` call_id=`{call_id}` status=`{status}` input={truncate(str(tool_input), 200)}"
+    if item_type == "web_search_call":
+        status = payload.get("status", "<missing-status>")
+        action = payload.get("action") if isinstance(payload.get("action"), dict) else {}
+        query = action.get("query") or action.get("queries")
+        return f"- ts=`{ts}` `{name}` `web_search_call`: status=`{status}` query={truncate(json.dumps(query, ensure_ascii=False), 200)}"
+    return None
+
+
+# --- Resuming reads ------------------------------------------------------------------------------
+#
+# The index sidecar and the SQLite export pick a capture up where the previous run stopped. Their
+# read state records the path, the on-disk size, the `scanned` byte offset where the next read
+# resumes, the rows read so far and a fingerprint of the first bytes, which tells a capture that
+# grew from one that was truncated or replaced.
+
+FINGERPRINT_BYTES = 4096
+
+
+def file_fingerprint(path: Path, length: int) -> str:
+    with open_capture(path) as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def is_complete_line(line: bytes) -> bool:
+    """
+    A line is complete once its newline has been written.
+
+    An unterminated final line is still accepted when it decodes: no proper prefix of a JSON object
+    is valid JSON, so this only admits captures that simply lack the trailing newline.
+    """
+    if line.endswith(b"\n"):
+        return True
+    try:
+        json.loads(line)
+    except ValueError:
+        return False
+    return True
+
+
+def iter_complete_lines(path: Path, start: int) -> Iterator[tuple[bytes, int]]:
+    """Yield `(line, offset after it)` from `start`, stopping at a partial trailing line."""
+    offset = start
+    with open_capture(path) as f:
+        f.seek(start)
+        for line in f:
+            if not is_complete_line(line):
+                break
+            offset += len(line)
+            yield line, offset
+
+
+def empty_read_state(path: Path | None) -> dict[str, Any]:
+    return {"path": str(path) if path else None, "size": 0, "scanned": 0, "rows": 0, "fingerprint": None}
+
+
+def read_state_is_reusable(state: dict[str, Any], path: Path | None) -> bool:
+    """Whether a read can resume from `state`: the capture only grew since it was recorded."""
+    if path is None or not path.exists():
+        return state.get("scanned", 0) == 0
+    if state.get("path") != str(path):
+        return False
+    scanned = state.get("scanned", 0)
+    # `scanned` is an offset into the (decompressed) stream; `size` is the on-disk size it came from.
+    if path.stat().st_size < state.get("size", 0):
+        # The capture was truncated or replaced.
+        return False
+    fingerprint = state.get("fingerprint")
+    if fingerprint is None:
+        return scanned == 0
+    return file_fingerprint(path, min(scanned, FINGERPRINT_BYTES)) == fingerprint
+
+
+# --- Row headers and event tags ------------------------------------------------------------------
+#
+# Rows written by client.rs start with `{"ts_ms":...,"conversation_id":...,` and events rows then hold
+# the externally-tagged ResponseEvent, so both are read with a byte-level prefix match. Anything that
+# does not look exactly like such a row (error rows, other key orders) falls back to a scan of the
+# line ends or to json.loads.
+
+_EVENT_KEY = b'"event":'
+EVENT_ROW_RE = re.compile(
+    rb'\{"ts_ms":(\d+),"conversation_id":(?:"[^"\\]*"|null),"event":(?:\{"(\w+)":|"(\w+)"\})'
+)
+_TS_MS_RE = re.compile(rb'"ts_ms":\s*(\d+)')
+_CONVERSATION_ID_RE = re.compile(rb'"conversation_id":\s*"([^"\\]*)"')
+_ROW_HEAD_RE = re.compile(rb'\{"ts_ms":(\d+),"conversation_id":(?:"([^"\\]*)"|null),')
+_REQUEST_MODEL_RE = re.compile(rb'"request":\{"model":"([^"\\]*)"')
+
+
+def peek_row_header(line: bytes) -> tuple[int | None, str | None]:
+    """
+    Read `ts_ms`/`conversation_id` from a raw capture row.
+
+    Both keys are scalars written next to the (potentially huge) payload, so they are found at the
+    head or the tail of the line depending on serde_json key ordering.
+    """
+    ts_ms: int | None = None
+    conversation_id: str | None = None
+    for chunk in (line[:512], line[-256:]):
+        if ts_ms is None:
+            m = _TS_MS_RE.search(chunk)
+            if m:
+                ts_ms = int(m.group(1))
+        if conversation_id is None:
+            m = _CONVERSATION_ID_RE.search(chunk)
+            if m:
+                conversation_id = m.group(1).decode("utf-8", "replace")
+    if ts_ms is None or conversation_id is None:
+        row = json.loads(line)
+        ts_ms = row.get("ts_ms") if ts_ms is None else ts_ms
+        conversation_id = row.get("conversation_id") if conversation_id is None else conversation_id
+    return ts_ms, conversation_id
+
+
+def peek_event_name(line: bytes) -> str | None:
+    """
+    Classify a raw events line by its ResponseEvent tag without decoding the payload.
+
+    Returns None when the line does not look like a capture row; callers fall back to json.loads.
+    """
+    i = line.find(_EVENT_KEY)
+    if i < 0:
+        return None
+    rest = line[i + len(_EVENT_KEY) : i + len(_EVENT_KEY) + 80].lstrip()
+    if rest.startswith(b'{"'):
+        start = 2
+    elif rest.startswith(b'"'):
+        start = 1
+    else:
+        return None
+    end = rest.find(b'"', start)
+    if end < 0:
+        return None
+    return rest[start:end].decode("utf-8", "replace")
+
+
+def event_line_name(line: bytes) -> str:
+    m = EVENT_ROW_RE.match(line)
+    if m is not None:
+        return (m.group(2) or m.group(3)).decode()
+    name = peek_event_name(line)
+    if name is None:
+        name, _payload = parse_event_obj(json.loads(line).get("event"))
+    return name
+
+
+def peek_request_model(line: bytes) -> str | None:
+    """The request's `model`, read from the head of the raw line when serde wrote it first."""
+    m = _REQUEST_MODEL_RE.search(line, 0, 512)
+    if m is not None:
+        return m.group(1).decode("utf-8", "replace")
+    request = json.loads(line.decode("utf-8")).get("request")
+    return request.get("model") if isinstance(request, dict) else None
+
+
+def read_row_head(line: bytes) -> tuple[int | None, str | None]:
+    """`(ts_ms, conversation_id)` of a raw row: prefix match first, then `peek_row_header`."""
+    m = _ROW_HEAD_RE.match(line)
+    if m is None:
+        return peek_row_header(line)
+    return int(m.group(1)), m.group(2).decode("utf-8", "replace") if m.group(2) is not None else None
+
+
+def is_completed_line(line: bytes) -> bool:
+    # Substring test first: most rows are deltas and never need classifying.
+    return b"Completed" in line and event_line_name(line) == "Completed"
+
+
+# --- Records -------------------------------------------------------------------------------------
+#
+# One object per row adds up on captures with millions of delta events, so the records use
+# `__slots__`, share interned conversation ids and event names, and keep the raw line: the JSON is
+# decoded on first access to a payload and cached on the record.
+
+_UNDECODED: Any = object()
+
+
+def _intern(value: str | None) -> str | None:
+    return sys.intern(value) if value is not None else None
+
+
+class RequestRow:
+    """One requests-capture row (an outgoing ResponsesApiRequest)."""
+
+    __slots__ = ("ts_ms", "conversation_id", "line", "_row")
+
+    def __init__(self, line: bytes) -> None:
+        ts_ms, conversation_id = read_row_head(line)
+        self.ts_ms = ts_ms
+        self.conversation_id = _intern(conversation_id)
+        self.line = line
+        self._row: dict[str, Any] | None = None
+
+    def __repr__(self) -> str:
+        return f"RequestRow(ts_ms={self.ts_ms!r}, conversation_id={self.conversation_id!r}, bytes={len(self.line)})"
+
+    @property
+    def row(self) -> dict[str, Any]:
+        """The decoded row; decoded once, on first access."""
+        if self._row is None:
+            self._row = json.loads(self.line.decode("utf-8"))
+        return self._row
+
+    @property
+    def request(self) -> dict[str, Any]:
+        request = self.row.get("request")
+        return request if isinstance(request, dict) else {}
+
+    @property
+    def model(self) -> str | None:
+        if self._row is not None:
+            return self.request.get("model")
+        return peek_request_model(self.line)
+
+    @property
+    def instructions(self) -> str:
+        return str(self.request.get("instructions") or "")
+
+    @property
+    def input(self) -> list[Any]:
+        items = self.request.get("input")
+        return items if isinstance(items, list) else []
+
+    @property
+    def tools(self) -> list[Any]:
+        tools = self.request.get("tools")
+        return tools if isinstance(tools, list) else []
+
+
+class EventRow:
+    """One events-capture row (a ResponseEvent); `name` is known without decoding the payload."""
+
+    __slots__ = ("ts_ms", "conversation_id", "name", "line", "_payload")
+
+    def __init__(self, line: bytes) -> None:
+        ts_ms, conversation_id = read_row_head(line)
+        self.ts_ms = ts_ms
+        self.conversation_id = _intern(conversation_id)
+        self.name = sys.intern(event_line_name(line))
+        self.line = line
+        self._payload = _UNDECODED
+
+    def __repr__(self) -> str:
+        return f"EventRow(ts_ms={self.ts_ms!r}, conversation_id={self.conversation_id!r}, name={self.name!r})"
+
+    @property
+    def payload(self) -> Any:
+        """The variant's payload (None for unit variants such as `Created`); decoded on first access."""
+        if self._payload is _UNDECODED:
+            _name, self._payload = parse_event_obj(json.loads(self.line).get("event"))
+        return self._payload
+
+
+class CallSegment:
+    """One call: its request row and the event rows of its response, either of which may be missing."""
+
+    __slots__ = ("index", "request", "events")
+
+    def __init__(self, index: int, request: RequestRow | None, events: list[EventRow] | None) -> None:
+        self.index = index
+        self.request = request
+        self.events = events
+
+    def __repr__(self) -> str:
+        events = len(self.events) if self.events is not None else None
+        return f"CallSegment(index={self.index}, request={self.request!r}, events={events})"
+
+    @property
+    def conversation_id(self) -> str | None:
+        if self.request is not None and self.request.conversation_id is not None:
+            return self.request.conversation_id
+        for event in self.events or ():
+            if event.conversation_id is not None:
+                return event.conversation_id
+        return None
+
+    @property
+    def start_ts_ms(self) -> int | None:
+        if self.request is not None and self.request.ts_ms is not None:
+            return self.request.ts_ms
+        return self.events[0].ts_ms if self.events else None
+
+    @property
+    def end_ts_ms(self) -> int | None:
+        return self.events[-1].ts_ms if self.events else None
+
+    @property
+    def completed(self) -> dict[str, Any] | None:
+        """The Completed payload, or None when the stream ended (or failed) before it."""
+        for event in reversed(self.events or ()):
+            if event.name == "Completed":
+                payload = event.payload
+                return payload if isinstance(payload, dict) else None
+        return None
+
+    @property
+    def token_usage(self) -> dict[str, int] | None:
+        return normalize_token_usage(self.completed)
+
+    def events_named(self, name: str) -> Iterator[EventRow]:
+        return (event for event in self.events or () if event.name == name)
+
+    def output_items(self) -> Iterator[dict[str, Any]]:
+        """Finalized output items (OutputItemDone payloads), in stream order."""
+        for event in self.events_named("OutputItemDone"):
+            if isinstance(event.payload, dict):
+                yield event.payload
+
+    def output_text(self) -> str:
+        """The streamed assistant text (OutputTextDelta payloads joined)."""
+        return "".join(event.payload for event in self.events_named("OutputTextDelta") if isinstance(event.payload, str))
+
+
+def iter_request_rows(path: Path) -> Iterator[RequestRow]:
+    for line in iter_capture_lines(path):
+        yield RequestRow(line)
+
+
+def iter_event_rows(path: Path) -> Iterator[EventRow]:
+    for line in iter_capture_lines(path):
+        yield EventRow(line)
+
+
+# --- Calls ---------------------------------------------------------------------------------------
+#
+# A call is a request row plus the event rows up to (and including) its Completed row. Positional
+# pairing (request i with event segment i) holds while a single session writes the captures; the
+# conversation join merges both files by ts_ms in one streaming pass and pairs each request with the
+# next segment of its own conversation. A conversation's call is closed by its Completed row, or by
+# the conversation's next request (a retry, or a stream that failed before Completed).
+
+RawCall = tuple[int, bytes | None, list[bytes] | None]
+
+
+def iter_stamped_lines(lines: Iterable[bytes], kind: int) -> Iterator[tuple[int, int, str | None, bytes]]:
+    """Tag raw rows with `(ts_ms, kind, conversation_id)`; rows without ts_ms keep the previous one."""
+    last_ts = 0
+    for line in lines:
+        m = _ROW_HEAD_RE.match(line)
+        if m is not None:
+            ts_ms: int | None = int(m.group(1))
+            conversation_id = m.group(2).decode("utf-8", "replace") if m.group(2) is not None else None
+        else:
+            ts_ms, conversation_id = peek_row_header(line)
+        if isinstance(ts_ms, int):
+            last_ts = ts_ms
+        yield last_ts, kind, conversation_id, line
+
+
+class ConversationJoin:
+    """Pair request rows with event segments per conversation_id, in one ts-ordered merge of both files."""
+
+    def __init__(self) -> None:
+        # conversation_id -> its call numbers, in order; conversations in order of first appearance.
+        self.conversations: dict[str | None, list[int]] = {}
+
+    def iter_raw_calls(self, request_lines: Iterable[bytes], event_lines: Iterable[bytes]) -> Iterator[RawCall]:
+        """
+        Yield `(call, request line, event lines)` as each call closes.
+
+        Calls are numbered in the order they start; across conversations they close out of order.
+        """
+        next_call = 1
+        # conversation_id -> [call, request line, event lines] of the call awaiting its Completed row.
+        open_calls: dict[str | None, list[Any]] = {}
+        # Requests go first so a request sorts before events stamped with the same millisecond.
+        stamped = heapq.merge(
+            iter_stamped_lines(request_lines, 0),
+            iter_stamped_lines(event_lines, 1),
+            key=operator.itemgetter(0),
+        )
+        for _ts_ms, kind, conversation_id, line in stamped:
+            cur = open_calls.get(conversation_id)
+            if kind == 0 and cur is not None:
+                del open_calls[conversation_id]
+                yield cur[0], cur[1], cur[2]
+                cur = None
+            if cur is None:
+                cur = open_calls[conversation_id] = [next_call, None, None]
+                self.conversations.setdefault(conversation_id, []).append(next_call)
+                next_call += 1
+            if kind == 0:
+                cur[1] = line
+                continue
+            if cur[2] is None:
+                cur[2] = []
+            cur[2].append(line)
+            if is_completed_line(line):
+                del open_calls[conversation_id]
+                yield cur[0], cur[1], cur[2]
+        for call, req_line, seg_lines in sorted(open_calls.values(), key=operator.itemgetter(0)):
+            yield call, req_line, seg_lines
+
+
+def iter_segment_lines(
+    lines: Iterable[bytes],
+    closes: Callable[[bytes], bool] = is_completed_line,
+) -> Iterator[list[bytes]]:
+    """
+    Split raw event lines into per-response segments (boundary = Completed, inclusive).
+
+    `closes` tells whether a line ends its segment; a caller that folds every line anyway can pass
+    a function that does both, so each line is classified once.
+    """
+    cur: list[bytes] = []
+    for line in lines:
+        cur.append(line)
+        if closes(line):
+            yield cur
+            cur = []
+    if cur:
+        yield cur
+
+
+# --- Selective event decoding -------------------------------------------------------------------
+#
+# Most events rows are `{"ts_ms":...,"conversation_id":...,"event":{"OutputTextDelta":"..."}}`, and
+# rendering needs little from them: the event name, `ts_ms`, and the delta text only when the
+# segment has no finalized assistant message. Rows are kept as raw bytes and classified with a
+# byte-level prefix match; only item and Completed payloads are decoded. Anything that does not
+# look exactly like a row written by client.rs (error rows, other key orders) goes through json.loads.
+# The tagged map is trusted to hold a single variant, as serde writes it.
+
+
+_JSON_STRING_RE = re.compile(rb'"(?:[^"\\]|\\.)*"')
+
+
+class SegmentReducer:
+    """Single-pass reduction of one event segment into the summary the renderers use."""
+
+    def __init__(self) -> None:
+        self.counts: Counter[str] = Counter()
+        self.completed: dict[str, Any] | None = None
+        self.output_items_done = 0
+        self.first_ts_ms: int | None = None
+        self.last_ts_ms: int | None = None
+        # (text, ts_ms) of the latest finalized assistant output_text.
+        self.final_text: tuple[str, Any] | None = None
+        # Delta payloads as raw JSON strings; decoded in one go, and only if no final text exists.
+        self.deltas: list[bytes] = []
+        self.last_delta_ts_ms: Any = None
+        # Ordered de-dupe of tool-call lines.
+        self.tools: dict[str, None] = {}
+
+    def _observe_ts(self, ts_ms: Any) -> None:
+        if isinstance(ts_ms, int):
+            if self.first_ts_ms is None or ts_ms < self.first_ts_ms:
+                self.first_ts_ms = ts_ms
+            if self.last_ts_ms is None or ts_ms > self.last_ts_ms:
+                self.last_ts_ms = ts_ms
+
+    def _add_event(self, ts_ms: Any, name: str, payload: Any) -> None:
+        self.counts[name] += 1
+        if name == "OutputTextDelta":
+            if isinstance(payload, str):
+                self.deltas.append(json.dumps(payload).encode())
+                self.last_delta_ts_ms = ts_ms
+        elif name == "Completed":
+            if isinstance(payload, dict):
+                self.completed = payload
+        elif name in ("OutputItemAdded", "OutputItemDone") and isinstance(payload, dict):
+            tool_line = format_tool_event(fmt_ts_ms(ts_ms), name, payload)
+            if tool_line is not None:
+                self.tools.setdefault(tool_line)
+            if name == "OutputItemDone" and payload.get("type") == "message" and payload.get("role") == "assistant":
+                content = payload.get("content")
+                if isinstance(content, list):
+                    for c in content:
+                        if isinstance(c, dict) and c.get("type") == "output_text" and "text" in c:
+                            self.final_text = (str(c["text"]), ts_ms)
+                            break
+        if name == "OutputItemDone":
+            self.output_items_done += 1
+
+    def add_row(self, row: dict[str, Any]) -> str | None:
+        """Fold in a decoded row; returns its event name (None for rows without an event)."""
+        ts_ms = row.get("ts_ms")
+        self._observe_ts(ts_ms)
+        ev = row.get("event")
+        if ev is None:
+            return None
+        name, payload = parse_event_obj(ev)
+        self._add_event(ts_ms, name, payload)
+        return name
+
+    def add_line(self, line: bytes) -> str | None:
+        """Fold in a raw events line, decoding only what the summary needs; returns its event name."""
+        m = EVENT_ROW_RE.match(line)
+        if m is None:
+            return self.add_row(json.loads(line))
+        ts_ms = int(m.group(1))
+        if m.group(3) is not None:
+            # Unit variant, e.g. `"event":"Created"}`.
+            if line[m.end() :].strip():
+                return self.add_row(json.loads(line))
+            name = m.group(3).decode()
+            self._observe_ts(ts_ms)
+            self.counts[name] += 1
+            return name
+        body = line.rstrip()
+        if not body.endswith(b"}}"):
+            return self.add_row(json.loads(line))
+        name = m.group(2).decode()
+        payload = body[m.end() : -2]
+        if name == "OutputTextDelta" and payload.startswith(b'"'):
+            # Kept raw for a single batched decode; validated so that decode cannot fail.
+            if _JSON_STRING_RE.fullmatch(payload) is None:
+                return self.add_row(json.loads(line))
+            self._observe_ts(ts_ms)
+            self.counts[name] += 1
+            self.deltas.append(payload)
+            self.last_delta_ts_ms = ts_ms
+            return name
+        if name in ("OutputItemAdded", "OutputItemDone", "Completed"):
+            try:
+                value = json.loads(payload)
+            except ValueError:
+                return self.add_row(json.loads(line))
+            self._observe_ts(ts_ms)
+            self._add_event(ts_ms, name, value)
+            return name
+        # Every other event only counts; its payload is never looked at.
+        self._observe_ts(ts_ms)
+        self.counts[name] += 1
+        return name
+
+    def summary(self) -> dict[str, Any]:
+        if self.final_text is not None:
+            output_text, output_ts = self.final_text[0], fmt_ts_ms(self.final_text[1])
+        elif self.deltas:
+            output_text = "".join(json.loads(b"[" + b",".join(self.deltas) + b"]"))
+            output_ts = fmt_ts_ms(self.last_delta_ts_ms)
+        else:
+            output_text, output_ts = "", None
+        return {
+            "counts": self.counts,
+            "output_text": output_text,
+            "output_ts": output_ts,
+            "segment_start_ts": fmt_ts_ms(self.first_ts_ms),
+            "segment_end_ts": fmt_ts_ms(self.last_ts_ms),
+            "completed": self.completed,
+            "output_items_done": self.output_items_done,
+            "tools": list(self.tools),
+        }
+
+
+class EventSegment:
+    """
+    The raw lines of one response segment, up to and including its Completed row.
+
+    Rendering only needs the segment summary, reduced straight from the lines (or already reduced
+    while the segment was being split off the stream). Iterating decodes the rows, once, for
+    consumers such as the reports that need every field.
+    """
+
+    def __init__(self, lines: list[bytes], reducer: SegmentReducer | None = None) -> None:
+        self.lines = lines
+        self._reducer = reducer
+        self._rows: list[dict[str, Any]] | None = None
+
+    def summary(self) -> dict[str, Any]:
+        if self._reducer is None:
+            self._reducer = SegmentReducer()
+            for line in self.lines:
+                self._reducer.add_line(line)
+        return self._reducer.summary()
+
+    @property
+    def rows(self) -> list[dict[str, Any]]:
+        if self._rows is None:
+            self._rows = [json.loads(line.decode("utf-8")) for line in self.lines]
+        return self._rows
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return iter(self.rows)
+
+    def __reversed__(self) -> Iterator[dict[str, Any]]:
+        return reversed(self.rows)
+
+
+def iter_event_segments(lines: Iterable[bytes], *, reduce: bool = True) -> Iterator[EventSegment]:
+    """
+    Split the raw event stream into per-response segments with `iter_segment_lines`.
+
+    With `reduce`, the boundary test folds each line into the segment summary, so splitting and
+    reducing are one pass; without it (nothing is rendered) lines are only classified.
+    """
+    if not reduce:
+        for seg_lines in iter_segment_lines(lines):
+            yield EventSegment(seg_lines)
+        return
+    reducer = SegmentReducer()
+
+    def closes(line: bytes) -> bool:
+        return reducer.add_line(line) == "Completed"
+
+    for seg_lines in iter_segment_lines(lines, closes):
+        yield EventSegment(seg_lines, reducer)
+        reducer = SegmentReducer()
+
+
+def summarize_event_segment(seg: EventSegment | Iterable[dict[str, Any]]) -> dict[str, Any]:
+    if isinstance(seg, EventSegment):
+        return seg.summary()
+    reducer = SegmentReducer()
+    for r in seg:
+        reducer.add_row(r)
+    return reducer.summary()
+
+
+def iter_raw_calls(requests_path: Path | None, events_path: Path | None, *, join: str = "position") -> Iterator[RawCall]:
+    """Yield `(call, request line, event lines)`; missing capture files read as empty."""
+    request_lines = iter_capture_lines(requests_path) if requests_path is not None else iter(())
+    event_lines = iter_capture_lines(events_path) if events_path is not None else iter(())
+    if join == "conversation":
+        yield from ConversationJoin().iter_raw_calls(request_lines, event_lines)
+    elif join == "position":
+        pairs = itertools.zip_longest(request_lines, iter_segment_lines(event_lines))
+        for i, (req_line, seg_lines) in enumerate(pairs, start=1):
+            yield i, req_line, seg_lines
+    else:
+        raise ValueError(f"unknown join {join!r} (expected 'position' or 'conversation')")
+
+
+def iter_calls(requests_path: Path | None, events_path: Path | None, *, join: str = "position") -> Iterator[CallSegment]:
+    """
+    Stream the calls of a capture pair as `CallSegment` records.
+
+    With `join="conversation"` calls are numbered in the order they start but yielded as they
+    close, so indices can arrive out of order across conversations.
+    """
+    for call, req_line, seg_lines in iter_raw_calls(requests_path, events_path, join=join):
+        yield CallSegment(
+            call,
+            RequestRow(req_line) if req_line is not None else None,
+            [EventRow(line) for line in seg_lines] if seg_lines is not None else None,
+        )
+
+
+# --- Call selection ------------------------------------------------------------------------------
+#
+# Calls as the formatter and the reports consume them: `(call, request row, EventSegment)`, with the
+# request decoded and the segment kept raw. A CallFilter (built from --where clauses) decides each
+# call on its raw lines first, so rejected calls are never decoded.
+
+CallRecord = tuple[int, dict[str, Any] | None, EventSegment | None]
+
+
+WHERE_OPS = {"=": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+# (field, op, text, value): strings hold `|`-separated glob alternatives, ts/duration milliseconds.
+WhereClause = tuple[str, str, str, Any]
+
+
+def segment_tool_names(lines: Iterable[bytes]) -> set[str]:
+    """Names of the tools a segment calls; only output item lines are decoded."""
+    names: set[str] = set()
+    for line in lines:
+        if event_line_name(line) not in ("OutputItemAdded", "OutputItemDone"):
+            continue
+        _name, payload = parse_event_obj(json.loads(line.decode("utf-8")).get("event"))
+        name = tool_call_name(payload)
+        if name is not None:
+            names.add(name)
+    return names
+
+
+def segment_end_ts(lines: list[bytes]) -> int | None:
+    """`ts_ms` of the segment's Completed row, or of its last row while it is still open."""
+    if not lines:
+        return None
+    last = lines[-1]
+    for line in reversed(lines):
+        if event_line_name(line) == "Completed":
+            last = line
+            break
+    return peek_row_header(last)[0]
+
+
+class CallFilter:
+    """The conjunction of all --where clauses, applied in stages from the cheapest data up."""
+
+    def __init__(self, clauses: list[WhereClause]) -> None:
+        self.clauses = clauses
+        fields = {field for field, _op, _text, _value in clauses}
+        self.needs_request = "model" in fields
+        self.needs_segment = bool(fields & {"tool", "event", "duration"})
+
+    def describe(self) -> str:
+        return " and ".join(f"{field}{op}{text}" for field, op, text, _value in self.clauses)
+
+    @staticmethod
+    def _test(op: str, expected: Any, actual: Any) -> bool:
+        if isinstance(expected, list):
+            # String clauses match a set of values: `=` needs one match, `!=` none.
+            values = actual if isinstance(actual, set) else ({actual} if actual is not None else set())
+            hit = any(fnmatch.fnmatchcase(v, pattern) for v in values for pattern in expected)
+            return hit if op == "=" else not hit
+        if actual is None:
+            return op == "!="
+        return WHERE_OPS[op](actual, expected)
+
+    def _match(self, fields: tuple[str, ...], values: dict[str, Any]) -> bool:
+        return all(
+            self._test(op, expected, values[field])
+            for field, op, _text, expected in self.clauses
+            if field in fields
+        )
+
+    def match_header(self, ts_ms: int | None, conversation_id: str | None) -> bool:
+        """Stage 1: clauses answered by the row header (index entry or the head of the raw line)."""
+        return self._match(("conversation_id", "ts"), {"conversation_id": conversation_id, "ts": ts_ms})
+
+    def match_request(self, line: bytes | None) -> bool:
+        """Stage 2: clauses on the raw request line."""
+        if not self.needs_request:
+            return True
+        model = peek_request_model(line) if line is not None else None
+        return self._match(("model",), {"model": model})
+
+    def match_segment(self, lines: list[bytes] | None, start_ts: int | None) -> bool:
+        """Stage 3: clauses on the raw event lines of the call."""
+        if not self.needs_segment:
+            return True
+        lines = lines or []
+        values: dict[str, Any] = {"tool": set(), "event": set(), "duration": None}
+        if any(field == "event" for field, _op, _text, _value in self.clauses):
+            values["event"] = {event_line_name(line) for line in lines}
+        if any(field == "duration" for field, _op, _text, _value in self.clauses) and lines:
+            end_ts = segment_end_ts(lines)
+            start_ts = start_ts if start_ts is not None else peek_row_header(lines[0])[0]
+            if end_ts is not None and start_ts is not None:
+                values["duration"] = end_ts - start_ts
+        if not self._match(("event", "duration"), values):
+            return False
+        if any(field == "tool" for field, _op, _text, _value in self.clauses):
+            values["tool"] = segment_tool_names(lines)
+        return self._match(("tool",), values)
+
+    def match_raw_call(self, req_line: bytes | None, seg_lines: list[bytes] | None) -> bool:
+        """Decide a call whose raw request line and event lines are already in memory."""
+        if req_line is not None:
+            ts_ms, conversation_id = peek_row_header(req_line)
+        elif seg_lines:
+            ts_ms, conversation_id = peek_row_header(seg_lines[0])
+        else:
+            ts_ms, conversation_id = None, None
+        return (
+            self.match_header(ts_ms, conversation_id)
+            and self.match_request(req_line)
+            and self.match_segment(seg_lines, ts_ms)
+        )
+
+
+def iter_filtered_calls(
+    call_filter: CallFilter,
+    request_lines: Iterable[bytes],
+    segments: Iterable[EventSegment],
+) -> Iterator[CallRecord]:
+    """Pair raw request lines with event segments and decode only the calls `call_filter` keeps."""
+    for i, (req_line, seg) in enumerate(itertools.zip_longest(request_lines, segments), start=1):
+        if call_filter.match_raw_call(req_line, seg.lines if seg is not None else None):
+            yield i, json.loads(req_line.decode("utf-8")) if req_line is not None else None, seg
+
+
+def iter_decoded_calls(raw_calls: Iterable[RawCall], call_filter: CallFilter | None = None) -> Iterator[CallRecord]:
+    for call, req_line, seg_lines in raw_calls:
+        if call_filter is not None and not call_filter.match_raw_call(req_line, seg_lines):
+            continue
+        req_row = json.loads(req_line.decode("utf-8")) if req_line is not None else None
+        yield call, req_row, EventSegment(seg_lines) if seg_lines is not None else None
+
+
+def iter_pair_calls(
+    requests_path: Path | None,
+    events_path: Path | None,
+    join: str,
+    call_filter: CallFilter | None = None,
+) -> Iterator[CallRecord]:
+    """Stream the calls of one capture pair, paired the way `--join` selects."""
+    request_lines = iter_capture_lines(requests_path) if requests_path is not None else iter(())
+    event_lines = iter_capture_lines(events_path) if events_path is not None else iter(())
+    if join == "conversation":
+        return iter_decoded_calls(ConversationJoin().iter_raw_calls(request_lines, event_lines), call_filter)
+    segments = iter_event_segments(event_lines, reduce=False)
+    if call_filter is not None:
+        return iter_filtered_calls(call_filter, request_lines, segments)
+    pairs = itertools.zip_longest(
+        (json.loads(line.decode("utf-8")) for line in request_lines),
+        segments,
+    )
+    return ((i, req_row, seg) for i, (req_row, seg) in enumerate(pairs, start=1))
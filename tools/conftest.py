@@ -0,0 +1,82 @@
+"""
+Shared fixtures for the capture tool tests.
+
+`testdata/` holds a small synthetic capture (12 calls over two conversations, with function, custom
+and web-search tool calls) and, under `testdata/baseline/`, the Markdown that the original
+non-streaming renderer (commit 8e76677) produced for it. Tests run the tools on a scratch copy.
+"""
+
+from __future__ import annotations
+
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pytest
+
+TOOLS_DIR = Path(__file__).resolve().parent
+TESTDATA_DIR = TOOLS_DIR / "testdata"
+FORMATTER = TOOLS_DIR / "format_codex_capture.py"
+
+
+@pytest.fixture
+def capture(tmp_path: Path) -> Path:
+    """Scratch directory holding `requests.jsonl` and `events.jsonl` from `testdata/`."""
+    for name in ("requests.jsonl", "events.jsonl"):
+        shutil.copyfile(TESTDATA_DIR / name, tmp_path / name)
+    return tmp_path
+
+
+@pytest.fixture
+def run_formatter(capture: Path) -> Callable[..., subprocess.CompletedProcess[str]]:
+    """Run format_codex_capture.py with the given arguments inside the `capture` directory."""
+
+    def run(*args: str, check: bool = True) -> subprocess.CompletedProcess[str]:
+        return subprocess.run(
+            [sys.executable, str(FORMATTER), *args],
+            cwd=capture,
+            capture_output=True,
+            text=True,
+            check=check,
+        )
+
+    return run
+
+
+@pytest.fixture
+def render(
+    capture: Path, run_formatter: Callable[..., subprocess.CompletedProcess[str]]
+) -> Callable[..., tuple[str, str]]:
+    """Render into `<name>.r.md`/`<name>.s.md` and return the (readable, simplified) Markdown."""
+
+    def render(name: str, *args: str) -> tuple[str, str]:
+        readable, simplified = capture / f"{name}.r.md", capture / f"{name}.s.md"
+        run_formatter(*args, "--out-readable", readable.name, "--out-simplified", simplified.name)
+        return readable.read_text(encoding="utf-8-sig"), simplified.read_text(encoding="utf-8-sig")
+
+    return render
+
+
+@pytest.fixture
+def spawn_formatter(capture: Path) -> Iterator[Callable[..., subprocess.Popen[str]]]:
+    """Start format_codex_capture.py in the background inside `capture`; stragglers are killed."""
+    procs: list[subprocess.Popen[str]] = []
+
+    def spawn(*args: str) -> subprocess.Popen[str]:
+        proc = subprocess.Popen(
+            [sys.executable, str(FORMATTER), *args],
+            cwd=capture,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        procs.append(proc)
+        return proc
+
+    yield spawn
+    for proc in procs:
+        if proc.poll() is None:
+            proc.kill()
+        proc.communicate()
@@ -11,59 +11,98 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
+import itertools
 import json
+import multiprocessing
 import os
-from collections import Counter, defaultdict
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
 from pathlib import Path
-from typing import Any, Iterable
+from typing import IO, Any, Callable, Iterable, Iterator, Sequence
 
+from capture_fleet import discover_capture_pairs, write_fleet_report
+from capture_reports import (
+    DIFF_METRICS,
+    CacheReport,
+    CallReport,
+    DiffReport,
+    DiffThreshold,
+    LatencyReport,
+    SizeReport,
+    TokenLedger,
+    ToolTimingReport,
+    TraceExport,
+    feed_reports,
+    md_table,
+)
+from capture_sqlite import SqliteExport
+from codex_capture import (
+    ARCHIVE_BLOB_PREFIX,
+    ARCHIVE_HEADER,
+    ARCHIVE_RECORD_PREFIX,
+    FINGERPRINT_BYTES,
+    ArchiveResolver,
+    CallFilter,
+    CallRecord,
+    CaptureLineReader,
+    ConversationJoin,
+    EventSegment,
+    WhereClause,
+    archive_record_skeleton,
+    canonical_json,
+    capture_compression,
+    common_prefix_len,
+    content_digest,
+    empty_read_state,
+    event_line_name,
+    extract_message_text,
+    file_fingerprint,
+    fmt_ts_ms,
+    is_capture_archive,
+    is_complete_line,
+    is_completed_line,
+    iter_archive_lines,
+    iter_capture_lines,
+    iter_decoded_calls,
+    iter_event_segments,
+    iter_filtered_calls,
+    iter_jsonl,
+    normalize_token_usage,
+    open_capture,
+    parse_event_obj,
+    peek_row_header,
+    read_span,
+    read_state_is_reusable,
+    segment_end_ts,
+    segment_tool_names,
+    summarize_event_segment,
+    summarize_tools,
+    truncate,
+)
 
-def load_jsonl(path: Path) -> list[dict[str, Any]]:
-    rows: list[dict[str, Any]] = []
-    if not path.exists():
-        return rows
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            rows.append(json.loads(line))
-    return rows
 
+class RowCounter:
+    """Pass rows through unchanged while counting them, so a streamed capture is read only once."""
 
-def fmt_ts_ms(ts_ms: int | None) -> str:
-    if ts_ms is None:
-        return "unknown"
-    try:
-        t = dt.datetime.fromtimestamp(ts_ms / 1000.0, tz=dt.timezone.utc)
-        return t.isoformat()
-    except Exception:
-        return str(ts_ms)
+    def __init__(self, rows: Iterable[Any]) -> None:
+        self.rows = 0
+        self._rows = rows
+
+    def __iter__(self) -> Iterator[Any]:
+        for row in self._rows:
+            self.rows += 1
+            yield row
 
 
 def md_code_block(lang: str, text: str) -> str:
     return f"```{lang}\n{text}\n```"
 
 
-def summarize_tools(tools: list[Any]) -> list[str]:
-    names: list[str] = []
-    for tool in tools:
-        if isinstance(tool, dict) and "name" in tool:
-            names.append(str(tool["name"]))
-        elif isinstance(tool, dict) and tool.get("type") == "web_search":
-            names.append("web_search")
-        else:
-            names.append("<unknown>")
-    # de-dupe while preserving order
-    seen: set[str] = set()
-    out: list[str] = []
-    for n in names:
-        if n not in seen:
-            out.append(n)
-            seen.add(n)
-    return out
-
-
 def render_response_item(item: dict[str, Any]) -> str:
     t = item.get("type", "<missing-type>")
     if t == "message":
@@ -89,38 +128,6 @@ def render_response_item(item: dict[str, Any]) -> str:
     return f"- `{t}`: {json.dumps(item, ensure_ascii=False)}"
 
 
-def parse_event_obj(event_obj: Any) -> tuple[str, Any]:
-    """
-    ResponseEvent is serde-serialized as an externally-tagged enum by default, e.g.:
-      {"OutputTextDelta": "..."}
-      {"Completed": {"response_id": "...", ...}}
-    """
-    if isinstance(event_obj, str):
-        return event_obj, None
-    if isinstance(event_obj, dict) and len(event_obj) == 1:
-        name, payload = next(iter(event_obj.items()))
-        return str(name), payload
-    return "<unknown>", event_obj
-
-
-def truncate(text: str, limit: int) -> str:
-    if len(text) <= limit:
-        return text
-    return f"{text[:limit]}… <truncated {len(text) - limit} chars>"
-
-
-def extract_message_text(content: Any) -> str:
-    if not isinstance(content, list):
-        return ""
-    parts: list[str] = []
-    for c in content:
-        if not isinstance(c, dict):
-            continue
-        if "text" in c:
-            parts.append(str(c["text"]))
-    return "".join(parts)
-
-
 def summarize_input_item(item: dict[str, Any], *, text_limit: int) -> str:
     t = item.get("type", "<missing-type>")
     if t == "message":
@@ -165,321 +172,1610 @@ def summarize_input_item(item: dict[str, Any], *, text_limit: int) -> str:
     return f"- `{t}`: `<omitted>`"
 
 
-def extract_tools_from_events(seg: list[dict[str, Any]]) -> list[str]:
-    out: list[str] = []
-    for r in seg:
-        ev = r.get("event")
-        if ev is None:
-            continue
-        ts = fmt_ts_ms(r.get("ts_ms"))
-        name, payload = parse_event_obj(ev)
-        if name not in ("OutputItemAdded", "OutputItemDone"):
-            continue
-        if not isinstance(payload, dict):
-            continue
-        item_type = payload.get("type")
-        if item_type == "function_call":
-            tool_name = payload.get("name", "<missing-name>")
-            call_id = payload.get("call_id", "<missing-call-id>")
-            args = payload.get("arguments", "")
-            out.append(
-                f"- ts=`{ts}` `{name}` `function_call`: `{tool_name}` call_id=`{call_id}` args={truncate(str(args), 200)}"
-            )
-        elif item_type == "custom_tool_call":
-            tool_name = payload.get("name", "<missing-name>")
-            call_id = payload.get("call_id", "<missing-call-id>")
-            status = payload.get("status", "<missing-status>")
-            tool_input = payload.get("input", "")
-            out.append(
-                f"- ts=`{ts}` `{name}` `custom_tool_call`: `{tool_name}` call_id=`{call_id}` status=`{status}` input={truncate(str(tool_input), 200)}"
-            )
-        elif item_type == "web_search_call":
-            status = payload.get("status", "<missing-status>")
-            action = payload.get("action") if isinstance(payload.get("action"), dict) else {}
-            query = action.get("query") or action.get("queries")
-            out.append(
-                f"- ts=`{ts}` `{name}` `web_search_call`: status=`{status}` query={truncate(json.dumps(query, ensure_ascii=False), 200)}"
-            )
-    # de-dupe while preserving order
-    seen: set[str] = set()
-    uniq: list[str] = []
-    for x in out:
-        if x not in seen:
-            uniq.append(x)
-            seen.add(x)
-    return uniq
+def extract_tools_from_events(seg: Iterable[dict[str, Any]]) -> list[str]:
+    return summarize_event_segment(seg)["tools"]
 
 
-def extract_assistant_final_text(seg: list[dict[str, Any]]) -> str:
+def extract_assistant_final_text(seg: Iterable[dict[str, Any]]) -> str:
     text, _ts = extract_assistant_final_text_with_ts(seg)
     return text
 
 
-def extract_assistant_final_text_with_ts(seg: list[dict[str, Any]]) -> tuple[str, str | None]:
-    # Prefer finalized assistant message (OutputItemDone message -> output_text).
-    for r in reversed(seg):
-        ev = r.get("event")
-        if ev is None:
-            continue
-        name, payload = parse_event_obj(ev)
-        if name != "OutputItemDone" or not isinstance(payload, dict):
-            continue
-        if payload.get("type") != "message" or payload.get("role") != "assistant":
-            continue
-        content = payload.get("content")
-        if isinstance(content, list):
-            for c in content:
-                if isinstance(c, dict) and c.get("type") == "output_text" and "text" in c:
-                    return str(c["text"]), fmt_ts_ms(r.get("ts_ms"))
-    # Fall back to streaming deltas.
-    parts: list[str] = []
-    last_ts: str | None = None
-    for r in seg:
-        ev = r.get("event")
-        if ev is None:
-            continue
-        name, payload = parse_event_obj(ev)
-        if name == "OutputTextDelta" and isinstance(payload, str):
-            parts.append(payload)
-            last_ts = fmt_ts_ms(r.get("ts_ms"))
-    return "".join(parts), last_ts
+def extract_assistant_final_text_with_ts(seg: Iterable[dict[str, Any]]) -> tuple[str, str | None]:
+    # Prefer finalized assistant message (OutputItemDone message -> output_text), else streaming deltas.
+    summary = summarize_event_segment(seg)
+    return summary["output_text"], summary["output_ts"]
 
 
-def main() -> int:
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--requests", type=Path, required=True)
-    ap.add_argument("--events", type=Path, required=False)
-    ap.add_argument("--out-readable", type=Path, required=True)
-    ap.add_argument("--out-simplified", type=Path, required=True)
-    args = ap.parse_args()
+def render_tools_line(tools: list[Any]) -> str:
+    tool_names = summarize_tools(tools)
+    if len(tool_names) > 6:
+        shown = ", ".join(f"`{n}`" for n in tool_names[:6])
+        return f"- tools: {shown}, `<+{len(tool_names) - 6} more>`"
+    return f"- tools: {', '.join(f'`{n}`' for n in tool_names) if tool_names else '`(none)`'}"
 
-    req_rows = load_jsonl(args.requests)
-    ev_rows = load_jsonl(args.events) if args.events else []
-
-    # Split the event stream into per-response segments (boundary = Completed).
-    event_segments: list[list[dict[str, Any]]] = []
-    cur: list[dict[str, Any]] = []
-    for row in ev_rows:
-        cur.append(row)
-        event_obj = row.get("event")
-        if event_obj is None:
-            continue
-        name, _payload = parse_event_obj(event_obj)
-        if name == "Completed":
-            event_segments.append(cur)
-            cur = []
-    if cur:
-        event_segments.append(cur)
-
-    def summarize_event_segment(seg: list[dict[str, Any]]) -> dict[str, Any]:
-        counts: Counter[str] = Counter()
-        completed: dict[str, Any] | None = None
-        output_items_done = 0
-        first_ts_ms: int | None = None
-        last_ts_ms: int | None = None
-        for r in seg:
-            ts_ms = r.get("ts_ms")
-            if isinstance(ts_ms, int):
-                if first_ts_ms is None or ts_ms < first_ts_ms:
-                    first_ts_ms = ts_ms
-                if last_ts_ms is None or ts_ms > last_ts_ms:
-                    last_ts_ms = ts_ms
-            ev = r.get("event")
-            if ev is None:
-                continue
-            name, payload = parse_event_obj(ev)
-            counts[name] += 1
-            if name == "Completed" and isinstance(payload, dict):
-                completed = payload
-            if name == "OutputItemDone":
-                output_items_done += 1
-        assistant_text, assistant_ts = extract_assistant_final_text_with_ts(seg)
-        return {
-            "counts": counts,
-            "output_text": assistant_text,
-            "output_ts": assistant_ts,
-            "segment_start_ts": fmt_ts_ms(first_ts_ms),
-            "segment_end_ts": fmt_ts_ms(last_ts_ms),
-            "completed": completed,
-            "output_items_done": output_items_done,
-            "tools": extract_tools_from_events(seg),
-        }
-
-    seg_summaries = [summarize_event_segment(seg) for seg in event_segments]
-
-    # Readable MD
+
+def render_capture_file_line(kind: str, path: Path, rows: int | None) -> str:
+    if rows is None:
+        return f"- {kind}: `{path}` (followed while it is written)"
+    return f"- {kind}: `{path}` ({rows} lines, {path.stat().st_size if path.exists() else 0} bytes)"
+
+
+def render_readable_header(
+    requests_path: Path,
+    request_rows: int | None,
+    events_path: Path | None,
+    event_rows: int | None,
+    call_filter: str | None = None,
+    per_conversation: bool = False,
+) -> list[str]:
+    """Row counts of None (captures still being written, as in --follow) are left out."""
     readable: list[str] = []
     readable.append("# Codex Capture (Readable)")
     readable.append("")
     readable.append("## Files")
-    readable.append(f"- requests: `{args.requests}` ({len(req_rows)} lines, {args.requests.stat().st_size if args.requests.exists() else 0} bytes)")
-    if args.events:
-        readable.append(f"- events: `{args.events}` ({len(ev_rows)} lines, {args.events.stat().st_size if args.events.exists() else 0} bytes)")
+    readable.append(render_capture_file_line("requests", requests_path, request_rows))
+    if events_path:
+        readable.append(render_capture_file_line("events", events_path, event_rows))
+    if call_filter:
+        readable.append(f"- filter: `{call_filter}` (call numbers are positions in the unfiltered capture)")
     readable.append("")
 
-    readable.append("## Timeline (Interleaved)")
-    readable.append("Requests and streaming responses are separate capture sources, but rendered below in chronological order per call.")
+    if per_conversation:
+        readable.append("## Timeline (Per Conversation)")
+        readable.append(
+            "Requests are joined to their streaming responses by conversation_id and timestamp; "
+            "each conversation below is its own chronological timeline."
+        )
+    else:
+        readable.append("## Timeline (Interleaved)")
+        readable.append("Requests and streaming responses are separate capture sources, but rendered below in chronological order per call.")
     readable.append("")
+    return readable
 
-    total_calls = max(len(req_rows), len(seg_summaries))
-    if total_calls == 0:
-        readable.append("_No requests or events captured._")
-    for i in range(total_calls):
-        req_row = req_rows[i] if i < len(req_rows) else None
-        seg_summary = seg_summaries[i] if i < len(seg_summaries) else None
-        seg = event_segments[i] if i < len(event_segments) else None
 
-        readable.append(f"### GPT Call #{i + 1}")
+def render_readable_call(
+    index: int,
+    req_row: dict[str, Any] | None,
+    seg: EventSegment | None,
+    seg_summary: dict[str, Any] | None,
+    *,
+    unchanged_items: int = 0,
+) -> list[str]:
+    readable: list[str] = []
+    readable.append(f"### GPT Call #{index}")
 
-        if req_row is None:
-            readable.append("#### Request")
-            readable.append("_No request captured for this call index._")
-        else:
-            ts_ms = req_row.get("ts_ms")
-            conv = req_row.get("conversation_id")
-            req = req_row.get("request", {})
-            readable.append("#### Request")
-            readable.append(f"- ts: `{fmt_ts_ms(ts_ms)}`")
-            readable.append(f"- conversation_id: `{conv}`")
-            if isinstance(req, dict):
-                readable.append(f"- model: `{req.get('model')}`")
-                readable.append(f"- tool_choice: `{req.get('tool_choice')}`")
-                readable.append(f"- parallel_tool_calls: `{req.get('parallel_tool_calls')}`")
-                tools = req.get("tools", [])
-                if isinstance(tools, list):
-                    tool_names = summarize_tools(tools)
-                    if len(tool_names) > 6:
-                        shown = ", ".join(f"`{n}`" for n in tool_names[:6])
-                        readable.append(f"- tools: {shown}, `<+{len(tool_names) - 6} more>`")
+    if req_row is None:
+        readable.append("#### Request")
+        readable.append("_No request captured for this call index._")
+    else:
+        ts_ms = req_row.get("ts_ms")
+        conv = req_row.get("conversation_id")
+        req = req_row.get("request", {})
+        readable.append("#### Request")
+        readable.append(f"- ts: `{fmt_ts_ms(ts_ms)}`")
+        readable.append(f"- conversation_id: `{conv}`")
+        if isinstance(req, dict):
+            readable.append(f"- model: `{req.get('model')}`")
+            readable.append(f"- tool_choice: `{req.get('tool_choice')}`")
+            readable.append(f"- parallel_tool_calls: `{req.get('parallel_tool_calls')}`")
+            tools = req.get("tools", [])
+            if isinstance(tools, list):
+                readable.append(render_tools_line(tools))
+            instructions = req.get("instructions")
+            if isinstance(instructions, str):
+                readable.append(f"- instructions: `{len(instructions)}` chars (see JSONL for full text)")
+            include = req.get("include", [])
+            if isinstance(include, list) and include:
+                readable.append(f"- include: {', '.join(f'`{x}`' for x in include)}")
+            readable.append("")
+            readable.append("input[] (condensed):")
+            input_items = req.get("input", [])
+            if isinstance(input_items, list) and input_items:
+                req_ts = fmt_ts_ms(ts_ms)
+                if unchanged_items:
+                    readable.append(f"[ts=`{req_ts}`] - `<{unchanged_items} items unchanged>`")
+                for it in input_items[unchanged_items:]:
+                    if isinstance(it, dict):
+                        readable.append(f"[ts=`{req_ts}`] {summarize_input_item(it, text_limit=260)}")
                     else:
-                        readable.append(
-                            f"- tools: {', '.join(f'`{n}`' for n in tool_names) if tool_names else '`(none)`'}"
-                        )
-                instructions = req.get("instructions")
-                if isinstance(instructions, str):
-                    readable.append(f"- instructions: `{len(instructions)}` chars (see JSONL for full text)")
-                include = req.get("include", [])
-                if isinstance(include, list) and include:
-                    readable.append(f"- include: {', '.join(f'`{x}`' for x in include)}")
-                readable.append("")
-                readable.append("input[] (condensed):")
-                input_items = req.get("input", [])
-                if isinstance(input_items, list) and input_items:
-                    req_ts = fmt_ts_ms(ts_ms)
-                    for it in input_items:
-                        if isinstance(it, dict):
-                            readable.append(f"[ts=`{req_ts}`] {summarize_input_item(it, text_limit=260)}")
-                        else:
-                            readable.append(f"[ts=`{req_ts}`] - <non-object>: <omitted>")
-                else:
-                    readable.append("_No input items._")
+                        readable.append(f"[ts=`{req_ts}`] - <non-object>: <omitted>")
+            else:
+                readable.append("_No input items._")
 
-        readable.append("")
+    readable.append("")
 
-        readable.append("#### Response (SSE)")
-        if seg_summary is None or seg is None:
-            readable.append("_No streaming response segment captured for this call index._")
-            readable.append("")
-            continue
-
-        counts: Counter[str] = seg_summary["counts"]
-        output_text: str = seg_summary["output_text"]
-        completed_payload: dict[str, Any] | None = seg_summary["completed"]
-        output_items_done: int = seg_summary["output_items_done"]
-
-        readable.append(f"- segment_start_ts: `{seg_summary.get('segment_start_ts')}`")
-        readable.append(f"- segment_end_ts: `{seg_summary.get('segment_end_ts')}`")
-        readable.append(f"- assistant_output_ts: `{seg_summary.get('output_ts')}`")
-        readable.append(f"- events: `{len(seg)}`")
-        if counts:
-            readable.append(f"- event type counts: {', '.join(f'`{k}`={v}' for k, v in counts.most_common())}")
-        readable.append(f"- OutputItemDone events: `{output_items_done}`")
+    readable.append("#### Response (SSE)")
+    if seg_summary is None or seg is None:
+        readable.append("_No streaming response segment captured for this call index._")
         readable.append("")
+        return readable
 
-        tools_used: list[str] = seg_summary.get("tools") or []
-        if tools_used:
-            readable.append("Tool calls emitted by the model:")
-            readable.extend(tools_used)
-            readable.append("")
+    counts: Counter[str] = seg_summary["counts"]
+    output_text: str = seg_summary["output_text"]
+    completed_payload: dict[str, Any] | None = seg_summary["completed"]
+    output_items_done: int = seg_summary["output_items_done"]
 
-        if output_text.strip():
-            readable.append("Assistant final text:")
-            readable.append(md_code_block("text", output_text.strip()))
-            readable.append("")
+    readable.append(f"- segment_start_ts: `{seg_summary.get('segment_start_ts')}`")
+    readable.append(f"- segment_end_ts: `{seg_summary.get('segment_end_ts')}`")
+    readable.append(f"- assistant_output_ts: `{seg_summary.get('output_ts')}`")
+    readable.append(f"- events: `{len(seg)}`")
+    if counts:
+        readable.append(f"- event type counts: {', '.join(f'`{k}`={v}' for k, v in counts.most_common())}")
+    readable.append(f"- OutputItemDone events: `{output_items_done}`")
+    readable.append("")
 
-        if completed_payload is not None:
-            readable.append("Completed:")
-            readable.append(md_code_block("json", json.dumps(completed_payload, ensure_ascii=False, indent=2)))
-            readable.append("")
+    tools_used: list[str] = seg_summary.get("tools") or []
+    if tools_used:
+        readable.append("Tool calls emitted by the model:")
+        readable.extend(tools_used)
+        readable.append("")
+
+    if output_text.strip():
+        readable.append("Assistant final text:")
+        readable.append(md_code_block("text", output_text.strip()))
+        readable.append("")
+
+    if completed_payload is not None:
+        readable.append("Completed:")
+        readable.append(md_code_block("json", json.dumps(completed_payload, ensure_ascii=False, indent=2)))
+        readable.append("")
+    return readable
 
-    args.out_readable.parent.mkdir(parents=True, exist_ok=True)
-    args.out_readable.write_text("\n".join(readable) + "\n", encoding="utf-8-sig")
 
-    # Simplified MD (timeline-like)
+def render_simplified_header() -> list[str]:
     simplified: list[str] = []
     simplified.append("# Codex Capture (Simplified)")
     simplified.append("")
     simplified.append("This view keeps the essential per-call input/output and collapses boilerplate as `<...>`.")
     simplified.append("")
+    return simplified
 
-    if not req_rows:
-        simplified.append("_No requests captured._")
-    for i, row in enumerate(req_rows, start=1):
-        ts = fmt_ts_ms(row.get("ts_ms"))
-        req = row.get("request", {})
-        conv = row.get("conversation_id")
-        simplified.append(f"## GPT Call #{i}")
-        simplified.append(f"- ts: `{ts}`")
-        simplified.append(f"- conversation_id: `{conv}`")
-        if isinstance(req, dict):
-            simplified.append(f"- model: `{req.get('model')}`")
-            simplified.append(f"- tool_choice: `{req.get('tool_choice')}`")
-            simplified.append(f"- parallel_tool_calls: `{req.get('parallel_tool_calls')}`")
-            tools = req.get("tools", [])
-            if isinstance(tools, list):
-                tool_names = summarize_tools(tools)
-                if len(tool_names) > 6:
-                    shown = ", ".join(f"`{n}`" for n in tool_names[:6])
-                    simplified.append(f"- tools: {shown}, `<+{len(tool_names) - 6} more>`")
-                else:
-                    simplified.append(f"- tools: {', '.join(f'`{n}`' for n in tool_names) if tool_names else '`(none)`'}")
-        simplified.append("")
-        simplified.append(f"### Input (condensed) @ `{ts}`")
-        if isinstance(req, dict) and isinstance(req.get("input"), list):
-            for it in req["input"]:
-                if isinstance(it, dict):
-                    simplified.append(f"[ts=`{ts}`] {summarize_input_item(it, text_limit=220)}")
-                else:
-                    simplified.append(f"[ts=`{ts}`] - `<unknown input item omitted>`")
+
+def render_simplified_call(
+    index: int,
+    row: dict[str, Any],
+    summary: dict[str, Any] | None,
+    *,
+    unchanged_items: int = 0,
+) -> list[str]:
+    simplified: list[str] = []
+    ts = fmt_ts_ms(row.get("ts_ms"))
+    req = row.get("request", {})
+    conv = row.get("conversation_id")
+    simplified.append(f"## GPT Call #{index}")
+    simplified.append(f"- ts: `{ts}`")
+    simplified.append(f"- conversation_id: `{conv}`")
+    if isinstance(req, dict):
+        simplified.append(f"- model: `{req.get('model')}`")
+        simplified.append(f"- tool_choice: `{req.get('tool_choice')}`")
+        simplified.append(f"- parallel_tool_calls: `{req.get('parallel_tool_calls')}`")
+        tools = req.get("tools", [])
+        if isinstance(tools, list):
+            simplified.append(render_tools_line(tools))
+    simplified.append("")
+    simplified.append(f"### Input (condensed) @ `{ts}`")
+    if isinstance(req, dict) and isinstance(req.get("input"), list):
+        if unchanged_items:
+            simplified.append(f"[ts=`{ts}`] - `<{unchanged_items} items unchanged>`")
+        for it in req["input"][unchanged_items:]:
+            if isinstance(it, dict):
+                simplified.append(f"[ts=`{ts}`] {summarize_input_item(it, text_limit=220)}")
+            else:
+                simplified.append(f"[ts=`{ts}`] - `<unknown input item omitted>`")
+    else:
+        simplified.append("_No input items._")
+    simplified.append("")
+
+    if summary is not None:
+        tools_used: list[str] = summary.get("tools") or []
+        out_text: str = summary.get("output_text", "")
+        simplified.append("### Output (condensed)")
+        simplified.append(f"- segment_start_ts: `{summary.get('segment_start_ts')}`")
+        simplified.append(f"- segment_end_ts: `{summary.get('segment_end_ts')}`")
+        simplified.append(f"- assistant_output_ts: `{summary.get('output_ts')}`")
+        if tools_used:
+            simplified.append("Tool calls emitted by the model:")
+            simplified.extend(tools_used)
         else:
-            simplified.append("_No input items._")
+            simplified.append("Tool calls emitted by the model: `<none>`")
         simplified.append("")
+        simplified.append("Assistant final text:")
+        simplified.append(md_code_block("text", out_text.strip() or "<empty>"))
+        simplified.append("")
+    return simplified
 
-        if args.events and i <= len(seg_summaries):
-            summary = seg_summaries[i - 1]
-            tools_used: list[str] = summary.get("tools") or []
-            out_text: str = summary.get("output_text", "")
-            simplified.append("### Output (condensed)")
-            simplified.append(f"- segment_start_ts: `{summary.get('segment_start_ts')}`")
-            simplified.append(f"- segment_end_ts: `{summary.get('segment_end_ts')}`")
-            simplified.append(f"- assistant_output_ts: `{summary.get('output_ts')}`")
-            if tools_used:
-                simplified.append("Tool calls emitted by the model:")
-                simplified.extend(tools_used)
-            else:
-                simplified.append("Tool calls emitted by the model: `<none>`")
-            simplified.append("")
-            simplified.append("Assistant final text:")
-            simplified.append(md_code_block("text", out_text.strip() or "<empty>"))
-            simplified.append("")
 
+def render_simplified_footer() -> list[str]:
+    simplified: list[str] = []
     simplified.append("## Notes")
     simplified.append("- New GPT calls typically happen when Codex needs to send tool results back as `function_call_output` and ask the model how to proceed.")
     simplified.append("- Web search may appear as `web_search_call` items in the output stream; local tools appear as `function_call` items.")
     simplified.append("")
+    return simplified
+
+
+def open_markdown(path: Path) -> IO[str]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path.open("w", encoding="utf-8-sig")
+
+
+def write_lines(out: IO[str], lines: list[str]) -> None:
+    out.write("".join(f"{line}\n" for line in lines))
+
+
+class InputPrefixTracker:
+    """
+    Remembers the input[] item digests of the latest request in each conversation.
+
+    Used by --delta-inputs to collapse the history a request shares with the previous one.
+    """
+
+    def __init__(self) -> None:
+        self._previous: dict[Any, list[str]] = {}
+
+    def shared_prefix(self, req_row: dict[str, Any]) -> int:
+        req = req_row.get("request")
+        items = req.get("input") if isinstance(req, dict) else None
+        if not isinstance(items, list):
+            return 0
+        digests = [content_digest(canonical_json(item)) for item in items]
+        conv = req_row.get("conversation_id")
+        previous = self._previous.get(conv)
+        self._previous[conv] = digests
+        return common_prefix_len(previous, digests) if previous else 0
+
+
+def render_calls(
+    calls: Iterable[CallRecord],
+    prefix_tracker: InputPrefixTracker | None = None,
+) -> Iterator[tuple[str, str]]:
+    """Render each call into its `(readable, simplified)` Markdown text; simplified is empty without a request."""
+    for i, req_row, seg in calls:
+        seg_summary = summarize_event_segment(seg) if seg is not None else None
+        unchanged = prefix_tracker.shared_prefix(req_row) if prefix_tracker is not None and req_row is not None else 0
+        readable = "".join(
+            f"{line}\n" for line in render_readable_call(i, req_row, seg, seg_summary, unchanged_items=unchanged)
+        )
+        simplified = ""
+        if req_row is not None:
+            simplified = "".join(
+                f"{line}\n" for line in render_simplified_call(i, req_row, seg_summary, unchanged_items=unchanged)
+            )
+        yield readable, simplified
+
+
+def write_capture_markdown(
+    out_readable: Path,
+    out_simplified: Path,
+    readable_header: list[str] | Callable[[], list[str]],
+    chunks: Iterable[tuple[str, str]],
+) -> None:
+    """
+    Write rendered `(readable, simplified)` chunks, in order, to both Markdown outputs.
+
+    A callable `readable_header` is called once `chunks` is exhausted, for headers whose row counts
+    are taken while streaming; the readable chunks are spooled and copied in after it.
+    """
+    with open_markdown(out_readable) as readable, open_markdown(out_simplified) as simplified:
+        spool: IO[str] | None = None
+        if callable(readable_header):
+            spool = tempfile.TemporaryFile("w+", encoding="utf-8", dir=out_readable.parent)
+        body = spool if spool is not None else readable
+        try:
+            if not callable(readable_header):
+                write_lines(readable, readable_header)
+            write_lines(simplified, render_simplified_header())
+
+            wrote_calls = False
+            wrote_requests = False
+            for readable_text, simplified_text in chunks:
+                if readable_text:
+                    wrote_calls = True
+                    body.write(readable_text)
+                if simplified_text:
+                    wrote_requests = True
+                    simplified.write(simplified_text)
+
+            if not wrote_calls:
+                write_lines(body, ["_No requests or events captured._"])
+            if not wrote_requests:
+                write_lines(simplified, ["_No requests captured._"])
+            write_lines(simplified, render_simplified_footer())
+
+            if spool is not None:
+                write_lines(readable, readable_header())
+                spool.seek(0)
+                shutil.copyfileobj(spool, readable)
+        finally:
+            if spool is not None:
+                spool.close()
+
+
+READABLE_INDEX_COLUMNS = ["call", "ts", "model", "duration ms", "tools", "input tok", "cached tok", "output tok", "page"]
+_READABLE_PAGE_RE = re.compile(r"\d{4,}\.md")
+
+
+def readable_page_name(page: int) -> str:
+    return f"{page:04d}.md"
+
+
+def readable_index_row(index: int, req_row: dict[str, Any] | None, seg: EventSegment | None, page: int) -> list[Any]:
+    """One index.md row; only the segment's row headers, tool items and Completed row are decoded."""
+    ts_ms = req_row.get("ts_ms") if req_row is not None else None
+    request = req_row.get("request") if req_row is not None else None
+    model = request.get("model") if isinstance(request, dict) else None
+    duration_ms: int | None = None
+    tools: list[str] = []
+    usage: dict[str, int] | None = None
+    if seg is not None and seg.lines:
+        if not isinstance(ts_ms, int):
+            ts_ms = peek_row_header(seg.lines[0])[0]
+        end_ts = segment_end_ts(seg.lines)
+        if isinstance(ts_ms, int) and end_ts is not None:
+            duration_ms = end_ts - ts_ms
+        tools = sorted(segment_tool_names(seg.lines))
+        if is_completed_line(seg.lines[-1]):
+            _name, completed = parse_event_obj(json.loads(seg.lines[-1]).get("event"))
+            usage = normalize_token_usage(completed)
+    page_name = readable_page_name(page)
+    return [
+        f"[#{index}]({page_name}#gpt-call-{index})",
+        fmt_ts_ms(ts_ms) if ts_ms is not None else None,
+        model,
+        duration_ms,
+        ", ".join(tools) or None,
+        usage["input_tokens"] if usage is not None else None,
+        usage["cached_input_tokens"] if usage is not None else None,
+        usage["output_tokens"] if usage is not None else None,
+        f"[{page_name[:-3]}]({page_name})",
+    ]
+
+
+def write_paged_markdown(
+    out_dir: Path,
+    out_simplified: Path,
+    readable_header: list[str] | Callable[[], list[str]],
+    page_size: int,
+    calls: Iterable[CallRecord],
+    prefix_tracker: InputPrefixTracker | None = None,
+) -> int:
+    """
+    `--page-size`: write the readable view as `out_dir/0001.md`, `0002.md`, ... of `page_size` calls
+    each, plus `out_dir/index.md` with one row per call. A page is closed as soon as it is full and
+    the index is appended per call (spooled behind a callable `readable_header`, as in
+    `write_capture_markdown`), so memory does not grow with the capture. Returns the page count.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Pages left over from a longer earlier run would look like part of this one.
+    for stale in out_dir.iterdir():
+        if _READABLE_PAGE_RE.fullmatch(stale.name):
+            stale.unlink()
+    page = 0
+    on_page = 0
+    page_file: IO[str] | None = None
+    wrote_requests = False
+    with open_markdown(out_dir / "index.md") as index, open_markdown(out_simplified) as simplified:
+        spool: IO[str] | None = None
+        if callable(readable_header):
+            spool = tempfile.TemporaryFile("w+", encoding="utf-8", dir=out_dir)
+        body = spool if spool is not None else index
+        try:
+            if not callable(readable_header):
+                write_lines(index, readable_header)
+            write_lines(simplified, render_simplified_header())
+            for call in calls:
+                readable_text, simplified_text = next(render_calls([call], prefix_tracker))
+                if page_file is None:
+                    if not page:
+                        write_lines(body, md_table(READABLE_INDEX_COLUMNS, []))
+                    page += 1
+                    page_file = open_markdown(out_dir / readable_page_name(page))
+                    nav = "[index](index.md)"
+                    if page > 1:
+                        nav += f" · [previous page]({readable_page_name(page - 1)})"
+                    write_lines(page_file, [f"# Codex Capture (Readable), page {page}", nav, ""])
+                page_file.write(readable_text)
+                write_lines(body, md_table(READABLE_INDEX_COLUMNS, [readable_index_row(*call, page)])[2:])
+                if simplified_text:
+                    wrote_requests = True
+                    simplified.write(simplified_text)
+                on_page += 1
+                if on_page == page_size:
+                    page_file.close()
+                    page_file = None
+                    on_page = 0
+
+            if not page:
+                write_lines(body, ["_No requests or events captured._"])
+            if not wrote_requests:
+                write_lines(simplified, ["_No requests captured._"])
+            write_lines(simplified, render_simplified_footer())
+
+            if spool is not None:
+                write_lines(index, readable_header())
+                spool.seek(0)
+                shutil.copyfileobj(spool, index)
+        finally:
+            if page_file is not None:
+                page_file.close()
+            if spool is not None:
+                spool.close()
+    return page
+
+
+# --- Content-addressed capture archive --------------------------------------------------------
+#
+# Every request resends the whole conversation, so a requests capture is mostly repeated
+# `instructions`, `tools` and `input[]` items. `--compact` rewrites it as JSONL where each distinct
+# value is stored once and each request keeps only its literal bytes plus references:
+#   {"codex_capture_archive":1}                     header
+#   {"b":"<digest>","v":<raw JSON value>}           blob, written before its first use
+#   {"r":["<literal>",{"v":[off,len]},{"a":[[off,len],...]},...]}
+# `[off, len]` is the byte span of a blob value in the archive, so a request can be rebuilt with a
+# few seeks and no blob table; `{"a": ...}` is an `input[]` array rebuilt as `[` + items + `]`.
+# Literals are the original bytes between references, so expanding is byte-for-byte lossless.
+
+
+_JSON_WS = b" \t\r\n"
+_JSON_STRUCT_RE = re.compile(rb'["{}\[\]]')
+_JSON_SCALAR_RE = re.compile(rb"[^,}\]\s]*")
+
+
+def _skip_ws(data: bytes, pos: int) -> int:
+    while data[pos] in _JSON_WS:
+        pos += 1
+    return pos
+
+
+def json_value_end(data: bytes, pos: int) -> int:
+    """End offset of the raw JSON value starting at `pos`, found without decoding it."""
+    c = data[pos : pos + 1]
+    if c == b'"':
+        i = pos + 1
+        while True:
+            j = data.index(b'"', i)
+            k = j - 1
+            while data[k] == 0x5C:  # backslash
+                k -= 1
+            if (j - 1 - k) % 2 == 0:
+                return j + 1
+            i = j + 1
+    if c in (b"{", b"["):
+        depth = 0
+        i = pos
+        while True:
+            m = _JSON_STRUCT_RE.search(data, i)
+            if m is None:
+                raise ValueError("unterminated JSON value")
+            tok = m.group()
+            if tok == b'"':
+                i = json_value_end(data, m.start())
+                continue
+            depth += 1 if tok in (b"{", b"[") else -1
+            i = m.end()
+            if depth == 0:
+                return i
+    m = _JSON_SCALAR_RE.match(data, pos)
+    if m is None or m.end() == pos:
+        raise ValueError("invalid JSON value")
+    return m.end()
+
+
+def iter_json_members(data: bytes, pos: int) -> Iterator[tuple[str, int, int]]:
+    """Yield `(key, value_start, value_end)` for the raw JSON object starting at `pos`."""
+    i = _skip_ws(data, pos + 1)
+    if data[i : i + 1] == b"}":
+        return
+    while True:
+        key_end = json_value_end(data, i)
+        key = json.loads(data[i:key_end])
+        i = _skip_ws(data, key_end)
+        if data[i : i + 1] != b":":
+            raise ValueError("expected ':'")
+        start = _skip_ws(data, i + 1)
+        end = json_value_end(data, start)
+        yield key, start, end
+        i = _skip_ws(data, end)
+        if data[i : i + 1] == b"}":
+            return
+        if data[i : i + 1] != b",":
+            raise ValueError("expected ','")
+        i = _skip_ws(data, i + 1)
+
+
+def split_json_array(raw: bytes) -> list[bytes] | None:
+    """Elements of a compact JSON array (`[a,b,...]`), or None if it has insignificant whitespace."""
+    if raw == b"[]":
+        return []
+    items: list[bytes] = []
+    i = 1
+    while True:
+        end = json_value_end(raw, i)
+        items.append(raw[i:end])
+        if raw[end : end + 1] == b"]":
+            return items if end + 1 == len(raw) else None
+        if raw[end : end + 1] != b",":
+            return None
+        i = end + 1
+
+
+ArchivePart = Any  # bytes literal | ("v", raw value) | ("a", [raw item, ...])
+
+
+def split_request_line(line: bytes) -> list[ArchivePart]:
+    """Cut a raw requests-capture line into literals and the deduplicable request values."""
+    try:
+        start = _skip_ws(line, 0)
+        if line[start : start + 1] != b"{":
+            return [line]
+        spans: list[tuple[int, int, ArchivePart]] = []
+        for key, vstart, vend in iter_json_members(line, start):
+            if key != "request" or line[vstart : vstart + 1] != b"{":
+                continue
+            for req_key, rstart, rend in iter_json_members(line, vstart):
+                raw = line[rstart:rend]
+                if req_key == "input" and raw.startswith(b"["):
+                    items = split_json_array(raw)
+                    spans.append((rstart, rend, ("a", items) if items is not None else ("v", raw)))
+                elif req_key in ("instructions", "tools") and raw != b"null":
+                    spans.append((rstart, rend, ("v", raw)))
+    except (ValueError, IndexError):
+        return [line]
+    parts: list[ArchivePart] = []
+    pos = 0
+    for vstart, vend, ref in spans:
+        parts.append(line[pos:vstart])
+        parts.append(ref)
+        pos = vend
+    parts.append(line[pos:])
+    return parts
+
+
+def compact_capture(src: Path, dst: Path) -> dict[str, int]:
+    """Write a content-addressed archive of a requests capture; returns size statistics."""
+    blobs: dict[str, list[int]] = {}
+    stats = {"lines": 0, "blobs": 0, "input_bytes": 0, "output_bytes": 0}
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    with open_capture(src) as fin, dst.open("wb") as out:
+        out.write(ARCHIVE_HEADER)
+        pos = len(ARCHIVE_HEADER)
+
+        def store(raw: bytes) -> list[int]:
+            nonlocal pos
+            digest = content_digest(raw)
+            ref = blobs.get(digest)
+            if ref is None:
+                prefix = ARCHIVE_BLOB_PREFIX + digest.encode("ascii") + b'","v":'
+                out.write(prefix + raw + b"}\n")
+                ref = blobs[digest] = [pos + len(prefix), len(raw)]
+                pos += len(prefix) + len(raw) + 2
+                stats["blobs"] += 1
+            return ref
+
+        for line in fin:
+            stats["lines"] += 1
+            stats["input_bytes"] += len(line)
+            parts: list[Any] = []
+            for part in split_request_line(line):
+                if isinstance(part, bytes):
+                    # surrogateescape + ASCII-escaped JSON keeps even invalid UTF-8 bytes exact.
+                    parts.append(part.decode("utf-8", "surrogateescape"))
+                elif part[0] == "v":
+                    parts.append({"v": store(part[1])})
+                else:
+                    parts.append({"a": [store(item) for item in part[1]]})
+            record = json.dumps({"r": parts}, separators=(",", ":")).encode("ascii") + b"\n"
+            out.write(record)
+            pos += len(record)
+    stats["output_bytes"] = pos
+    return stats
+
+
+def expand_capture(src: Path, dst: Path) -> int:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with dst.open("wb") as out:
+        for line in iter_archive_lines(src):
+            out.write(line)
+            written += len(line)
+    return written
+
+
+# --- Byte-offset index sidecar -------------------------------------------------------------------
+#
+# The index records, per call, where its request line and its event segment live in the capture
+# files so a single call can be rendered without parsing everything before it. Layout:
+#   requests.entries: [offset, length, ts_ms, conversation_id] per request row
+#   events.entries:   [offset, length, rows] per closed (Completed-terminated) event segment
+# `scanned` is the byte offset where the next incremental scan resumes. For events this is the
+# start of the still-open segment, which is always re-read from disk.
 
-    args.out_simplified.parent.mkdir(parents=True, exist_ok=True)
-    args.out_simplified.write_text("\n".join(simplified) + "\n", encoding="utf-8-sig")
+INDEX_VERSION = 1
+
+
+def default_index_path(requests_path: Path) -> Path:
+    return requests_path.with_name(f"{requests_path.name}.idx.json")
+
+
+def scan_request_lines(path: Path, start: int) -> tuple[list[list[Any]], int]:
+    entries: list[list[Any]] = []
+    offset = start
+    archive = is_capture_archive(path)
+    with open_capture(path) as f:
+        f.seek(start)
+        for line in f:
+            if not is_complete_line(line):
+                # Partial trailing line: the writer has not finished it yet.
+                break
+            if archive:
+                # Archive entries point at request records; blobs and the header are skipped.
+                if line.startswith(ARCHIVE_RECORD_PREFIX):
+                    skeleton = archive_record_skeleton(line)
+                    if skeleton.strip():
+                        row = json.loads(skeleton)
+                        entries.append([offset, len(line), row.get("ts_ms"), row.get("conversation_id")])
+            elif line.strip():
+                ts_ms, conversation_id = peek_row_header(line)
+                entries.append([offset, len(line), ts_ms, conversation_id])
+            offset += len(line)
+    return entries, offset
+
+
+def scan_event_segments(path: Path, start: int) -> tuple[list[list[int]], int, int]:
+    segments: list[list[int]] = []
+    rows = 0
+    seg_start = start
+    seg_rows = 0
+    offset = start
+    with open_capture(path) as f:
+        f.seek(start)
+        for line in f:
+            if not is_complete_line(line):
+                break
+            offset += len(line)
+            if not line.strip():
+                continue
+            seg_rows += 1
+            if is_completed_line(line):
+                segments.append([seg_start, offset - seg_start, seg_rows])
+                rows += seg_rows
+                seg_start = offset
+                seg_rows = 0
+    return segments, rows, seg_start
+
+
+def _empty_index_part(path: Path | None) -> dict[str, Any]:
+    return {**empty_read_state(path), "entries": []}
+
+
+def load_capture_index(index_path: Path) -> dict[str, Any] | None:
+    if not index_path.exists():
+        return None
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def update_capture_index(index_path: Path, requests_path: Path, events_path: Path | None) -> dict[str, Any]:
+    """Build the index sidecar, or extend it with rows appended since the last run."""
+    index = load_capture_index(index_path) or {}
+    requests_part = index.get("requests") or _empty_index_part(requests_path)
+    events_part = index.get("events") or _empty_index_part(events_path)
+    if not read_state_is_reusable(requests_part, requests_path):
+        requests_part = _empty_index_part(requests_path)
+    if not read_state_is_reusable(events_part, events_path):
+        events_part = _empty_index_part(events_path)
+
+    changed = not index_path.exists()
+    if requests_path.exists() and requests_path.stat().st_size != requests_part["size"]:
+        entries, scanned = scan_request_lines(requests_path, requests_part["scanned"])
+        requests_part["entries"].extend(entries)
+        requests_part["rows"] += len(entries)
+        requests_part["size"] = requests_path.stat().st_size
+        requests_part["scanned"] = scanned
+        changed = True
+    if events_path is not None and events_path.exists() and events_path.stat().st_size != events_part["size"]:
+        segments, rows, scanned = scan_event_segments(events_path, events_part["scanned"])
+        events_part["entries"].extend(segments)
+        events_part["rows"] += rows
+        events_part["size"] = events_path.stat().st_size
+        events_part["scanned"] = scanned
+        changed = True
+
+    for part, path in ((requests_part, requests_path), (events_part, events_path)):
+        if path is not None and path.exists() and part["fingerprint"] is None and part["scanned"]:
+            part["fingerprint"] = file_fingerprint(path, min(part["scanned"], FINGERPRINT_BYTES))
+
+    index = {"version": INDEX_VERSION, "requests": requests_part, "events": events_part}
+    if changed:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = index_path.with_name(f"{index_path.name}.tmp")
+        tmp_path.write_text(json.dumps(index, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp_path, index_path)
+    return index
+
+
+def read_open_segment(events_path: Path | None, start: int) -> EventSegment:
+    """Read the not-yet-Completed tail of the events file (complete lines only)."""
+    lines: list[bytes] = []
+    if events_path is None or not events_path.exists():
+        return EventSegment(lines)
+    with open_capture(events_path) as f:
+        f.seek(start)
+        for line in f:
+            if not is_complete_line(line):
+                break
+            if line.strip():
+                lines.append(line)
+    return EventSegment(lines)
+
+
+def read_segment_lines(f: IO[bytes], offset: int, length: int) -> list[bytes]:
+    return [line for line in read_span(f, offset, length).splitlines() if line.strip()]
+
+
+def iter_indexed_calls(
+    requests_path: Path,
+    events_path: Path | None,
+    calls: Sequence[int],
+    req_entries: list[list[Any] | None],
+    seg_entries: list[list[int] | None],
+    open_segment: tuple[int, EventSegment] | None = None,
+) -> Iterator[CallRecord]:
+    """
+    Yield the given calls by seeking straight to their bytes.
+
+    Entry lists are aligned with `calls`; None means the call has no request row / closed segment.
+    `open_segment` is the still-open event segment together with the call it belongs to.
+    """
+    req_file = CaptureLineReader(requests_path) if any(e is not None for e in req_entries) else None
+    ev_file = (
+        open_capture(events_path) if events_path is not None and any(e is not None for e in seg_entries) else None
+    )
+    try:
+        for call, req_entry, seg_entry in zip(calls, req_entries, seg_entries):
+            req_row: dict[str, Any] | None = None
+            seg: EventSegment | None = None
+            if req_file is not None and req_entry is not None:
+                offset, length, _ts_ms, _conv = req_entry
+                req_row = json.loads(req_file.read(offset, length))
+            if ev_file is not None and seg_entry is not None:
+                offset, length, _rows = seg_entry
+                seg = EventSegment(read_segment_lines(ev_file, offset, length))
+            elif open_segment is not None and call == open_segment[0]:
+                seg = open_segment[1]
+            yield call, req_row, seg
+    finally:
+        if req_file is not None:
+            req_file.close()
+        if ev_file is not None:
+            ev_file.close()
+
+
+ShardTask = tuple[
+    Path,
+    Path | None,
+    Sequence[int],
+    list[list[Any] | None],
+    list[list[int] | None],
+    tuple[int, EventSegment] | None,
+]
+
+
+def plan_shards(
+    index: dict[str, Any],
+    requests_path: Path,
+    events_path: Path | None,
+    calls: Sequence[int],
+    open_segment: EventSegment,
+    shard_size: int,
+) -> Iterator[ShardTask]:
+    """Split the selected calls, in order, into call-aligned shards (segments always end at Completed)."""
+    req_entries = index["requests"]["entries"]
+    seg_entries = index["events"]["entries"]
+    open_call = len(seg_entries) + 1
+    for start in range(0, len(calls), shard_size):
+        shard_calls = calls[start : start + shard_size]
+        yield (
+            requests_path,
+            events_path,
+            shard_calls,
+            [req_entries[n - 1] if n <= len(req_entries) else None for n in shard_calls],
+            [seg_entries[n - 1] if n <= len(seg_entries) else None for n in shard_calls],
+            (open_call, open_segment) if open_segment and open_call in shard_calls else None,
+        )
+
+
+def plan_delta_seeds(shards: list[ShardTask]) -> list[list[list[Any]]]:
+    """
+    For each shard, the index entries of the latest earlier request of every conversation.
+
+    Workers replay these into their InputPrefixTracker so --delta-inputs collapses the same prefix
+    a serial run would, even when the previous request of a conversation lives in another shard.
+    """
+    seeds: list[list[list[Any]]] = []
+    latest_by_conversation: dict[Any, list[Any]] = {}
+    for task in shards:
+        seeds.append(list(latest_by_conversation.values()))
+        for entry in task[3]:
+            if entry is not None:
+                latest_by_conversation[entry[3]] = entry
+    return seeds
+
+
+def render_shard(task: ShardTask, delta_seeds: list[list[Any]] | None = None) -> tuple[str, str]:
+    """Worker entry point: render one shard and return its concatenated Markdown."""
+    prefix_tracker: InputPrefixTracker | None = None
+    if delta_seeds is not None:
+        prefix_tracker = InputPrefixTracker()
+        with CaptureLineReader(task[0]) as reader:
+            for offset, length, _ts_ms, _conv in delta_seeds:
+                prefix_tracker.shared_prefix(json.loads(reader.read(offset, length)))
+    readable_parts: list[str] = []
+    simplified_parts: list[str] = []
+    for readable, simplified in render_calls(iter_indexed_calls(*task), prefix_tracker):
+        readable_parts.append(readable)
+        simplified_parts.append(simplified)
+    return "".join(readable_parts), "".join(simplified_parts)
+
+
+def render_shard_star(args: tuple[ShardTask, list[list[Any]] | None]) -> tuple[str, str]:
+    return render_shard(*args)
+
+
+# --- Call filters (--where) ---------------------------------------------------------------------
+#
+# `--where` keeps the calls matching every `field op value` clause, for example
+#   --where 'conversation_id=c-1 and tool=apply_patch and ts>=2025-10-09T08:00 and duration>=5s'
+# Each clause is decided on the cheapest data that can answer it: conversation_id and ts come from
+# the index entries or the head of the raw request line, model from a byte match on the request
+# line, and tool, event and duration from the raw event lines classified by their prefix (only
+# output item payloads are decoded). Calls that fail are never decoded or rendered.
+
+WHERE_FIELD_ALIASES = {
+    "conversation_id": "conversation_id",
+    "conv": "conversation_id",
+    "model": "model",
+    "ts": "ts",
+    "tool": "tool",
+    "event": "event",
+    "duration": "duration",
+}
+WHERE_STRING_FIELDS = ("conversation_id", "model", "tool", "event")
+_WHERE_AND_RE = re.compile(r"\s+and\s+|\s*&&\s*", re.IGNORECASE)
+_WHERE_CLAUSE_RE = re.compile(r"^(\w+)\s*(<=|>=|!=|=|<|>)\s*(\S.*)$")
+_WHERE_DURATION_RE = re.compile(r"^(\d+(?:\.\d+)?)(ms|s|m)?$")
+_WHERE_DURATION_UNITS = {"ms": 1, "s": 1000, "m": 60_000}
+
+
+def parse_where_ts(value: str) -> int:
+    """Epoch milliseconds, or an ISO-8601 timestamp (UTC unless it carries an offset)."""
+    if value.isdigit():
+        return int(value)
+    parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt.timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def parse_where(value: str) -> list[WhereClause]:
+    clauses: list[WhereClause] = []
+    for part in _WHERE_AND_RE.split(value.strip()):
+        m = _WHERE_CLAUSE_RE.match(part.strip())
+        if m is None:
+            raise argparse.ArgumentTypeError(f"expected FIELD OP VALUE, got {part!r}")
+        name, op, text = m.group(1), m.group(2), m.group(3).strip()
+        field = WHERE_FIELD_ALIASES.get(name.lower())
+        if field is None:
+            raise argparse.ArgumentTypeError(
+                f"unknown field {name!r} (expected one of: {', '.join(sorted(set(WHERE_FIELD_ALIASES.values())))})"
+            )
+        parsed: Any
+        if field in WHERE_STRING_FIELDS:
+            if op not in ("=", "!="):
+                raise argparse.ArgumentTypeError(f"{field} only supports = and !=, got {part!r}")
+            parsed = text.split("|")
+        elif field == "ts":
+            try:
+                parsed = parse_where_ts(text)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"expected epoch ms or ISO-8601 time, got {text!r}") from None
+        else:
+            dm = _WHERE_DURATION_RE.match(text)
+            if dm is None:
+                raise argparse.ArgumentTypeError(f"expected a duration such as 1500, 1500ms, 2s or 1m, got {text!r}")
+            parsed = float(dm.group(1)) * _WHERE_DURATION_UNITS[dm.group(2) or "ms"]
+        clauses.append((field, op, text, parsed))
+    return clauses
+
+
+def select_indexed_calls(
+    call_filter: CallFilter,
+    index: dict[str, Any],
+    requests_path: Path,
+    events_path: Path | None,
+    calls: Iterable[int],
+    open_segment: EventSegment,
+) -> list[int]:
+    """
+    The calls that pass `call_filter`, decided from index entries and raw byte spans.
+
+    A request line is only read for model clauses, and an event segment only for tool/event/duration
+    clauses (or for the header of a call without a request row).
+    """
+    req_entries = index["requests"]["entries"]
+    seg_entries = index["events"]["entries"]
+    open_call = len(seg_entries) + 1
+    req_file = CaptureLineReader(requests_path) if call_filter.needs_request and req_entries else None
+    ev_file = open_capture(events_path) if events_path is not None and seg_entries else None
+    selected: list[int] = []
+
+    def segment_lines(call: int) -> list[bytes] | None:
+        if ev_file is not None and call <= len(seg_entries):
+            offset, length, _rows = seg_entries[call - 1]
+            return read_segment_lines(ev_file, offset, length)
+        if call == open_call and open_segment:
+            return open_segment.lines
+        return None
+
+    try:
+        for call in calls:
+            req_entry = req_entries[call - 1] if call <= len(req_entries) else None
+            lines: list[bytes] | None = None
+            if req_entry is not None:
+                ts_ms, conversation_id = req_entry[2], req_entry[3]
+            else:
+                lines = segment_lines(call)
+                ts_ms, conversation_id = peek_row_header(lines[0]) if lines else (None, None)
+            if not call_filter.match_header(ts_ms, conversation_id):
+                continue
+            if call_filter.needs_request and not call_filter.match_request(
+                req_file.read(req_entry[0], req_entry[1]) if req_file is not None and req_entry is not None else None
+            ):
+                continue
+            if call_filter.needs_segment:
+                if lines is None:
+                    lines = segment_lines(call)
+                if not call_filter.match_segment(lines, ts_ms):
+                    continue
+            selected.append(call)
+    finally:
+        if req_file is not None:
+            req_file.close()
+        if ev_file is not None:
+            ev_file.close()
+    return selected
+
+
+# --- Conversation join ---------------------------------------------------------------------------
+#
+# Positional pairing (request i with event segment i) only holds while a single session writes the
+# captures. With `--join conversation` both files are merged by ts_ms in one streaming pass and rows
+# are grouped by conversation_id: every conversation splits its own event segments, and each request
+# is paired with the next segment of its conversation. A conversation's call is closed by its
+# Completed row, or by the conversation's next request (a retry, or a stream that failed before
+# Completed). The rendered calls are then written as one timeline per conversation.
+
+
+def write_conversation_markdown(
+    out_readable: Path,
+    out_simplified: Path,
+    readable_header: list[str] | Callable[[], list[str]],
+    conversations: dict[str | None, list[int]],
+    chunks: Iterable[tuple[int, str, str]],
+) -> None:
+    """
+    Write rendered `(call, readable, simplified)` chunks as one timeline per conversation.
+
+    Chunks arrive as calls close, interleaved across conversations. They are spooled to temporary
+    files and copied out conversation by conversation at the end, so memory stays bounded.
+    `conversations` and a callable `readable_header` are read only after `chunks` is exhausted.
+    """
+    spans: dict[int, tuple[int, int, int, int]] = {}
+    with tempfile.TemporaryFile() as readable_spool, tempfile.TemporaryFile() as simplified_spool:
+        for call, readable_text, simplified_text in chunks:
+            readable_bytes = readable_text.encode("utf-8")
+            simplified_bytes = simplified_text.encode("utf-8")
+            spans[call] = (readable_spool.tell(), len(readable_bytes), simplified_spool.tell(), len(simplified_bytes))
+            readable_spool.write(readable_bytes)
+            simplified_spool.write(simplified_bytes)
+
+        with open_markdown(out_readable) as readable, open_markdown(out_simplified) as simplified:
+            write_lines(readable, readable_header() if callable(readable_header) else readable_header)
+            write_lines(simplified, render_simplified_header())
+
+            wrote_calls = False
+            wrote_requests = False
+            for conversation_id, calls in conversations.items():
+                shown = [spans[call] for call in calls if call in spans]
+                if not shown:
+                    continue
+                requests = sum(1 for span in shown if span[3])
+                heading = f"## Conversation `{conversation_id}`"
+                write_lines(readable, [heading, f"- calls: {len(shown)} ({requests} with a request row)", ""])
+                wrote_calls = True
+                if requests:
+                    write_lines(simplified, [heading, ""])
+                    wrote_requests = True
+                for readable_offset, readable_len, simplified_offset, simplified_len in shown:
+                    readable.write(read_span(readable_spool, readable_offset, readable_len).decode("utf-8"))
+                    if simplified_len:
+                        simplified.write(read_span(simplified_spool, simplified_offset, simplified_len).decode("utf-8"))
+
+            if not wrote_calls:
+                write_lines(readable, ["_No requests or events captured._"])
+            if not wrote_requests:
+                write_lines(simplified, ["_No requests captured._"])
+            write_lines(simplified, render_simplified_footer())
+
+
+def parse_diff_threshold(value: str) -> DiffThreshold:
+    metric, sep, limit = value.partition("=")
+    metric = metric.strip()
+    if not sep or metric not in DIFF_METRICS:
+        raise argparse.ArgumentTypeError(f"expected METRIC=LIMIT with METRIC one of {', '.join(DIFF_METRICS)}, got {value!r}")
+    limit = limit.strip()
+    relative = limit.endswith("%")
+    try:
+        amount = float(limit[:-1] if relative else limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a limit such as 10% or 500, got {limit!r}") from None
+    return metric, amount, relative
+
+
+# --- Follow mode ---------------------------------------------------------------------------------
+
+
+class JsonlTail:
+    """Read complete rows from a JSONL file that another process is still appending to."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._file: IO[bytes] | None = None
+        self._resolver: ArchiveResolver | None = None
+        self._compressed = False
+        self._partial = b""
+        # Bytes of the (decompressed) stream consumed as complete lines.
+        self._offset = 0
+
+    def next_line(self) -> bytes | None:
+        """Return the next complete non-blank raw line, or None until the writer appends more."""
+        while True:
+            if self._file is None:
+                if not self._path.exists():
+                    return None
+                self._compressed = capture_compression(self._path) is not None
+                self._file = open_capture(self._path)
+                if self._compressed:
+                    self._file.seek(self._offset)
+                    self._partial = b""
+                if self._resolver is None and is_capture_archive(self._path):
+                    self._resolver = ArchiveResolver(open_capture(self._path))
+            try:
+                line = self._file.readline()
+            except (EOFError, OSError, zlib.error):
+                # A compressed stream cut mid-frame by the writer.
+                line = b""
+            if not line or not line.endswith(b"\n"):
+                if self._compressed:
+                    # A decompressor cannot resume at EOF: reopen and skip to the last complete line.
+                    self._file.close()
+                    self._file = None
+                    return None
+                # Keep the half-written line; the next read resumes right after it.
+                self._partial += line
+                return None
+            line = self._partial + line
+            self._partial = b""
+            self._offset += len(line)
+            if self._resolver is not None:
+                if not line.startswith(ARCHIVE_RECORD_PREFIX):
+                    continue
+                line = self._resolver.resolve(line)
+            if line.strip():
+                return line
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._resolver is not None:
+            self._resolver.close()
+            self._resolver = None
+
+
+def follow_capture(
+    requests_path: Path,
+    events_path: Path | None,
+    out_readable: Path,
+    out_simplified: Path,
+    poll_interval: float,
+    prefix_tracker: InputPrefixTracker | None = None,
+    call_filter: CallFilter | None = None,
+) -> None:
+    """
+    Render calls as their Completed events arrive and append them to the Markdown outputs.
+
+    Runs until interrupted (Ctrl-C), then writes the simplified footer.
+    """
+    req_tail = JsonlTail(requests_path)
+    ev_tail = JsonlTail(events_path) if events_path is not None else None
+    # The captures keep growing, so the header carries no row counts (and reads nothing up front).
+    header = render_readable_header(
+        requests_path, None, events_path, None, call_filter.describe() if call_filter is not None else None
+    )
+    next_call = 1
+    cur: list[bytes] = []
+    with open_markdown(out_readable) as readable, open_markdown(out_simplified) as simplified:
+        write_lines(readable, header)
+        write_lines(simplified, render_simplified_header())
+
+        def emit(req_line: bytes | None, seg: EventSegment | None) -> None:
+            nonlocal next_call
+            if call_filter is None or call_filter.match_raw_call(req_line, seg.lines if seg is not None else None):
+                req_row = json.loads(req_line.decode("utf-8")) if req_line is not None else None
+                for readable_text, simplified_text in render_calls([(next_call, req_row, seg)], prefix_tracker):
+                    readable.write(readable_text)
+                    simplified.write(simplified_text)
+            next_call += 1
+
+        try:
+            while True:
+                if ev_tail is None:
+                    while (req_line := req_tail.next_line()) is not None:
+                        emit(req_line, None)
+                else:
+                    while (line := ev_tail.next_line()) is not None:
+                        cur.append(line)
+                        if event_line_name(line) != "Completed":
+                            continue
+                        # Codex writes the request line before streaming, so it is already on disk
+                        # once the matching Completed is. Requests are pulled one call at a time.
+                        emit(req_tail.next_line(), EventSegment(cur))
+                        cur = []
+                readable.flush()
+                simplified.flush()
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            req_tail.close()
+            if ev_tail is not None:
+                ev_tail.close()
+            write_lines(simplified, render_simplified_footer())
+
+
+def parse_call_range(value: str) -> tuple[int, int]:
+    try:
+        if "-" in value:
+            first_s, last_s = value.split("-", 1)
+            first, last = int(first_s), int(last_s)
+        else:
+            first = last = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected N or A-B, got {value!r}") from None
+    if first < 1 or last < first:
+        raise argparse.ArgumentTypeError(f"invalid call range {value!r}")
+    return first, last
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=Path, required=False)
+    ap.add_argument("--events", type=Path, required=False)
+    ap.add_argument("--out-readable", type=Path, required=False)
+    ap.add_argument("--out-simplified", type=Path, required=False)
+    ap.add_argument(
+        "--index",
+        type=Path,
+        required=False,
+        help="Index sidecar path (default: <requests>.idx.json).",
+    )
+    ap.add_argument(
+        "--build-index",
+        action="store_true",
+        help="Build the byte-offset index sidecar, or extend it if the captures have grown.",
+    )
+    call_range = ap.add_mutually_exclusive_group()
+    call_range.add_argument(
+        "--call",
+        type=parse_call_range,
+        metavar="N",
+        help="Render only GPT call N (uses the index).",
+    )
+    call_range.add_argument(
+        "--calls",
+        type=parse_call_range,
+        dest="call",
+        metavar="A-B",
+        help="Render only GPT calls A-B, inclusive (uses the index).",
+    )
+    ap.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Render call-aligned shards in N worker processes (uses the index; output is identical).",
+    )
+    ap.add_argument(
+        "--where",
+        type=parse_where,
+        action="append",
+        metavar="EXPR",
+        help=(
+            "Only render/report calls matching EXPR: `FIELD OP VALUE` clauses joined by `and` over "
+            "conversation_id, model, ts, tool, event and duration (e.g. 'tool=apply_patch and duration>=5s'). "
+            "Repeat to add clauses."
+        ),
+    )
+    ap.add_argument(
+        "--join",
+        choices=("position", "conversation"),
+        default="position",
+        help=(
+            "How requests are paired with event segments: `position` (request N with segment N, the default) or "
+            "`conversation` (per conversation_id in timestamp order, for captures shared by concurrent sessions; "
+            "renders one timeline per conversation)."
+        ),
+    )
+    ap.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep tailing the captures and append each call once its Completed event arrives (Ctrl-C to stop).",
+    )
+    ap.add_argument(
+        "--follow-interval",
+        type=float,
+        default=1.0,
+        help="Polling interval in seconds for --follow (default: 1.0).",
+    )
+    ap.add_argument(
+        "--latency-report",
+        type=Path,
+        metavar="PATH",
+        help="Write per-call and aggregate latency timings to PATH.json and PATH.md.",
+    )
+    ap.add_argument(
+        "--tool-report",
+        type=Path,
+        metavar="PATH",
+        help="Write per-tool execution time and the model/tool/client split of each turn to PATH.json and PATH.md.",
+    )
+    ap.add_argument(
+        "--cache-report",
+        type=Path,
+        metavar="PATH",
+        help="Write expected vs actual prompt-cache reuse per call to PATH.json and PATH.md.",
+    )
+    ap.add_argument(
+        "--size-report",
+        type=Path,
+        metavar="PATH",
+        help="Write the serialized size of each request part (instructions, tool schemas, input item types) and the largest items to PATH.json and PATH.md.",
+    )
+    ap.add_argument(
+        "--token-ledger",
+        type=Path,
+        metavar="PATH",
+        help="Write token usage per call and per conversation, with running totals and tokens/sec, to PATH.csv, PATH.json and PATH.md.",
+    )
+    ap.add_argument(
+        "--diff-report",
+        type=Path,
+        metavar="PATH",
+        help=(
+            "Compare this capture against --baseline-requests/--baseline-events (e.g. the previous Codex build) "
+            "and write the aligned per-call and total differences to PATH.json and PATH.md."
+        ),
+    )
+    ap.add_argument("--baseline-requests", type=Path, metavar="JSONL", help="Baseline requests capture for --diff-report.")
+    ap.add_argument("--baseline-events", type=Path, metavar="JSONL", help="Baseline events capture for --diff-report.")
+    ap.add_argument(
+        "--diff-threshold",
+        type=parse_diff_threshold,
+        action="append",
+        default=[],
+        metavar="METRIC=LIMIT",
+        help=(
+            f"Exit with status 1 when METRIC grows by more than LIMIT (`10%%` relative or `500` absolute) "
+            f"over the baseline; repeatable. Metrics: {', '.join(DIFF_METRICS)}."
+        ),
+    )
+    ap.add_argument(
+        "--trace",
+        type=Path,
+        metavar="PATH",
+        help="Write a Chrome trace / Perfetto timeline (JSON) to PATH: call, first-token, output item and tool events, one track per conversation.",
+    )
+    ap.add_argument(
+        "--fleet",
+        action="append",
+        metavar="GLOB",
+        help=(
+            "Aggregate many captures instead of --requests/--events: a glob or directory (repeatable) "
+            "of *requests*/*events* JSONL files, paired by name. Requires --fleet-report."
+        ),
+    )
+    ap.add_argument(
+        "--fleet-report",
+        type=Path,
+        metavar="PATH",
+        help="Write fleet aggregates (calls per model, tokens, latency percentiles, tool frequency, load) to PATH.json and PATH.md.",
+    )
+    ap.add_argument(
+        "--page-size",
+        type=int,
+        metavar="N",
+        help=(
+            "Write the readable view as pages of N calls: --out-readable is then a directory holding "
+            "0001.md, 0002.md, ... and an index.md with one row per call."
+        ),
+    )
+    ap.add_argument(
+        "--delta-inputs",
+        action="store_true",
+        help="Collapse the input[] prefix a request shares with the previous request of its conversation.",
+    )
+    ap.add_argument(
+        "--compact",
+        type=Path,
+        metavar="ARCHIVE",
+        help="Write a deduplicated, losslessly expandable archive of --requests to ARCHIVE and exit.",
+    )
+    ap.add_argument(
+        "--expand",
+        type=Path,
+        metavar="JSONL",
+        help="Expand the --requests archive back to the original JSONL at JSONL and exit.",
+    )
+    ap.add_argument(
+        "--sqlite",
+        type=Path,
+        metavar="DB",
+        help=(
+            "Load --requests/--events into normalized tables (calls, input_items, output_items, tool_calls, usage) "
+            "of the SQLite database DB and exit; later runs only append the calls written since the last load."
+        ),
+    )
+    args = ap.parse_args()
+
+    if args.fleet:
+        if args.fleet_report is None:
+            ap.error("--fleet requires --fleet-report")
+        if args.requests is not None or args.events is not None:
+            ap.error("--fleet replaces --requests/--events")
+        single_capture_options = (
+            args.out_readable,
+            args.out_simplified,
+            args.call,
+            args.where,
+            args.follow or None,
+            args.build_index or None,
+            args.latency_report,
+            args.tool_report,
+            args.cache_report,
+            args.size_report,
+            args.token_ledger,
+            args.trace,
+            args.diff_report,
+        )
+        if any(option is not None for option in single_capture_options):
+            ap.error("--fleet only supports --fleet-report, --join and --jobs")
+        if args.jobs < 1:
+            ap.error("--jobs must be >= 1")
+        pairs = discover_capture_pairs(args.fleet)
+        if not pairs:
+            ap.error("--fleet matched no *requests*/*events* capture files")
+        write_fleet_report(args.fleet_report, pairs, args.join, args.jobs)
+        print(f"aggregated {len(pairs)} capture pairs")
+        return 0
+    if args.requests is None:
+        ap.error("--requests is required (or --fleet)")
+    if args.fleet_report is not None:
+        ap.error("--fleet-report requires --fleet")
+
+    if args.compact is not None or args.expand is not None:
+        if args.compact is not None and args.expand is not None:
+            ap.error("--compact and --expand are mutually exclusive")
+        if args.compact is not None:
+            if is_capture_archive(args.requests):
+                ap.error(f"{args.requests} is already an archive")
+            stats = compact_capture(args.requests, args.compact)
+            print(
+                f"compacted {stats['lines']} lines: {stats['input_bytes']} -> {stats['output_bytes']} bytes "
+                f"({stats['blobs']} distinct blobs)"
+            )
+        else:
+            if not is_capture_archive(args.requests):
+                ap.error(f"{args.requests} is not a capture archive")
+            print(f"expanded {expand_capture(args.requests, args.expand)} bytes")
+        return 0
+
+    rendering = args.out_readable is not None or args.out_simplified is not None
+    if rendering and (args.out_readable is None or args.out_simplified is None):
+        ap.error("--out-readable and --out-simplified must be given together")
+    call_filter = CallFilter(list(itertools.chain.from_iterable(args.where))) if args.where else None
+    where_text = call_filter.describe() if call_filter is not None else None
+    reports: list[CallReport] = []
+    if args.latency_report is not None:
+        reports.append(LatencyReport(args.latency_report))
+    if args.tool_report is not None:
+        reports.append(ToolTimingReport(args.tool_report))
+    if args.cache_report is not None:
+        reports.append(CacheReport(args.cache_report))
+    if args.size_report is not None:
+        reports.append(SizeReport(args.size_report))
+    if args.token_ledger is not None:
+        reports.append(TokenLedger(args.token_ledger))
+    if args.trace is not None:
+        reports.append(TraceExport(args.trace))
+    diff_report: DiffReport | None = None
+    if args.diff_report is not None:
+        if args.baseline_requests is None:
+            ap.error("--diff-report requires --baseline-requests")
+        diff_report = DiffReport(
+            args.diff_report,
+            args.baseline_requests,
+            args.baseline_events,
+            args.join,
+            args.diff_threshold,
+            call_filter,
+        )
+        reports.append(diff_report)
+    elif args.baseline_requests is not None or args.baseline_events is not None or args.diff_threshold:
+        ap.error("--baseline-requests/--baseline-events/--diff-threshold require --diff-report")
+    if args.sqlite is not None:
+        if rendering or reports or args.call is not None or call_filter is not None or args.follow or args.join != "position":
+            ap.error(
+                "--sqlite loads every call, paired by position: it cannot be combined with rendering, reports, "
+                "--call(s), --where, --follow or --join conversation"
+            )
+        export = SqliteExport(args.sqlite)
+        try:
+            stats = export.load(args.requests, args.events)
+        finally:
+            export.close()
+        reloaded = " (captures changed: reloaded from scratch)" if stats["reset"] else ""
+        print(f"loaded {stats['requests']} requests and {stats['segments']} event segments into {args.sqlite}{reloaded}")
+        return 0
+    if not rendering and not args.build_index and not reports:
+        ap.error("--out-readable/--out-simplified are required unless --build-index or a report is given")
+    if args.jobs < 1:
+        ap.error("--jobs must be >= 1")
+    if args.follow and (not rendering or args.call is not None or args.jobs > 1 or reports):
+        ap.error("--follow requires --out-readable/--out-simplified and cannot be combined with --call(s), --jobs or reports")
+    if args.page_size is not None:
+        if args.page_size < 1:
+            ap.error("--page-size must be >= 1")
+        if not rendering or args.jobs > 1 or args.follow or args.join == "conversation":
+            ap.error(
+                "--page-size requires --out-readable/--out-simplified and cannot be combined with --jobs, "
+                "--follow or --join conversation"
+            )
+    if args.join == "conversation" and (args.call is not None or args.jobs > 1 or args.follow):
+        ap.error("--join conversation cannot be combined with --call(s), --jobs or --follow")
+
+    if args.follow:
+        follow_capture(
+            args.requests,
+            args.events,
+            args.out_readable,
+            args.out_simplified,
+            args.follow_interval,
+            InputPrefixTracker() if args.delta_inputs else None,
+            call_filter,
+        )
+        return 0
+
+    index: dict[str, Any] | None = None
+    if args.build_index or args.call is not None or args.jobs > 1:
+        index_path = args.index or default_index_path(args.requests)
+        index = update_capture_index(index_path, args.requests, args.events)
+    if not rendering and not reports:
+        return 0
+
+    calls: Iterable[CallRecord]
+    header: list[str] | Callable[[], list[str]]
+    join: ConversationJoin | None = None
+    if args.join == "conversation":
+        join = ConversationJoin()
+        req_lines = RowCounter(iter_capture_lines(args.requests))
+        event_lines = RowCounter(iter_capture_lines(args.events) if args.events else ())
+
+        def joined_header() -> list[str]:
+            # Written after the last call, once the single streaming pass has counted the rows.
+            return render_readable_header(
+                args.requests, req_lines.rows, args.events, event_lines.rows, where_text, per_conversation=True
+            )
+
+        header = joined_header
+        calls = iter_decoded_calls(join.iter_raw_calls(req_lines, event_lines), call_filter)
+    elif index is not None:
+        open_segment = read_open_segment(args.events, index["events"]["scanned"])
+        total_calls = max(
+            len(index["requests"]["entries"]),
+            len(index["events"]["entries"]) + (1 if open_segment else 0),
+        )
+        first, last = args.call or (1, total_calls)
+        last = min(last, total_calls)
+        header = render_readable_header(
+            args.requests,
+            index["requests"]["rows"],
+            args.events,
+            index["events"]["rows"] + len(open_segment),
+            where_text,
+        )
+        selected: Sequence[int] = range(first, last + 1)
+        if call_filter is not None:
+            selected = select_indexed_calls(call_filter, index, args.requests, args.events, selected, open_segment)
+        # Several shards per worker keeps the pool busy when call sizes are uneven.
+        shard_size = max(1, min(256, -(-len(selected) // (args.jobs * 4))))
+        shards = list(plan_shards(index, args.requests, args.events, selected, open_segment, shard_size))
+        if rendering and args.jobs > 1:
+            seeds: list[Any] = plan_delta_seeds(shards) if args.delta_inputs else [None] * len(shards)
+            with multiprocessing.Pool(args.jobs) as pool:
+                # imap preserves shard order, so the output matches the serial rendering byte for byte.
+                write_capture_markdown(
+                    args.out_readable,
+                    args.out_simplified,
+                    header,
+                    pool.imap(render_shard_star, zip(shards, seeds)),
+                )
+            rendering = False
+        # Once the pool has rendered everything, only reports still need the calls read back.
+        calls = ()
+        if rendering or reports:
+            calls = itertools.chain.from_iterable(iter_indexed_calls(*task) for task in shards)
+    else:
+        # Both captures are streamed: only the current call's request row and event segment are held
+        # in memory, and each call is written out as soon as its segment closes.
+        event_rows = RowCounter(iter_capture_lines(args.events) if args.events else ())
+        # With --where, segments are only split here; the survivors are reduced when rendered.
+        seg_iter = iter_event_segments(event_rows, reduce=rendering and call_filter is None)
+        if call_filter is not None:
+            req_rows = RowCounter(iter_capture_lines(args.requests))
+            calls = iter_filtered_calls(call_filter, req_rows, seg_iter)
+        else:
+            req_rows = RowCounter(iter_jsonl(args.requests))
+            calls = (
+                (i, req_row, seg) for i, (req_row, seg) in enumerate(itertools.zip_longest(req_rows, seg_iter), start=1)
+            )
+
+        def streamed_header() -> list[str]:
+            # Row counts are taken while streaming; write_capture_markdown asks for them at the end.
+            return render_readable_header(args.requests, req_rows.rows, args.events, event_rows.rows, where_text)
+
+        header = streamed_header
+
+    if reports:
+        calls = feed_reports(calls, reports)
+    if rendering and join is not None:
+        prefix_tracker = InputPrefixTracker() if args.delta_inputs else None
+        write_conversation_markdown(
+            args.out_readable,
+            args.out_simplified,
+            header,
+            join.conversations,
+            ((call[0], *next(render_calls([call], prefix_tracker))) for call in calls),
+        )
+    elif rendering and args.page_size is not None:
+        prefix_tracker = InputPrefixTracker() if args.delta_inputs else None
+        write_paged_markdown(args.out_readable, args.out_simplified, header, args.page_size, calls, prefix_tracker)
+    elif rendering:
+        prefix_tracker = InputPrefixTracker() if args.delta_inputs else None
+        write_capture_markdown(args.out_readable, args.out_simplified, header, render_calls(calls, prefix_tracker))
+    elif reports:
+        for _call in calls:
+            pass
+    for report in reports:
+        report.write()
+    if diff_report is not None and diff_report.exceeded:
+        print(f"performance diff thresholds exceeded: {', '.join(diff_report.exceeded)}", file=sys.stderr)
+        return 1
     return 0
 
 
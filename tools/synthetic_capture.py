@@ -0,0 +1,207 @@
+"""
+Deterministic synthetic Codex captures for the benchmark suite and the tests.
+
+Rows are shaped like the requests/events JSONL that client.rs writes. `tools/testdata/` was written
+with `CaptureSpec(calls=12, history=3, deltas=3, reasoning_deltas=2, tools=2, instructions_bytes=160,
+output_bytes=60, encrypted_reasoning_bytes=24, seed=1)`.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any
+
+DEFAULT_TOOL_MIX = "function_call=0.5,custom_tool_call=0.2,web_search_call=0.05,message=0.25"
+DELTA_TOKENS = ("the ", "tool ", "café ", '"quoted" ', "line\n", "é中文 ", "`code` ", "\\path ")
+
+
+@dataclass
+class CaptureSpec:
+    """Shape of a synthetic capture. Generation stops at `calls` calls or `events` event rows."""
+
+    calls: int | None = None
+    events: int | None = None
+    conversations: int = 2
+    history: int = 16
+    deltas: int = 200
+    reasoning_deltas: int = 20
+    tool_mix: str = DEFAULT_TOOL_MIX
+    tools: int = 8
+    instructions_bytes: int = 8000
+    output_bytes: int = 1000
+    encrypted_reasoning_bytes: int = 1000
+    seed: int = 0
+
+
+def parse_tool_mix(value: str) -> tuple[list[str], list[float]]:
+    kinds: list[str] = []
+    weights: list[float] = []
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("function_call", "custom_tool_call", "web_search_call", "message"):
+            raise ValueError(f"unknown tool-mix kind {kind!r}")
+        kinds.append(kind)
+        weights.append(float(weight or 1))
+    return kinds, weights
+
+
+def filler(rng: random.Random, size: int) -> str:
+    words = ("alpha", "beta", "gamma", "src/lib.rs", "fn main()", "# heading", "ok", "\t", "{}", "→")
+    parts: list[str] = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        parts.append(word)
+        length += len(word) + 1
+    return " ".join(parts)[:size]
+
+
+def write_row(f: IO[str], row: dict[str, Any]) -> None:
+    # serde_json output: compact, non-ASCII kept as UTF-8, keys in insertion order.
+    f.write(json.dumps(row, separators=(",", ":"), ensure_ascii=False))
+    f.write("\n")
+
+
+def user_message(text: str) -> dict[str, Any]:
+    return {"type": "message", "role": "user", "content": [{"type": "input_text", "text": text}]}
+
+
+def generate_capture(out_dir: Path, spec: CaptureSpec) -> tuple[Path, Path]:
+    """Write `requests.jsonl`/`events.jsonl` for `spec` into `out_dir`."""
+    if spec.calls is None and spec.events is None:
+        raise ValueError("CaptureSpec needs calls or events")
+    rng = random.Random(spec.seed)
+    kinds, weights = parse_tool_mix(spec.tool_mix)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    requests = out_dir / "requests.jsonl"
+    events = out_dir / "events.jsonl"
+    instructions = filler(rng, spec.instructions_bytes)
+    tools = [
+        {
+            "type": "function",
+            "name": f"tool_{t}",
+            "description": filler(rng, 200),
+            "strict": False,
+            "parameters": {
+                "type": "object",
+                "properties": {"command": {"type": "string", "description": filler(rng, 80)}},
+                "required": ["command"],
+                "additionalProperties": False,
+            },
+        }
+        for t in range(spec.tools)
+    ]
+    conversations = [f"0199{c:04x}-0000-7000-8000-{spec.seed:012x}" for c in range(spec.conversations)]
+    history: dict[str, list[dict[str, Any]]] = {c: [user_message(filler(rng, 120))] for c in conversations}
+    ts_ms = 1_760_000_000_000
+    rows = 0
+    with requests.open("w", encoding="utf-8") as req_f, events.open("w", encoding="utf-8") as ev_f:
+        for i in itertools.count():
+            if spec.calls is not None and i >= spec.calls:
+                break
+            if spec.events is not None and rows >= spec.events:
+                break
+            conv = conversations[i % len(conversations)]
+            ts_ms += rng.randint(50, 3000)
+            request = {
+                "model": "gpt-5.1-codex",
+                "instructions": instructions,
+                "input": history[conv][-spec.history :],
+                "tools": tools,
+                "tool_choice": "auto",
+                "parallel_tool_calls": False,
+                "reasoning": {"effort": "medium", "summary": "auto"},
+                "store": False,
+                "stream": True,
+                "include": ["reasoning.encrypted_content"],
+                "prompt_cache_key": conv,
+            }
+            write_row(req_f, {"ts_ms": ts_ms, "conversation_id": conv, "request": request})
+
+            def event(payload: Any) -> None:
+                nonlocal ts_ms, rows
+                ts_ms += rng.randint(1, 60)
+                write_row(ev_f, {"ts_ms": ts_ms, "conversation_id": conv, "event": payload})
+                rows += 1
+
+            ts_ms += rng.randint(200, 1500)
+            event("Created")
+            summary: list[str] = []
+            if spec.reasoning_deltas:
+                event({"ReasoningSummaryPartAdded": {"summary_index": 0}})
+                for _ in range(rng.randint(spec.reasoning_deltas // 2, spec.reasoning_deltas * 3 // 2)):
+                    delta = rng.choice(DELTA_TOKENS)
+                    summary.append(delta)
+                    event({"ReasoningSummaryDelta": {"delta": delta, "summary_index": 0}})
+                reasoning = {
+                    "type": "reasoning",
+                    "summary": [{"type": "summary_text", "text": "".join(summary)}],
+                    "encrypted_content": filler(rng, spec.encrypted_reasoning_bytes),
+                }
+                event({"OutputItemDone": reasoning})
+            kind = rng.choices(kinds, weights)[0]
+            added: list[dict[str, Any]] = []
+            if kind == "message":
+                text: list[str] = []
+                for _ in range(rng.randint(spec.deltas // 2, spec.deltas * 3 // 2)):
+                    delta = rng.choice(DELTA_TOKENS)
+                    text.append(delta)
+                    event({"OutputTextDelta": delta})
+                item: dict[str, Any] = {
+                    "type": "message",
+                    "role": "assistant",
+                    "content": [{"type": "output_text", "text": "".join(text)}],
+                }
+                event({"OutputItemDone": item})
+                added = [item, user_message(filler(rng, 120))]
+            elif kind == "web_search_call":
+                item = {"type": "web_search_call", "status": "completed", "action": {"type": "search", "query": filler(rng, 40)}}
+                event({"OutputItemAdded": item})
+                event({"OutputItemDone": item})
+                added = [item]
+            else:
+                call_id = f"call_{i:08d}"
+                if kind == "function_call":
+                    item = {
+                        "type": "function_call",
+                        "name": rng.choice(tools)["name"],
+                        "arguments": json.dumps({"command": filler(rng, 60)}),
+                        "call_id": call_id,
+                    }
+                    output = {"type": "function_call_output", "call_id": call_id, "output": filler(rng, spec.output_bytes)}
+                else:
+                    item = {
+                        "type": "custom_tool_call",
+                        "status": "completed",
+                        "call_id": call_id,
+                        "name": "apply_patch",
+                        "input": f"*** Begin Patch\n{filler(rng, 300)}\n*** End Patch",
+                    }
+                    output = {"type": "custom_tool_call_output", "call_id": call_id, "output": filler(rng, spec.output_bytes)}
+                event({"OutputItemAdded": item})
+                event({"OutputItemDone": item})
+                added = [item, output]
+            if spec.reasoning_deltas:
+                added.insert(0, reasoning)
+            input_tokens = sum(len(json.dumps(x)) for x in request["input"]) // 4 + spec.instructions_bytes // 4
+            event(
+                {
+                    "Completed": {
+                        "response_id": f"resp_{i:08d}",
+                        "token_usage": {
+                            "input_tokens": input_tokens,
+                            "cached_input_tokens": input_tokens * 9 // 10,
+                            "output_tokens": spec.deltas + spec.reasoning_deltas,
+                            "reasoning_output_tokens": spec.reasoning_deltas,
+                            "total_tokens": input_tokens + spec.deltas + spec.reasoning_deltas,
+                        },
+                        "can_append": False,
+                    }
+                }
+            )
+            history[conv] = history[conv] + added
+    return requests, events
@@ -0,0 +1,95 @@
+"""Tests for the synthetic capture generator and the benchmark suite built on it."""
+
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import bench_format_codex_capture as bench
+from synthetic_capture import CaptureSpec, generate_capture, parse_tool_mix
+
+TOOLS_DIR = Path(__file__).resolve().parent
+# Commit whose formatter rendered testdata/baseline/ (see conftest.py).
+BASELINE_REVISION = "8e76677"
+TESTDATA_SPEC = CaptureSpec(
+    calls=12,
+    history=3,
+    deltas=3,
+    reasoning_deltas=2,
+    tools=2,
+    instructions_bytes=160,
+    output_bytes=60,
+    encrypted_reasoning_bytes=24,
+    seed=1,
+)
+
+
+def jsonl(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_generator_reproduces_the_test_capture(tmp_path: Path) -> None:
+    requests, events = generate_capture(tmp_path, TESTDATA_SPEC)
+    assert requests.read_bytes() == (TOOLS_DIR / "testdata" / "requests.jsonl").read_bytes()
+    assert events.read_bytes() == (TOOLS_DIR / "testdata" / "events.jsonl").read_bytes()
+
+
+def test_generator_shapes(tmp_path: Path) -> None:
+    spec = CaptureSpec(events=400, conversations=3, history=4, deltas=10, tool_mix="message=1,function_call=1", seed=7)
+    requests, events = generate_capture(tmp_path, spec)
+    request_rows, event_rows = jsonl(requests), jsonl(events)
+    # Generation stops at the first call boundary past the event target.
+    assert 400 <= len(event_rows) < 400 + 60
+    completed = [r for r in event_rows if isinstance(r["event"], dict) and "Completed" in r["event"]]
+    assert len(completed) == len(request_rows)
+    assert {r["conversation_id"] for r in request_rows} == {r["conversation_id"] for r in event_rows}
+    assert len({r["conversation_id"] for r in request_rows}) == 3
+    assert max(len(r["request"]["input"]) for r in request_rows) == 4
+    kinds = {
+        r["event"]["OutputItemDone"]["type"]
+        for r in event_rows
+        if isinstance(r["event"], dict) and "OutputItemDone" in r["event"]
+    }
+    assert kinds == {"reasoning", "message", "function_call"}
+    assert [r["ts_ms"] for r in event_rows] == sorted(r["ts_ms"] for r in event_rows)
+    assert generate_capture(tmp_path / "again", spec)[1].read_bytes() == events.read_bytes()
+
+
+def test_tool_mix_is_validated() -> None:
+    assert parse_tool_mix("message=3,web_search_call") == (["message", "web_search_call"], [3.0, 1.0])
+    with pytest.raises(ValueError):
+        parse_tool_mix("shell=1")
+
+
+def test_bench_runs_every_mode(tmp_path: Path) -> None:
+    results = tmp_path / "bench.json"
+    subprocess.run(
+        [sys.executable, bench.__file__, "--scales", "300", "--repeat", "1", "--jobs", "2", "--json", str(results)],
+        check=True,
+        capture_output=True,
+    )
+    doc = json.loads(results.read_text(encoding="utf-8"))
+    assert [r["mode"] for r in doc["results"]] == list(bench.MODES)
+    for result in doc["results"]:
+        assert "error" not in result, result
+        assert result["events"] >= 300 and result["seconds"] > 0
+
+
+def test_bench_reports_modes_a_baseline_lacks(tmp_path: Path) -> None:
+    # The formatter the test capture's baseline Markdown came from has no --compact: that is
+    # reported, not fatal, and its render output must still match.
+    results = tmp_path / "bench.json"
+    args = ["--scales", "200", "--repeat", "1", "--modes", "render,compact", "--baseline", BASELINE_REVISION]
+    subprocess.run([sys.executable, bench.__file__, *args, "--json", str(results)], check=True, capture_output=True)
+    doc = json.loads(results.read_text(encoding="utf-8"))
+    errors = {(r["formatter"], r["mode"]): r.get("error") for r in doc["results"]}
+    assert errors == {
+        ("current", "render"): None,
+        ("baseline", "render"): None,
+        ("current", "compact"): None,
+        ("baseline", "compact"): "unsupported",
+    }
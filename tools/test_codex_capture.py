@@ -0,0 +1,136 @@
+"""Tests for the codex_capture reader module, run against the capture in `testdata/`."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+import codex_capture as cc
+
+TESTDATA_DIR = Path(__file__).resolve().parent / "testdata"
+REQUESTS = TESTDATA_DIR / "requests.jsonl"
+EVENTS = TESTDATA_DIR / "events.jsonl"
+
+
+def row(ts_ms: int, conversation_id: str, event: object) -> bytes:
+    return json.dumps({"ts_ms": ts_ms, "conversation_id": conversation_id, "event": event}).encode()
+
+
+def completed(**payload: object) -> dict[str, object]:
+    return {"Completed": {"response_id": "resp", **payload}}
+
+
+# --- Records -------------------------------------------------------------------------------------
+
+
+def test_request_row_reads_header_and_model_without_decoding() -> None:
+    line = next(cc.iter_capture_lines(REQUESTS))
+    req = cc.RequestRow(line)
+    decoded = json.loads(line)
+    assert (req.ts_ms, req.conversation_id) == (decoded["ts_ms"], decoded["conversation_id"])
+    assert req.model == decoded["request"]["model"]
+    assert req._row is None
+    assert req.instructions == decoded["request"]["instructions"]
+    assert req.input == decoded["request"]["input"]
+    assert req.row is req.row
+
+
+def test_event_row_names_the_variant_and_decodes_payload_lazily() -> None:
+    unit = cc.EventRow(row(1, "c", "Created"))
+    assert (unit.name, unit.payload) == ("Created", None)
+    delta = cc.EventRow(row(2, "c", {"OutputTextDelta": "hi"}))
+    assert delta.name == "OutputTextDelta"
+    assert delta._payload is cc._UNDECODED
+    assert delta.payload == "hi"
+
+
+def test_call_segment_reads_usage_text_and_items() -> None:
+    lines = [
+        row(10, "c", "Created"),
+        row(11, "c", {"OutputTextDelta": "hel"}),
+        row(12, "c", {"OutputTextDelta": "lo"}),
+        row(13, "c", {"OutputItemDone": {"type": "message", "role": "assistant", "content": []}}),
+        row(14, "c", completed(usage={
+            "input_tokens": 100,
+            "input_tokens_details": {"cached_tokens": 60},
+            "output_tokens": 20,
+            "output_tokens_details": {"reasoning_tokens": 5},
+            "total_tokens": 120,
+        })),
+    ]
+    call = cc.CallSegment(1, None, [cc.EventRow(line) for line in lines])
+    assert (call.conversation_id, call.start_ts_ms, call.end_ts_ms) == ("c", 10, 14)
+    assert call.output_text() == "hello"
+    assert [item["type"] for item in call.output_items()] == ["message"]
+    assert call.token_usage == {
+        "input_tokens": 100,
+        "cached_input_tokens": 60,
+        "output_tokens": 20,
+        "reasoning_output_tokens": 5,
+        "total_tokens": 120,
+    }
+
+
+def test_call_segment_without_completed_has_no_usage() -> None:
+    call = cc.CallSegment(1, None, [cc.EventRow(row(1, "c", {"OutputTextDelta": "cut"}))])
+    assert call.completed is None
+    assert call.token_usage is None
+    assert cc.CallSegment(2, None, None).end_ts_ms is None
+
+
+def test_normalize_token_usage_fills_every_token_key() -> None:
+    usage = cc.normalize_token_usage({"token_usage": {"input_tokens": 7, "total_tokens": 9}})
+    assert usage is not None and tuple(usage) == cc.TOKEN_KEYS
+    assert usage == {"input_tokens": 7, "cached_input_tokens": 0, "output_tokens": 0,
+                     "reasoning_output_tokens": 0, "total_tokens": 9}
+    assert cc.normalize_token_usage({"token_usage": None}) is None
+    assert cc.normalize_token_usage(None) is None
+
+
+# --- Segments and calls --------------------------------------------------------------------------
+
+
+def test_iter_segment_lines_closes_on_completed_and_keeps_the_tail() -> None:
+    lines = [row(1, "c", "Created"), row(2, "c", completed()), row(3, "c", "Created")]
+    assert list(cc.iter_segment_lines(lines)) == [lines[:2], lines[2:]]
+
+
+def test_iter_segment_lines_takes_a_custom_boundary() -> None:
+    seen: list[bytes] = []
+
+    def closes(line: bytes) -> bool:
+        seen.append(line)
+        return line == b"|"
+
+    lines = [b"a", b"|", b"b", b"c", b"|"]
+    assert list(cc.iter_segment_lines(lines, closes)) == [[b"a", b"|"], [b"b", b"c", b"|"]]
+    assert seen == lines
+
+
+def test_iter_event_segments_reduces_while_splitting() -> None:
+    lines = list(cc.iter_capture_lines(EVENTS))
+    reduced = [seg.summary() for seg in cc.iter_event_segments(lines)]
+    decoded = [seg.summary() for seg in cc.iter_event_segments(lines, reduce=False)]
+    assert reduced == decoded
+    assert len(reduced) == sum(1 for line in lines if cc.is_completed_line(line))
+
+
+def test_iter_calls_pairs_by_position_and_by_conversation() -> None:
+    by_position = list(cc.iter_calls(REQUESTS, EVENTS))
+    by_conversation = sorted(cc.iter_calls(REQUESTS, EVENTS, join="conversation"), key=lambda c: c.index)
+    assert len(by_position) == len(by_conversation) == 12
+    for call in by_conversation:
+        assert call.request is not None and call.events
+        assert {event.conversation_id for event in call.events} == {call.request.conversation_id}
+        assert call.request.ts_ms <= call.events[0].ts_ms
+    assert all(call.token_usage is not None for call in by_position)
+
+
+def test_iter_calls_reads_missing_files_as_empty(tmp_path: Path) -> None:
+    calls = list(cc.iter_calls(REQUESTS, None))
+    assert len(calls) == 12 and all(call.events is None for call in calls)
+    assert list(cc.iter_calls(tmp_path / "missing.jsonl", None)) == []
+    with pytest.raises(ValueError, match="unknown join"):
+        list(cc.iter_calls(REQUESTS, EVENTS, join="nope"))
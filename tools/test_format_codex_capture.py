@@ -0,0 +1,1222 @@
+"""Behaviour tests for format_codex_capture.py, run against the capture in `testdata/`."""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+import re
+import shutil
+import signal
+import sqlite3
+import subprocess
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+import codex_capture as cc
+from synthetic_capture import CaptureSpec, generate_capture
+
+Render = Callable[..., tuple[str, str]]
+RunFormatter = Callable[..., subprocess.CompletedProcess[str]]
+SpawnFormatter = Callable[..., subprocess.Popen[str]]
+
+TESTDATA_DIR = Path(__file__).resolve().parent / "testdata"
+CAPTURE_CALLS = 12
+
+
+CAPTURE_ARGS = ("--requests", "requests.jsonl", "--events", "events.jsonl")
+OUT_ARGS = ("--out-readable", "r.md", "--out-simplified", "s.md")
+
+
+def rows(path: Path) -> int:
+    return sum(1 for line in path.read_bytes().splitlines() if line.strip())
+
+
+def baseline() -> tuple[str, str]:
+    """(readable, simplified) Markdown the baseline renderer produced for the test capture."""
+    return (
+        (TESTDATA_DIR / "baseline" / "readable.md").read_text(encoding="utf-8-sig"),
+        (TESTDATA_DIR / "baseline" / "simplified.md").read_text(encoding="utf-8-sig"),
+    )
+
+
+def call_sections(markdown: str, level: str = "###") -> dict[int, str]:
+    """`GPT Call #n` sections of a rendered document, keyed by call index."""
+    pattern = rf"^{level} GPT Call #(\d+)\n.*?(?=^{level} GPT Call #|^## |\Z)"
+    return {int(m.group(1)): m.group(0) for m in re.finditer(pattern, markdown, re.M | re.S)}
+
+
+# --- Streaming rendering -------------------------------------------------------------------------
+
+
+def test_render_matches_baseline_byte_for_byte(capture: Path, render: Render) -> None:
+    render("out", "--requests", "requests.jsonl", "--events", "events.jsonl")
+    assert (capture / "out.r.md").read_bytes() == (TESTDATA_DIR / "baseline" / "readable.md").read_bytes()
+    assert (capture / "out.s.md").read_bytes() == (TESTDATA_DIR / "baseline" / "simplified.md").read_bytes()
+
+
+def test_header_counts_rows_read_while_streaming(capture: Path, render: Render) -> None:
+    # Blank lines are not rows; the counts come from the single streaming pass.
+    (capture / "requests.jsonl").write_bytes((capture / "requests.jsonl").read_bytes().replace(b"\n", b"\n\n", 3))
+    readable, _simplified = render("out", "--requests", "requests.jsonl", "--events", "events.jsonl")
+    assert f"- requests: `requests.jsonl` ({CAPTURE_CALLS} lines," in readable
+    assert f"- events: `events.jsonl` ({rows(capture / 'events.jsonl')} lines," in readable
+    assert readable.index("## Files") < readable.index("### GPT Call #1\n")
+
+
+def test_requests_without_events(render: Render) -> None:
+    readable, simplified = render("out", "--requests", "requests.jsonl")
+    assert readable.count("_No streaming response segment captured for this call index._") == CAPTURE_CALLS
+    assert "- events:" not in readable
+    assert simplified.count("## GPT Call #") == CAPTURE_CALLS
+
+
+def test_more_segments_than_requests(capture: Path, render: Render) -> None:
+    lines = (capture / "requests.jsonl").read_text(encoding="utf-8").splitlines(keepends=True)
+    (capture / "requests.jsonl").write_text("".join(lines[:-2]), encoding="utf-8")
+    readable, simplified = render("out", "--requests", "requests.jsonl", "--events", "events.jsonl")
+    assert readable.count("_No request captured for this call index._") == 2
+    assert f"### GPT Call #{CAPTURE_CALLS}\n" in readable
+    assert f"## GPT Call #{CAPTURE_CALLS - 2}\n" in simplified
+    assert f"## GPT Call #{CAPTURE_CALLS - 1}\n" not in simplified
+
+
+def test_empty_and_missing_captures(capture: Path, render: Render) -> None:
+    (capture / "empty.jsonl").write_text("", encoding="utf-8")
+    readable, simplified = render("out", "--requests", "empty.jsonl", "--events", "missing.jsonl")
+    assert "- requests: `empty.jsonl` (0 lines, 0 bytes)" in readable
+    assert "- events: `missing.jsonl` (0 lines, 0 bytes)" in readable
+    assert "_No requests or events captured._" in readable
+    assert "_No requests captured._" in simplified
+
+
+def test_trailing_segment_without_completed_is_rendered(capture: Path, render: Render) -> None:
+    with (capture / "events.jsonl").open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts_ms": 1, "conversation_id": None, "event": "Created"}) + "\n")
+    readable, _simplified = render("out", "--requests", "requests.jsonl", "--events", "events.jsonl")
+    last = readable[readable.index(f"### GPT Call #{CAPTURE_CALLS + 1}\n") :]
+    assert "_No request captured for this call index._" in last
+    assert "- events: `1`" in last
+
+
+# --- Index sidecar and --call/--calls ------------------------------------------------------------
+
+
+def test_build_index_records_every_call(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--build-index")
+    index = json.loads((capture / "requests.jsonl.idx.json").read_text(encoding="utf-8"))
+    assert len(index["requests"]["entries"]) == CAPTURE_CALLS
+    assert len(index["events"]["entries"]) == CAPTURE_CALLS
+    assert index["events"]["rows"] == rows(capture / "events.jsonl")
+    data = (capture / "requests.jsonl").read_bytes()
+    offset, length, ts_ms, conversation_id = index["requests"]["entries"][4]
+    row = json.loads(data[offset : offset + length])
+    assert (row["ts_ms"], row["conversation_id"]) == (ts_ms, conversation_id)
+
+
+def test_calls_range_matches_baseline(render: Render) -> None:
+    assert render("all", *CAPTURE_ARGS, "--calls", f"1-{CAPTURE_CALLS}") == baseline()
+
+
+def test_single_call_matches_baseline_section(render: Render) -> None:
+    readable, simplified = render("one", *CAPTURE_ARGS, "--call", "5")
+    base_readable, base_simplified = baseline()
+    assert call_sections(readable) == {5: call_sections(base_readable)[5]}
+    assert call_sections(simplified, "##") == {5: call_sections(base_simplified, "##")[5]}
+    # The header still describes the whole capture.
+    assert readable.split("### GPT Call")[0] == base_readable.split("### GPT Call")[0]
+
+
+def test_call_range_is_clamped_to_the_capture(render: Render) -> None:
+    readable, _simplified = render("tail", *CAPTURE_ARGS, "--calls", f"{CAPTURE_CALLS - 1}-{CAPTURE_CALLS + 50}")
+    assert sorted(call_sections(readable)) == [CAPTURE_CALLS - 1, CAPTURE_CALLS]
+
+
+def test_index_is_extended_when_captures_grow(capture: Path, run_formatter: RunFormatter, render: Render) -> None:
+    requests = (capture / "requests.jsonl").read_bytes().splitlines(keepends=True)
+    events = (capture / "events.jsonl").read_bytes().splitlines(keepends=True)
+    completed = [i for i, line in enumerate(events) if b'"Completed"' in line]
+    (capture / "requests.jsonl").write_bytes(b"".join(requests[:8]))
+    (capture / "events.jsonl").write_bytes(b"".join(events[: completed[7] + 1]))
+    run_formatter(*CAPTURE_ARGS, "--build-index")
+    first = json.loads((capture / "requests.jsonl.idx.json").read_text(encoding="utf-8"))
+    assert len(first["requests"]["entries"]) == 8
+
+    (capture / "requests.jsonl").write_bytes(b"".join(requests))
+    (capture / "events.jsonl").write_bytes(b"".join(events))
+    readable, _simplified = render("grown", *CAPTURE_ARGS, "--call", str(CAPTURE_CALLS))
+    index = json.loads((capture / "requests.jsonl.idx.json").read_text(encoding="utf-8"))
+    assert index["requests"]["entries"][:8] == first["requests"]["entries"]
+    assert len(index["requests"]["entries"]) == CAPTURE_CALLS
+    assert call_sections(readable) == {CAPTURE_CALLS: call_sections(baseline()[0])[CAPTURE_CALLS]}
+
+
+def test_index_is_rebuilt_when_capture_is_replaced(capture: Path, run_formatter: RunFormatter, render: Render) -> None:
+    run_formatter(*CAPTURE_ARGS, "--build-index")
+    requests = (capture / "requests.jsonl").read_bytes().splitlines(keepends=True)
+    (capture / "requests.jsonl").write_bytes(b"".join(reversed(requests)))
+    readable, _simplified = render("replaced", *CAPTURE_ARGS, "--call", "1")
+    index = json.loads((capture / "requests.jsonl.idx.json").read_text(encoding="utf-8"))
+    assert index["requests"]["entries"][0][:3] == [0, len(requests[-1]), json.loads(requests[-1])["ts_ms"]]
+    conversation_id = json.loads(requests[-1])["conversation_id"]
+    assert f"- conversation_id: `{conversation_id}`" in call_sections(readable)[1]
+
+
+def test_call_range_and_outputs_are_validated(run_formatter: RunFormatter) -> None:
+    for args in (("--call", "0"), ("--calls", "5-3"), ("--call", "x")):
+        result = run_formatter(*CAPTURE_ARGS, *args, *OUT_ARGS, check=False)
+        assert result.returncode == 2
+        assert "invalid call range" in result.stderr or "expected N or A-B" in result.stderr
+    result = run_formatter(*CAPTURE_ARGS, "--out-readable", "r.md", check=False)
+    assert result.returncode == 2 and "must be given together" in result.stderr
+
+
+# --- Parallel rendering (--jobs) ----------------------------------------------------------------
+
+
+def test_jobs_output_is_identical_to_serial(capture: Path, render: Render) -> None:
+    render("jobs", *CAPTURE_ARGS, "--jobs", "3")
+    assert (capture / "jobs.r.md").read_bytes() == (TESTDATA_DIR / "baseline" / "readable.md").read_bytes()
+    assert (capture / "jobs.s.md").read_bytes() == (TESTDATA_DIR / "baseline" / "simplified.md").read_bytes()
+    assert (capture / "requests.jsonl.idx.json").exists()
+
+
+def test_jobs_with_call_range(render: Render) -> None:
+    serial = render("serial", *CAPTURE_ARGS, "--calls", "3-9")
+    assert render("jobs", *CAPTURE_ARGS, "--jobs", "2", "--calls", "3-9") == serial
+
+
+def test_jobs_renders_trailing_open_segment(capture: Path, render: Render) -> None:
+    with (capture / "events.jsonl").open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts_ms": 1, "conversation_id": None, "event": "Created"}) + "\n")
+    assert render("jobs", *CAPTURE_ARGS, "--jobs", "2") == render("serial", *CAPTURE_ARGS)
+
+
+def test_jobs_on_empty_capture(capture: Path, render: Render) -> None:
+    (capture / "empty.jsonl").write_text("", encoding="utf-8")
+    readable, simplified = render("jobs", "--requests", "empty.jsonl", "--events", "empty.jsonl", "--jobs", "2")
+    assert "_No requests or events captured._" in readable
+    assert "_No requests captured._" in simplified
+
+
+def test_jobs_must_be_positive(run_formatter: RunFormatter) -> None:
+    result = run_formatter(*CAPTURE_ARGS, "--jobs", "0", *OUT_ARGS, check=False)
+    assert result.returncode == 2 and "--jobs must be >= 1" in result.stderr
+
+
+# --- Follow mode ---------------------------------------------------------------------------------
+
+
+FOLLOW_ARGS = ("--follow", "--follow-interval", "0.02", "--out-readable", "f.r.md", "--out-simplified", "f.s.md")
+
+
+def wait_for(path: Path, text: str, timeout: float = 20.0) -> str:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        content = path.read_text(encoding="utf-8-sig") if path.exists() else ""
+        if text in content:
+            return content
+        time.sleep(0.02)
+    raise AssertionError(f"{text!r} never appeared in {path.name}")
+
+
+def stop(proc: subprocess.Popen[str]) -> None:
+    proc.send_signal(signal.SIGINT)
+    assert proc.wait(timeout=20) == 0
+
+
+def test_follow_appends_calls_as_they_complete(capture: Path, spawn_formatter: SpawnFormatter) -> None:
+    requests = (capture / "requests.jsonl").read_bytes().splitlines(keepends=True)
+    events = (capture / "events.jsonl").read_bytes().splitlines(keepends=True)
+    completed = [i for i, line in enumerate(events) if b'"Completed"' in line]
+    (capture / "requests.jsonl").write_bytes(b"".join(requests[:2]))
+    # The second call's Completed row is only half written.
+    head = b"".join(events[: completed[1]]) + events[completed[1]][:20]
+    (capture / "events.jsonl").write_bytes(head)
+
+    proc = spawn_formatter(*CAPTURE_ARGS, *FOLLOW_ARGS)
+    readable = wait_for(capture / "f.r.md", "### GPT Call #1\n")
+    assert "- requests: `requests.jsonl` (followed while it is written)" in readable
+    time.sleep(0.2)
+    assert "### GPT Call #2" not in (capture / "f.r.md").read_text(encoding="utf-8-sig")
+
+    (capture / "requests.jsonl").write_bytes(b"".join(requests))
+    with (capture / "events.jsonl").open("ab") as f:
+        f.write(b"".join(events)[len(head) :])
+    wait_for(capture / "f.r.md", f"### GPT Call #{CAPTURE_CALLS}\n")
+    stop(proc)
+
+    readable = (capture / "f.r.md").read_text(encoding="utf-8-sig")
+    simplified = (capture / "f.s.md").read_text(encoding="utf-8-sig")
+    base_readable, base_simplified = baseline()
+    assert call_sections(readable) == call_sections(base_readable)
+    assert simplified == base_simplified
+
+
+def test_follow_without_events_renders_requests(capture: Path, spawn_formatter: SpawnFormatter) -> None:
+    proc = spawn_formatter("--requests", "requests.jsonl", *FOLLOW_ARGS)
+    readable = wait_for(capture / "f.r.md", f"### GPT Call #{CAPTURE_CALLS}\n")
+    stop(proc)
+    assert "- events:" not in readable
+    assert "## Notes" in (capture / "f.s.md").read_text(encoding="utf-8-sig")
+
+
+def test_follow_rejects_call_ranges_and_jobs(run_formatter: RunFormatter) -> None:
+    for args in (("--call", "1"), ("--jobs", "2")):
+        result = run_formatter(*CAPTURE_ARGS, "--follow", *args, *OUT_ARGS, check=False)
+        assert result.returncode == 2 and "--follow requires" in result.stderr
+
+
+# --- Reports -------------------------------------------------------------------------------------
+
+
+Call = tuple[dict[str, Any], list[dict[str, Any]]]
+
+
+def capture_calls(capture: Path) -> list[Call]:
+    """(request row, event rows) per call, paired by position like the formatter."""
+    requests = [json.loads(line) for line in (capture / "requests.jsonl").read_text(encoding="utf-8").splitlines()]
+    segments: list[list[dict[str, Any]]] = [[]]
+    for line in (capture / "events.jsonl").read_text(encoding="utf-8").splitlines():
+        row = json.loads(line)
+        segments[-1].append(row)
+        if isinstance(row["event"], dict) and "Completed" in row["event"]:
+            segments.append([])
+    return list(zip(requests, segments))
+
+
+def event_name(row: dict[str, Any]) -> str:
+    return row["event"] if isinstance(row["event"], str) else next(iter(row["event"]))
+
+
+def write_capture(capture: Path, calls: list[Call]) -> tuple[str, ...]:
+    """Write a hand-built capture next to the test data and return the arguments that select it."""
+    requests = "".join(json.dumps(req) + "\n" for req, _ in calls)
+    events = "".join(json.dumps(r) + "\n" for _, seg in calls for r in seg)
+    (capture / "t.requests.jsonl").write_text(requests, encoding="utf-8")
+    (capture / "t.events.jsonl").write_text(events, encoding="utf-8")
+    return ("--requests", "t.requests.jsonl", "--events", "t.events.jsonl")
+
+
+def load_report(capture: Path, name: str) -> tuple[dict[str, Any], str]:
+    return (
+        json.loads((capture / f"{name}.json").read_text(encoding="utf-8")),
+        (capture / f"{name}.md").read_text(encoding="utf-8"),
+    )
+
+
+def test_latency_report(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--latency-report", "lat")
+    report, md = load_report(capture, "lat")
+    assert len(report["calls"]) == CAPTURE_CALLS
+    for call, (req_row, seg) in zip(report["calls"], capture_calls(capture)):
+        deltas = [r["ts_ms"] for r in seg if event_name(r) == "OutputTextDelta"]
+        completed = next(r for r in seg if event_name(r) == "Completed")
+        streaming_ms = seg[-1]["ts_ms"] - seg[0]["ts_ms"]
+        output_tokens = completed["event"]["Completed"]["token_usage"]["output_tokens"]
+        assert call["request_to_first_event_ms"] == seg[0]["ts_ms"] - req_row["ts_ms"]
+        assert call["request_to_completed_ms"] == completed["ts_ms"] - req_row["ts_ms"]
+        assert call["request_to_first_delta_ms"] == (deltas[0] - req_row["ts_ms"] if deltas else None)
+        assert call["deltas"] == len(deltas)
+        assert call["delta_gap_ms"]["max"] == (max(b - a for a, b in zip(deltas, deltas[1:])) if len(deltas) > 1 else None)
+        assert call["streaming_ms"] == streaming_ms
+        assert call["output_tokens_per_sec"] == round(output_tokens * 1000.0 / streaming_ms, 3)
+    first_event = sorted(c["request_to_first_event_ms"] for c in report["calls"])
+    assert report["aggregate"]["request_to_first_event_ms"]["max"] == first_event[-1]
+    assert report["aggregate"]["request_to_first_event_ms"]["p50"] == first_event[CAPTURE_CALLS // 2 - 1]
+    assert md.startswith("# Codex Capture Latency Report\n")
+    assert "| request -> first event (ms) | 12 |" in md
+
+
+def test_latency_report_reads_responses_api_usage(capture: Path, run_formatter: RunFormatter) -> None:
+    usage = {"input_tokens": 10, "output_tokens": 40, "output_tokens_details": {"reasoning_tokens": 4}, "total_tokens": 50}
+    rows = [
+        {"ts_ms": 1_000, "conversation_id": "c", "event": "Created"},
+        {"ts_ms": 1_500, "conversation_id": "c", "event": {"OutputTextDelta": {"delta": "hi"}}},
+        {"ts_ms": 3_000, "conversation_id": "c", "event": {"Completed": {"response_id": "r", "usage": usage}}},
+    ]
+    (capture / "usage.jsonl").write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    run_formatter("--requests", "missing.jsonl", "--events", "usage.jsonl", "--latency-report", "lat")
+    (call,) = load_report(capture, "lat")[0]["calls"]
+    assert (call["output_tokens"], call["output_tokens_per_sec"], call["request_to_first_event_ms"]) == (40, 20.0, None)
+
+
+def test_tool_report(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--tool-report", "tools")
+    report, md = load_report(capture, "tools")
+    calls = capture_calls(capture)
+    expected: dict[str, list[int]] = {}
+    for i, (_req_row, seg) in enumerate(calls):
+        for row in seg:
+            item = row["event"].get("OutputItemDone") if isinstance(row["event"], dict) else None
+            if not item or item["type"] not in ("function_call", "custom_tool_call"):
+                continue
+            sent = next(
+                req_row["ts_ms"]
+                for req_row, _seg in calls[i + 1 :]
+                if any(x.get("call_id") == item["call_id"] for x in req_row["request"]["input"])
+            )
+            expected.setdefault(item["name"], []).append(sent - row["ts_ms"])
+    assert {tool: (t["count"], t["total_ms"], t["max"]) for tool, t in report["tools"].items()} == {
+        tool: (len(d), sum(d), max(d)) for tool, d in expected.items()
+    }
+    assert sum(t["calls"] for t in report["turns"]) == CAPTURE_CALLS
+    for turn in report["turns"]:
+        assert turn["model_ms"] + turn["tool_ms"] + turn["client_overhead_ms"] == turn["wall_ms"]
+    assert report["totals"]["wall_ms"] == sum(t["wall_ms"] for t in report["turns"])
+    assert md.startswith("# Codex Capture Tool Timing Report\n")
+
+
+def test_tool_report_splits_a_turn(capture: Path, run_formatter: RunFormatter) -> None:
+    def call(ts: int, conv: str, outputs: list[str], events: list[tuple[int, Any]]) -> Call:
+        inputs = [{"type": "function_call_output", "call_id": c, "output": "ok"} for c in outputs]
+        req = {"ts_ms": ts, "conversation_id": conv, "request": {"model": "m", "input": inputs}}
+        return req, [{"ts_ms": t, "conversation_id": conv, "event": e} for t, e in events]
+
+    def tool_call(call_id: str) -> dict[str, Any]:
+        return {"OutputItemDone": {"type": "function_call", "call_id": call_id, "name": "shell", "arguments": "{}"}}
+
+    completed = {"Completed": {"response_id": "r", "token_usage": None}}
+    calls = [
+        # Turn 1: 100 ms overhead, model until the tool call at 1300, tool until the next request at 2000.
+        call(1_000, "a", [], [(1_100, "Created"), (1_300, tool_call("t1")), (1_400, completed)]),
+        call(2_000, "a", ["t1"], [(2_050, "Created"), (2_500, completed)]),
+        # Turn 2: the tool output never comes back, so the stream tail is client overhead.
+        call(3_000, "a", [], [(3_200, "Created"), (3_300, tool_call("t2")), (3_600, completed)]),
+    ]
+    run_formatter(*write_capture(capture, calls), "--tool-report", "tools")
+    report = load_report(capture, "tools")[0]
+    split = [(t["wall_ms"], t["model_ms"], t["tool_ms"], t["client_overhead_ms"]) for t in report["turns"]]
+    assert split == [(1_500, 200 + 450, 700, 100 + 50), (600, 100, 0, 200 + 300)]
+    assert report["tools"]["shell"]["count"] == 1 and report["tools"]["shell"]["unmatched"] == 1
+
+
+def test_cache_report(capture: Path, run_formatter: RunFormatter) -> None:
+    def size(value: Any) -> int:
+        return len(json.dumps(value, sort_keys=True, separators=(",", ":")))
+
+    def call(ts: int, key: str, items: list[str], input_tokens: int, cached_tokens: int) -> Call:
+        request = {"model": "m", "instructions": "be brief", "prompt_cache_key": key, "input": items}
+        usage = {"input_tokens": input_tokens, "cached_input_tokens": cached_tokens, "output_tokens": 1}
+        completed = {"ts_ms": ts + 1, "conversation_id": "c", "event": {"Completed": {"token_usage": usage}}}
+        return {"ts_ms": ts, "conversation_id": "c", "request": request}, [completed]
+
+    first, second = "a" * 3_000, "b" * 1_000
+    calls = [
+        call(1_000, "k", [first], 4_000, 0),
+        # Shares tools, instructions and the first item with call 1, yet nothing was served from cache.
+        call(2_000, "k", [first, second], 8_000, 0),
+        call(3_000, "k", [first, second], 8_000, 7_900),
+        # A new prompt_cache_key starts from scratch.
+        call(4_000, "other", [first, second], 8_000, 0),
+    ]
+    run_formatter(*write_capture(capture, calls), "--cache-report", "cache")
+    report, md = load_report(capture, "cache")
+    total = size(None) + size("be brief") + size(first) + size(second)
+    shared = total - size(second)
+    got = [(c["prefix_items"], c["prefix_bytes"], c["expected_cached_tokens"], c["miss"]) for c in report["calls"]]
+    assert got == [
+        (0, 0, 0, False),
+        (1, shared, 8_000 * shared // total, True),
+        (2, total, 8_000, False),
+        (0, 0, 0, False),
+    ]
+    assert report["summary"]["misses"] == 1
+    assert report["summary"]["missed_tokens"] == 8_000 * shared // total
+    assert md.startswith("# Codex Capture Prompt Cache Report\n")
+
+
+def test_cache_report_on_capture(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--cache-report", "cache")
+    report = load_report(capture, "cache")[0]
+    previous: dict[str, list[Any]] = {}
+    for c, (req_row, seg) in zip(report["calls"], capture_calls(capture)):
+        items = req_row["request"]["input"]
+        before = previous.get(req_row["conversation_id"], [])
+        shared = 0
+        while shared < min(len(items), len(before)) and items[shared] == before[shared]:
+            shared += 1
+        previous[req_row["conversation_id"]] = items
+        usage = seg[-1]["event"]["Completed"]["token_usage"]
+        assert (c["input_items"], c["prefix_items"]) == (len(items), shared)
+        assert (c["input_tokens"], c["cached_tokens"]) == (usage["input_tokens"], usage["cached_input_tokens"])
+        # Every prompt in the test capture is below the 1024-token caching threshold.
+        assert c["expected_cached_tokens"] == 0 and not c["miss"]
+
+
+def test_size_report(capture: Path, run_formatter: RunFormatter) -> None:
+    big = "x" * 2_000
+    reasoning = {"type": "reasoning", "summary": [], "encrypted_content": "e" * 500}
+    inputs = [[message(big)], [message(big), reasoning], [message(big), reasoning, reasoning]]
+    calls = [
+        ({"ts_ms": 1_000 * i, "conversation_id": "c", "request": {"model": "m", "input": items}}, [])
+        for i, items in enumerate(inputs, start=1)
+    ]
+    run_formatter(*write_capture(capture, calls), "--size-report", "size")
+    report, md = load_report(capture, "size")
+    big_bytes = len(cc.canonical_json(message(big)))
+    encrypted_bytes = len(cc.canonical_json("e" * 500))
+    assert [c["parts"].get("input: message (user)") for c in report["calls"]] == [big_bytes] * 3
+    encrypted = [c["parts"].get("input: reasoning encrypted_content") for c in report["calls"]]
+    assert encrypted == [None, encrypted_bytes, 2 * encrypted_bytes]
+    reasoning_bytes = len(cc.canonical_json(reasoning)) - encrypted_bytes
+    assert report["calls"][2]["parts"]["input: reasoning"] == 2 * reasoning_bytes
+    # The repeated message is listed once, with every upload counted.
+    [item] = report["largest_items"]
+    assert (item["bytes"], item["part"], item["first_call"]) == (big_bytes, "input: message (user)", 1)
+    assert item["sends"] == 3
+    assert item["total_bytes"] == 3 * big_bytes
+    assert md.startswith("# Codex Capture Request Size Report\n")
+
+
+def test_size_report_on_capture(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--size-report", "size")
+    report = load_report(capture, "size")[0]
+    requests = [req_row["request"] for req_row, _seg in capture_calls(capture)]
+    assert [c["request_bytes"] for c in report["calls"]] == [len(cc.canonical_json(r)) for r in requests]
+    for c, request in zip(report["calls"], requests):
+        assert sum(c["parts"].values()) == c["request_bytes"]
+        assert c["parts"]["tools"] == sum(len(cc.canonical_json(tool)) for tool in request["tools"])
+        assert c["parts"]["instructions"] == len(cc.canonical_json(request["instructions"]))
+        assert c["input_items"] == len(request["input"])
+    assert sum(p["bytes"] for p in report["parts"]) == report["summary"]["request_bytes"]
+    assert {t["tool"]: t["requests"] for t in report["tools"]} == {
+        name: CAPTURE_CALLS for name in cc.summarize_tools(requests[0]["tools"])
+    }
+
+
+def test_token_ledger_on_capture(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--token-ledger", "ledger")
+    report, md = load_report(capture, "ledger")
+    running = 0
+    per_conversation: dict[str, int] = {}
+    for c, (req_row, seg) in zip(report["calls"], capture_calls(capture), strict=True):
+        usage = seg[-1]["event"]["Completed"]["token_usage"]
+        conv = req_row["conversation_id"]
+        running += usage["total_tokens"]
+        per_conversation[conv] = per_conversation.get(conv, 0) + usage["total_tokens"]
+        assert {key: c[key] for key in cc.TOKEN_KEYS} == usage
+        assert c["segment_ms"] == seg[-1]["ts_ms"] - seg[0]["ts_ms"]
+        assert (c["running_total_tokens"], c["conversation_running_total_tokens"]) == (running, per_conversation[conv])
+    assert {c["conversation_id"]: c["total_tokens"] for c in report["conversations"]} == per_conversation
+    assert report["summary"]["total_tokens"] == running
+    with (capture / "ledger.csv").open(encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(int(r["call"]), int(r["running_total_tokens"])) for r in rows] == [
+        (c["call"], c["running_total_tokens"]) for c in report["calls"]
+    ]
+    assert md.startswith("# Codex Capture Token Ledger\n")
+
+
+def test_token_ledger_without_usage(capture: Path, run_formatter: RunFormatter) -> None:
+    def completed(ts: int, usage: Any) -> dict[str, Any]:
+        return {"ts_ms": ts, "conversation_id": "c", "event": {"Completed": usage}}
+
+    api_usage = {
+        "input_tokens": 100,
+        "input_tokens_details": {"cached_tokens": 60},
+        "output_tokens": 20,
+        "total_tokens": 120,
+    }
+    calls = [
+        # Responses API `usage` is read as well; 20 output tokens over a 500 ms segment.
+        ({"ts_ms": 1_000, "conversation_id": "c", "request": {"model": "m"}}, [
+            {"ts_ms": 1_100, "conversation_id": "c", "event": "Created"},
+            completed(1_600, {"response_id": "r1", "usage": api_usage}),
+        ]),
+        # A Completed without usage.
+        ({"ts_ms": 2_000, "conversation_id": "c", "request": {"model": "m"}}, [
+            {"ts_ms": 2_100, "conversation_id": "c", "event": "Created"},
+            completed(2_300, {"response_id": "r2", "token_usage": None}),
+        ]),
+    ]
+    args = write_capture(capture, calls)
+    # Events with no request row left: the call takes its conversation from the event rows.
+    with (capture / "t.events.jsonl").open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts_ms": 3_000, "conversation_id": "d", "event": "Created"}) + "\n")
+        usage = {"token_usage": {"total_tokens": 7, "output_tokens": 2}}
+        f.write(json.dumps(completed(3_400, usage) | {"conversation_id": "d"}) + "\n")
+    run_formatter(*args, "--token-ledger", "ledger")
+    report = load_report(capture, "ledger")[0]
+    got = [
+        (c["conversation_id"], c["total_tokens"], c["cached_input_tokens"], c["output_tokens_per_sec"])
+        for c in report["calls"]
+    ]
+    assert got == [("c", 120, 60, 40.0), ("c", None, None, None), ("d", 7, 0, 5.0)]
+    assert [c["running_total_tokens"] for c in report["calls"]] == [120, 120, 127]
+    summary = report["summary"]
+    assert (summary["calls"], summary["calls_with_usage"], summary["conversations"]) == (3, 2, 2)
+    assert summary["cache_ratio"] == 0.6 and summary["output_tokens_per_sec"] == round(22 * 1000 / 900, 3)
+
+
+def test_diff_report_against_itself(capture: Path, run_formatter: RunFormatter) -> None:
+    baseline = ("--baseline-requests", "requests.jsonl", "--baseline-events", "events.jsonl")
+    run_formatter(*CAPTURE_ARGS, *baseline, "--diff-report", "diff", "--diff-threshold", "tool_ms=0%")
+    run_formatter(*CAPTURE_ARGS, "--tool-report", "t")
+    report, md = load_report(capture, "diff")
+    assert all(m["delta"] == 0 for m in report["metrics"]) and report["exceeded"] == []
+    aligned = [(c["baseline_call"], c["current_call"]) for c in report["calls"]]
+    assert aligned == [(i, i) for i in range(1, CAPTURE_CALLS + 1)]
+    # Tool time is measured the way the tool report measures it.
+    tool_ms = next(m for m in report["metrics"] if m["metric"] == "tool_ms")["current"]
+    assert tool_ms == sum(t["tool_ms"] for t in load_report(capture, "t")[0]["turns"])
+    assert md.startswith("# Codex Capture Performance Diff\n") and "- result: `ok`" in md
+
+
+def test_diff_report_gates(capture: Path, run_formatter: RunFormatter) -> None:
+    def call(ts: int, outputs: list[str], tool: str | None, done_at: int) -> Call:
+        items = [{"type": "function_call_output", "call_id": c, "output": ""} for c in outputs]
+        request = {"model": "m", "input": items}
+        seg = [{"ts_ms": ts + 100, "conversation_id": "c", "event": {"OutputTextDelta": "x"}}]
+        if tool is not None:
+            item = {"type": "function_call", "name": tool, "call_id": f"{tool}-{ts}", "arguments": "{}"}
+            seg.append({"ts_ms": done_at - 50, "conversation_id": "c", "event": {"OutputItemDone": item}})
+        completed = {"Completed": {"response_id": "r", "token_usage": None}}
+        seg.append({"ts_ms": done_at, "conversation_id": "c", "event": completed})
+        return {"ts_ms": ts, "conversation_id": "c", "request": request}, seg
+
+    baseline = [call(1_000, [], "shell", 1_500), call(2_000, ["shell-1000"], None, 2_400)]
+    # The current run reads a file first and its shell command runs 500 ms longer.
+    current = [
+        call(1_000, [], "read_file", 1_300),
+        call(1_600, ["read_file-1000"], "shell", 2_000),
+        call(3_450, ["shell-1600"], None, 3_800),
+    ]
+    write_capture(capture, baseline)
+    for name in ("requests", "events"):
+        (capture / f"t.{name}.jsonl").rename(capture / f"base.{name}.jsonl")
+    args = (*write_capture(capture, current), "--baseline-requests", "base.requests.jsonl")
+    args += ("--baseline-events", "base.events.jsonl", "--diff-report", "diff")
+    result = run_formatter(*args, "--diff-threshold", "tool_ms=50%", "--diff-threshold", "calls=1", check=False)
+    assert result.returncode == 1 and "thresholds exceeded: tool_ms +50%" in result.stderr
+    report = load_report(capture, "diff")[0]
+    metrics = {m["metric"]: (m["baseline"], m["current"]) for m in report["metrics"]}
+    # Tool time runs from the tool call's OutputItemDone to the request carrying its output.
+    assert metrics["tool_ms"] == (2_000 - 1_450, (1_600 - 1_250) + (3_450 - 1_950))
+    assert metrics["calls"] == (2, 3)
+    gates = [(g["threshold"], g["exceeded"]) for g in report["thresholds"]]
+    assert gates == [("tool_ms +50%", True), ("calls +1", False)]
+    aligned = [(c["baseline_call"], c["current_call"], c["current_tools"]) for c in report["calls"]]
+    assert aligned == [(None, 1, ["read_file"]), (1, 2, ["shell"]), (2, 3, [])]
+    assert run_formatter(*args, "--diff-threshold", "tool_ms=2000").returncode == 0
+
+
+def test_diff_report_rejects_bad_arguments(run_formatter: RunFormatter) -> None:
+    diff = ("--diff-report", "d", "--baseline-requests", "requests.jsonl")
+    for args, message in (
+        (("--diff-report", "diff"), "--diff-report requires --baseline-requests"),
+        (("--baseline-requests", "requests.jsonl", "--latency-report", "lat"), "require --diff-report"),
+        ((*diff, "--diff-threshold", "speed=1"), "METRIC=LIMIT"),
+        ((*diff, "--diff-threshold", "tool_ms=fast"), "10% or 500"),
+    ):
+        result = run_formatter(*CAPTURE_ARGS, *args, check=False)
+        assert result.returncode == 2 and message in result.stderr
+
+
+def test_reports_match_across_rendering_modes(capture: Path, run_formatter: RunFormatter) -> None:
+    reports = (
+        *("--latency-report", "{}", "--tool-report", "{}-tools"),
+        *("--cache-report", "{}-cache", "--size-report", "{}-size", "--token-ledger", "{}-ledger"),
+    )
+    run_formatter(*CAPTURE_ARGS, *(arg.format("serial") for arg in reports))
+    run_formatter(*CAPTURE_ARGS, *OUT_ARGS, "--jobs", "2", *(arg.format("jobs") for arg in reports))
+    for suffix in ("", "-tools", "-cache", "-size", "-ledger"):
+        assert load_report(capture, f"jobs{suffix}") == load_report(capture, f"serial{suffix}")
+    assert (capture / "jobs-ledger.csv").read_bytes() == (capture / "serial-ledger.csv").read_bytes()
+    assert (capture / "r.md").read_bytes() == (TESTDATA_DIR / "baseline" / "readable.md").read_bytes()
+    run_formatter(*CAPTURE_ARGS, "--calls", "4-6", "--latency-report", "slice")
+    assert [c["call"] for c in load_report(capture, "slice")[0]["calls"]] == [4, 5, 6]
+
+
+def test_follow_rejects_reports(run_formatter: RunFormatter) -> None:
+    result = run_formatter(*CAPTURE_ARGS, "--follow", *OUT_ARGS, "--latency-report", "lat", check=False)
+    assert result.returncode == 2 and "--follow requires" in result.stderr
+
+
+# --- Collapsed input history (--delta-inputs) ----------------------------------------------------
+
+
+def message(text: str) -> dict[str, Any]:
+    return {"type": "message", "role": "user", "content": [{"type": "input_text", "text": text}]}
+
+
+def test_delta_inputs_collapses_shared_history(capture: Path, render: Render) -> None:
+    def call(ts: int, conv: str, texts: list[str]) -> Call:
+        request = {"model": "m", "instructions": "be brief", "input": [message(t) for t in texts]}
+        completed = {"ts_ms": ts + 1, "conversation_id": conv, "event": {"Completed": {"response_id": "r"}}}
+        return {"ts_ms": ts, "conversation_id": conv, "request": request}, [completed]
+
+    calls = [
+        call(1_000, "a", ["alpha"]),
+        call(2_000, "b", ["other"]),
+        # The interleaved conversation does not reset a's history.
+        call(3_000, "a", ["alpha", "beta"]),
+        call(4_000, "a", ["alpha", "beta", "gamma"]),
+        # An edited history only collapses the part still shared.
+        call(5_000, "a", ["alpha", "BETA", "gamma"]),
+    ]
+    readable, simplified = render("delta", *write_capture(capture, calls), "--delta-inputs")
+    for sections in (call_sections(readable), call_sections(simplified, "##")):
+        assert "unchanged" not in sections[1] + sections[2]
+        assert "`<1 items unchanged>`" in sections[3] and "alpha" not in sections[3] and "beta" in sections[3]
+        assert "`<2 items unchanged>`" in sections[4] and "beta" not in sections[4] and "gamma" in sections[4]
+        assert "`<1 items unchanged>`" in sections[5] and "BETA" in sections[5]
+
+
+def test_delta_inputs_on_capture(capture: Path, render: Render) -> None:
+    readable, simplified = render("delta", *CAPTURE_ARGS, "--delta-inputs")
+    base_readable, _base_simplified = baseline()
+    sections, base_sections = call_sections(readable), call_sections(base_readable)
+    previous: dict[str, list[Any]] = {}
+    for (req_row, _seg), (i, section) in zip(capture_calls(capture), sorted(sections.items())):
+        items = req_row["request"]["input"]
+        before = previous.get(req_row["conversation_id"], [])
+        shared = 0
+        while shared < min(len(items), len(before)) and items[shared] == before[shared]:
+            shared += 1
+        previous[req_row["conversation_id"]] = items
+        if shared:
+            assert f"`<{shared} items unchanged>`" in section
+        else:
+            assert section == base_sections[i]
+    # Parallel shards are seeded with each conversation's earlier history, so they collapse the same way.
+    assert render("jobs", *CAPTURE_ARGS, "--delta-inputs", "--jobs", "3") == (readable, simplified)
+    assert render("range", *CAPTURE_ARGS, "--delta-inputs", "--jobs", "2", "--calls", "5-12")[0].endswith(
+        "".join(sections[i] for i in range(5, CAPTURE_CALLS + 1))
+    )
+
+
+def test_follow_with_delta_inputs(capture: Path, render: Render, spawn_formatter: SpawnFormatter) -> None:
+    readable, simplified = render("delta", *CAPTURE_ARGS, "--delta-inputs")
+    proc = spawn_formatter(*CAPTURE_ARGS, *FOLLOW_ARGS, "--delta-inputs")
+    wait_for(capture / "f.r.md", f"### GPT Call #{CAPTURE_CALLS}\n")
+    stop(proc)
+    assert call_sections((capture / "f.r.md").read_text(encoding="utf-8-sig")) == call_sections(readable)
+    assert (capture / "f.s.md").read_text(encoding="utf-8-sig") == simplified
+
+
+# --- Content-addressed archive (--compact/--expand) ----------------------------------------------
+
+
+def test_compact_expand_round_trips_byte_for_byte(capture: Path, run_formatter: RunFormatter) -> None:
+    original = (capture / "requests.jsonl").read_bytes()
+    run_formatter("--requests", "requests.jsonl", "--compact", "requests.cca")
+    run_formatter("--requests", "requests.cca", "--expand", "expanded.jsonl")
+    assert (capture / "expanded.jsonl").read_bytes() == original
+    # Every request repeats its conversation's history; the archive stores each item once.
+    assert (capture / "requests.cca").stat().st_size < len(original) * 0.7
+
+    odd = (
+        b'{ "ts_ms" : 1, "request": {"instructions": "caf\\u00e9", "input": [ {"a": 1} , {"a": 1}]}}\r\n'
+        b"\n"
+        b"not json\n"
+        b'{"ts_ms": 2, "request": {"instructions": "caf\\u00e9", "tools": [], "input": [{"a": 1}]}}'
+    )
+    (capture / "odd.jsonl").write_bytes(odd)
+    run_formatter("--requests", "odd.jsonl", "--compact", "odd.cca")
+    run_formatter("--requests", "odd.cca", "--expand", "odd.expanded.jsonl")
+    assert (capture / "odd.expanded.jsonl").read_bytes() == odd
+
+
+def test_archive_renders_like_the_capture(capture: Path, run_formatter: RunFormatter, render: Render) -> None:
+    run_formatter("--requests", "requests.jsonl", "--compact", "requests.cca")
+    archive_args = ("--requests", "requests.cca", "--events", "events.jsonl")
+    base_readable, base_simplified = baseline()
+    readable, simplified = render("archive", *archive_args, "--latency-report", "archive-lat")
+    assert f"- requests: `requests.cca` ({CAPTURE_CALLS} lines," in readable
+    assert call_sections(readable) == call_sections(base_readable) and simplified == base_simplified
+    readable, simplified = render("archive-jobs", *archive_args, "--jobs", "3", "--calls", "2-12")
+    assert call_sections(readable) == {i: s for i, s in call_sections(base_readable).items() if i >= 2}
+    run_formatter(*CAPTURE_ARGS, "--latency-report", "lat")
+    assert load_report(capture, "archive-lat") == load_report(capture, "lat")
+
+
+def test_compact_rejects_an_archive(run_formatter: RunFormatter) -> None:
+    run_formatter("--requests", "requests.jsonl", "--compact", "requests.cca")
+    result = run_formatter("--requests", "requests.cca", "--compact", "again.cca", check=False)
+    assert result.returncode == 2 and "already an archive" in result.stderr
+
+
+# --- Compressed captures -------------------------------------------------------------------------
+
+
+def compress_zstd(path: Path) -> Path:
+    try:
+        import zstandard
+    except ImportError:
+        if shutil.which("zstd") is None:
+            pytest.skip("needs the zstandard package or the zstd CLI")
+        subprocess.run(["zstd", "-q", "--rm", str(path)], check=True)
+    else:
+        path.with_name(path.name + ".zst").write_bytes(zstandard.ZstdCompressor().compress(path.read_bytes()))
+        path.unlink()
+    return path.with_name(path.name + ".zst")
+
+
+def test_compressed_captures_render_like_plain_ones(capture: Path, run_formatter: RunFormatter, render: Render) -> None:
+    run_formatter(*CAPTURE_ARGS, "--latency-report", "plain-lat")
+    (capture / "requests.jsonl.gz").write_bytes(gzip.compress((capture / "requests.jsonl").read_bytes()))
+    compress_zstd(capture / "events.jsonl")
+    args = ("--requests", "requests.jsonl.gz", "--events", "events.jsonl.zst")
+    base_readable, base_simplified = baseline()
+    readable, simplified = render("compressed", *args, "--latency-report", "lat")
+    assert f"- requests: `requests.jsonl.gz` ({CAPTURE_CALLS} lines," in readable
+    assert call_sections(readable) == call_sections(base_readable) and simplified == base_simplified
+    assert load_report(capture, "lat") == load_report(capture, "plain-lat")
+    # The index, --calls and --jobs read byte ranges back through the decompressing reader.
+    readable, _simplified = render("jobs", *args, "--jobs", "3", "--calls", "4-11")
+    assert call_sections(readable) == {i: s for i, s in call_sections(base_readable).items() if 4 <= i <= 11}
+    assert (capture / "requests.jsonl.gz.idx.json").exists()
+
+
+def test_short_compressed_capture_is_detected_by_extension(capture: Path, render: Render) -> None:
+    (capture / "empty.jsonl.gz").write_bytes(b"")
+    readable, _simplified = render("empty", "--requests", "empty.jsonl.gz")
+    assert "- requests: `empty.jsonl.gz` (0 lines, 0 bytes)" in readable and "GPT Call" not in readable
+
+
+def test_follow_reads_appended_gzip_members(capture: Path, spawn_formatter: SpawnFormatter) -> None:
+    requests = (capture / "requests.jsonl").read_bytes().splitlines(keepends=True)
+    events = (capture / "events.jsonl").read_bytes().splitlines(keepends=True)
+    third_completed = [i for i, line in enumerate(events) if b'"Completed"' in line][2]
+    (capture / "requests.jsonl.gz").write_bytes(gzip.compress(b"".join(requests[:3])))
+    (capture / "events.jsonl.gz").write_bytes(gzip.compress(b"".join(events[: third_completed + 1])))
+    proc = spawn_formatter("--requests", "requests.jsonl.gz", "--events", "events.jsonl.gz", *FOLLOW_ARGS)
+    wait_for(capture / "f.r.md", "### GPT Call #3\n")
+    with (capture / "requests.jsonl.gz").open("ab") as f:
+        f.write(gzip.compress(b"".join(requests[3:])))
+    with (capture / "events.jsonl.gz").open("ab") as f:
+        f.write(gzip.compress(b"".join(events[third_completed + 1 :])))
+    wait_for(capture / "f.r.md", f"### GPT Call #{CAPTURE_CALLS}\n")
+    stop(proc)
+    assert call_sections((capture / "f.r.md").read_text(encoding="utf-8-sig")) == call_sections(baseline()[0])
+
+
+# --- Selective event decoding --------------------------------------------------------------------
+
+
+def full_summaries(events: Path) -> list[dict[str, Any]]:
+    """Segment summaries from fully decoded rows, the reference for the selective decoder."""
+    summaries, cur = [], []
+    for row in cc.iter_jsonl(events):
+        cur.append(row)
+        if cc.parse_event_obj(row.get("event"))[0] == "Completed":
+            summaries.append(cc.summarize_event_segment(cur))
+            cur = []
+    if cur:
+        summaries.append(cc.summarize_event_segment(cur))
+    return summaries
+
+
+def selective_summaries(events: Path) -> list[dict[str, Any]]:
+    return [seg.summary() for seg in cc.iter_event_segments(cc.iter_capture_lines(events))]
+
+
+def test_selective_decoding_matches_full_decoding(capture: Path, tmp_path: Path) -> None:
+    assert selective_summaries(capture / "events.jsonl") == full_summaries(capture / "events.jsonl")
+    generated = tmp_path / "generated"
+    generated.mkdir()
+    _requests, events = generate_capture(generated, CaptureSpec(calls=24, deltas=20, seed=3))
+    summaries = selective_summaries(events)
+    assert len(summaries) == 24 and summaries == full_summaries(events)
+
+
+def test_rows_off_the_canonical_layout_are_decoded_in_full(capture: Path, render: Render) -> None:
+    # Other separators and key orders miss the byte-prefix fast path and go through json.loads.
+    lines = (capture / "events.jsonl").read_text(encoding="utf-8").splitlines()
+    reordered = [json.dumps(dict(reversed(list(json.loads(line).items())))) for line in lines]
+    error = json.dumps({"ts_ms": json.loads(lines[2])["ts_ms"], "event": {"Error": "stream closed"}})
+    rewritten = "\n".join([*reordered[:3], error, *reordered[3:]]) + "\n"
+    (capture / "events.jsonl").write_text(rewritten, encoding="utf-8")
+    assert selective_summaries(capture / "events.jsonl") == full_summaries(capture / "events.jsonl")
+    readable, simplified = render("reordered", *CAPTURE_ARGS)
+    base_readable, base_simplified = baseline()
+    assert simplified == base_simplified
+    sections, base_sections = call_sections(readable), call_sections(base_readable)
+    assert "`Error`=1" in sections.pop(1) and sections == {i: s for i, s in base_sections.items() if i != 1}
+
+
+# --- Chrome trace export (--trace) ---------------------------------------------------------------
+
+
+def test_trace_export(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--trace", "trace.json", "--tool-report", "tools")
+    events = json.loads((capture / "trace.json").read_text(encoding="utf-8"))["traceEvents"]
+    calls = capture_calls(capture)
+    pids = {e["args"]["name"]: e["pid"] for e in events if e["name"] == "process_name"}
+    assert set(pids) == {f"conversation {req_row['conversation_id']}" for req_row, _seg in calls}
+
+    spans = {e["args"]["call"]: e for e in events if e.get("cat") == "call"}
+    assert sorted(spans) == list(range(1, CAPTURE_CALLS + 1))
+    for i, (req_row, seg) in enumerate(calls, start=1):
+        completed = next(r for r in seg if event_name(r) == "Completed")
+        span = spans[i]
+        assert span["pid"] == pids[f"conversation {req_row['conversation_id']}"]
+        assert (span["ts"], span["dur"]) == (req_row["ts_ms"] * 1000, (completed["ts_ms"] - req_row["ts_ms"]) * 1000)
+        items = [e for e in events if e["name"].startswith("OutputItemDone") and e["args"]["call"] == i]
+        assert len(items) == sum(1 for r in seg if event_name(r) == "OutputItemDone")
+
+    # Tool spans run from emission to the request carrying the output, as in the tool report.
+    tool_spans: dict[str, list[int]] = {}
+    for e in events:
+        if e.get("cat") == "tool":
+            tool_spans.setdefault(e["name"], []).append(e["dur"] // 1000)
+    report = load_report(capture, "tools")[0]
+    assert {tool: (len(d), sum(d), max(d)) for tool, d in tool_spans.items()} == {
+        tool: (t["count"], t["total_ms"], t["max"]) for tool, t in report["tools"].items()
+    }
+
+
+def test_trace_export_across_rendering_modes(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--trace", "serial.json")
+    run_formatter(*CAPTURE_ARGS, *OUT_ARGS, "--jobs", "3", "--trace", "jobs.json")
+    assert (capture / "jobs.json").read_bytes() == (capture / "serial.json").read_bytes()
+    run_formatter(*CAPTURE_ARGS, "--calls", "3-4", "--trace", "slice.json")
+    events = json.loads((capture / "slice.json").read_text(encoding="utf-8"))["traceEvents"]
+    assert sorted(e["args"]["call"] for e in events if e.get("cat") == "call") == [3, 4]
+    run_formatter("--requests", "missing.jsonl", "--trace", "empty.json")
+    empty = json.loads((capture / "empty.json").read_text(encoding="utf-8"))
+    assert empty == {"displayTimeUnit": "ms", "traceEvents": []}
+
+
+# --- Call filter (--where) -----------------------------------------------------------------------
+
+
+def emitted_tools(seg: list[dict[str, Any]]) -> set[str]:
+    tools = set()
+    for row in seg:
+        item = row["event"].get("OutputItemDone") if isinstance(row["event"], dict) else None
+        if item and item["type"] in ("function_call", "custom_tool_call"):
+            tools.add(item["name"])
+        elif item and item["type"] == "web_search_call":
+            tools.add("web_search")
+    return tools
+
+
+def call_duration_ms(req_row: dict[str, Any], seg: list[dict[str, Any]]) -> int:
+    return next(r["ts_ms"] for r in seg if event_name(r) == "Completed") - req_row["ts_ms"]
+
+
+def test_where_selects_calls(capture: Path, render: Render) -> None:
+    calls = list(enumerate(capture_calls(capture), start=1))
+    conversation = calls[1][1][0]["conversation_id"]
+    durations = sorted(call_duration_ms(req_row, seg) for _i, (req_row, seg) in calls)
+    median = durations[len(durations) // 2]
+    split_ts = calls[5][1][0]["ts_ms"]
+    cases = {
+        "tool=apply_patch": lambda req_row, seg: "apply_patch" in emitted_tools(seg),
+        "tool=web_search|tool_0": lambda req_row, seg: bool(emitted_tools(seg) & {"web_search", "tool_0"}),
+        f"conv={conversation[:8]}* and event=OutputItemAdded": lambda req_row, seg: (
+            req_row["conversation_id"].startswith(conversation[:8])
+            and any(event_name(r) == "OutputItemAdded" for r in seg)
+        ),
+        f"duration>={median}ms": lambda req_row, seg: call_duration_ms(req_row, seg) >= median,
+        f"ts<{split_ts} and conversation_id!={conversation}": lambda req_row, seg: (
+            req_row["ts_ms"] < split_ts and req_row["conversation_id"] != conversation
+        ),
+        "model!=gpt-5.1-codex": lambda req_row, seg: False,
+    }
+    base_sections = call_sections(baseline()[0])
+    for n, (where, keep) in enumerate(cases.items()):
+        expected = [i for i, (req_row, seg) in calls if keep(req_row, seg)]
+        assert len(expected) < CAPTURE_CALLS and (expected or where.startswith("model")), where
+        readable, simplified = render(f"where{n}", *CAPTURE_ARGS, "--where", where)
+        assert list(call_sections(readable)) == expected, where
+        assert list(call_sections(simplified, "##")) == expected, where
+        assert call_sections(readable) == {i: base_sections[i] for i in expected}
+        assert "- filter: `" in readable
+
+
+def test_where_is_the_same_in_every_mode(capture: Path, render: Render, spawn_formatter: SpawnFormatter) -> None:
+    where = ("--where", "tool=apply_patch|tool_1", "--where", "duration>=1s")
+    serial = render("serial", *CAPTURE_ARGS, *where, "--delta-inputs", "--latency-report", "serial")
+    assert render("jobs", *CAPTURE_ARGS, *where, "--delta-inputs", "--jobs", "3", "--latency-report", "jobs") == serial
+    assert load_report(capture, "jobs") == load_report(capture, "serial")
+    assert [c["call"] for c in load_report(capture, "serial")[0]["calls"]] == list(call_sections(serial[0]))
+    last = max(call_sections(serial[0]))
+    proc = spawn_formatter(*CAPTURE_ARGS, *FOLLOW_ARGS, *where, "--delta-inputs")
+    wait_for(capture / "f.r.md", f"### GPT Call #{last}\n")
+    stop(proc)
+    assert call_sections((capture / "f.r.md").read_text(encoding="utf-8-sig")) == call_sections(serial[0])
+    assert (capture / "f.s.md").read_text(encoding="utf-8-sig") == serial[1]
+
+
+def test_where_rejects_bad_expressions(run_formatter: RunFormatter) -> None:
+    for where in ("color=red", "tool>apply_patch", "duration>=soon", "ts=yesterday", "model"):
+        result = run_formatter(*CAPTURE_ARGS, *OUT_ARGS, "--where", where, check=False)
+        assert result.returncode == 2 and "--where" in result.stderr, where
+
+
+# --- Per-conversation join (--join conversation) -------------------------------------------------
+
+
+JOIN_ARGS = ("--join", "conversation")
+
+
+def test_join_groups_the_capture_by_conversation(capture: Path, render: Render) -> None:
+    readable, simplified = render("joined", *CAPTURE_ARGS, *JOIN_ARGS)
+    calls = capture_calls(capture)
+    conversations = list(dict.fromkeys(req_row["conversation_id"] for req_row, _seg in calls))
+    headings = re.findall(r"^## Conversation `(.*)`\n- calls: (\d+)", readable, re.M)
+    assert headings == [(c, str(sum(1 for r, _ in calls if r["conversation_id"] == c))) for c in conversations]
+    assert f"- requests: `requests.jsonl` ({CAPTURE_CALLS} lines," in readable
+    # The test capture is well formed, so each call pairs exactly as it does positionally.
+    base_readable, base_simplified = baseline()
+    assert call_sections(readable) == call_sections(base_readable)
+    assert call_sections(simplified, "##") == call_sections(base_simplified, "##")
+    for conversation in conversations:
+        block = readable.split(f"## Conversation `{conversation}`")[1].split("## Conversation")[0]
+        assert all(calls[i - 1][0]["conversation_id"] == conversation for i in call_sections(block))
+
+
+def test_join_pairs_interleaved_and_broken_streams(capture: Path, render: Render) -> None:
+    def request(ts: int, conv: str, text: str) -> dict[str, Any]:
+        return {"ts_ms": ts, "conversation_id": conv, "request": {"model": "m", "input": [message(text)]}}
+
+    def event(ts: int, conv: str, payload: Any) -> dict[str, Any]:
+        return {"ts_ms": ts, "conversation_id": conv, "event": payload}
+
+    def completed(response_id: str) -> dict[str, Any]:
+        return {"Completed": {"response_id": response_id, "token_usage": None}}
+
+    requests = [request(1_000, "a", "first a"), request(1_100, "b", "first b"), request(2_000, "a", "retry a")]
+    events = [
+        event(1_050, "a", "Created"),
+        event(1_150, "b", "Created"),
+        # b completes while a is still streaming: positional pairing would give b's response to a.
+        event(1_300, "b", completed("resp_b")),
+        event(1_400, "a", {"OutputTextDelta": "partial"}),
+        # a's stream breaks; its retry opens a new call.
+        event(2_050, "a", "Created"),
+        event(2_400, "a", completed("resp_a")),
+    ]
+    (capture / "t.requests.jsonl").write_text("".join(json.dumps(r) + "\n" for r in requests), encoding="utf-8")
+    (capture / "t.events.jsonl").write_text("".join(json.dumps(r) + "\n" for r in events), encoding="utf-8")
+    readable, _simplified = render("joined", "--requests", "t.requests.jsonl", "--events", "t.events.jsonl", *JOIN_ARGS)
+    sections = call_sections(readable)
+    assert "first a" in sections[1] and "partial" in sections[1] and "resp_" not in sections[1]
+    assert "first b" in sections[2] and "resp_b" in sections[2]
+    assert "retry a" in sections[3] and "resp_a" in sections[3]
+    headings = re.findall(r"^## Conversation `(.*)`\n- calls: (\d+)", readable, re.M)
+    assert headings == [("a", "2"), ("b", "1")]
+    assert readable.index("### GPT Call #3") < readable.index("## Conversation `b`")
+
+
+def test_join_with_filters_and_reports(capture: Path, run_formatter: RunFormatter, render: Render) -> None:
+    readable, _simplified = render("joined", *CAPTURE_ARGS, *JOIN_ARGS, "--where", "tool=apply_patch")
+    plain_readable, _plain_simplified = render("plain", *CAPTURE_ARGS, "--where", "tool=apply_patch")
+    assert call_sections(readable) == call_sections(plain_readable)
+    run_formatter(*CAPTURE_ARGS, *JOIN_ARGS, "--latency-report", "joined")
+    run_formatter(*CAPTURE_ARGS, "--latency-report", "plain")
+    joined_calls = load_report(capture, "joined")[0]["calls"]
+    assert sorted(joined_calls, key=lambda c: c["call"]) == load_report(capture, "plain")[0]["calls"]
+    for args in (("--jobs", "2"), ("--call", "1"), ("--follow",)):
+        result = run_formatter(*CAPTURE_ARGS, *JOIN_ARGS, *args, *OUT_ARGS, check=False)
+        assert result.returncode == 2 and "--join conversation cannot" in result.stderr
+
+
+# --- Fleet aggregation (--fleet) -----------------------------------------------------------------
+
+
+def capture_tokens(events: Path) -> dict[str, int]:
+    totals = dict.fromkeys(cc.TOKEN_KEYS, 0)
+    for line in cc.iter_capture_lines(events):
+        row = json.loads(line)
+        if isinstance(row["event"], dict) and "Completed" in row["event"]:
+            for key in totals:
+                totals[key] += row["event"]["Completed"]["token_usage"][key]
+    return totals
+
+
+@pytest.fixture
+def fleet(capture: Path) -> list[Path]:
+    """Three runs: the test capture, the same capture gzip-compressed under job names, and a generated one."""
+    runs = [capture / "ci" / "job-1", capture / "ci" / "job-2", capture / "ci" / "job-3"]
+    runs[0].mkdir(parents=True)
+    shutil.copyfile(capture / "requests.jsonl", runs[0] / "requests.jsonl")
+    shutil.copyfile(capture / "events.jsonl", runs[0] / "events.jsonl")
+    runs[1].mkdir()
+    for name in ("requests", "events"):
+        with gzip.open(runs[1] / f"capture_{name}.jsonl.gz", "wb") as out:
+            out.write((capture / f"{name}.jsonl").read_bytes())
+    generate_capture(runs[2], CaptureSpec(calls=30, deltas=5, seed=7))
+    (runs[2] / "notes.txt").write_text("not a capture\n", encoding="utf-8")
+    return runs
+
+
+def test_fleet_aggregates_every_run(capture: Path, run_formatter: RunFormatter, fleet: list[Path]) -> None:
+    run_formatter("--fleet", "ci", "--fleet-report", "fleet")
+    data, md = load_report(capture, "fleet")
+    assert data["files"] == 3 and [c["calls"] for c in data["captures"]] == [CAPTURE_CALLS, CAPTURE_CALLS, 30]
+    assert data["calls"] == data["requests"] == data["completed"] == 2 * CAPTURE_CALLS + 30
+    expected = capture_tokens(capture / "events.jsonl")
+    generated = capture_tokens(fleet[2] / "events.jsonl")
+    assert data["tokens"] == {key: 2 * expected[key] + generated[key] for key in cc.TOKEN_KEYS}
+    assert sum(m["calls"] for m in data["models"]) == data["calls"]
+    assert sum(m["requests"] for m in data["timeline"]["requests_per_minute"]) == data["requests"]
+    assert data["latency"]["request_to_completed_ms"]["count"] == data["completed"]
+    assert data["timeline"]["rows"] == sum(
+        sum(1 for _line in cc.iter_capture_lines(path)) for run in fleet for path in run.glob("*s.jsonl*")
+    )
+    # Per-run reports merge into the fleet totals: counts add up and the fleet max is the largest max.
+    parts = []
+    for i, run in enumerate(fleet):
+        run_formatter("--fleet", str(run.relative_to(capture)), "--fleet-report", f"part{i}")
+        parts.append(load_report(capture, f"part{i}")[0])
+    part_tools = [{t["tool"]: t["calls"] for t in p["tools"]} for p in parts]
+    assert {t["tool"]: t["calls"] for t in data["tools"]} == {
+        tool: sum(counts.get(tool, 0) for counts in part_tools) for tool in set().union(*part_tools)
+    }
+    latency = data["latency"]["request_to_completed_ms"]
+    assert latency["max"] == max(p["latency"]["request_to_completed_ms"]["max"] for p in parts)
+    assert "# Codex Fleet Report" in md and "- capture pairs: `3`" in md
+
+
+def test_fleet_timeline_and_jobs(capture: Path, run_formatter: RunFormatter) -> None:
+    def run(directory: str, rows: list[tuple[int, str, Any]]) -> None:
+        (capture / directory).mkdir()
+        requests = [
+            {"ts_ms": ts, "conversation_id": conv, "request": {"model": "m"}} for ts, conv, ev in rows if ev is None
+        ]
+        events = [{"ts_ms": ts, "conversation_id": conv, "event": ev} for ts, conv, ev in rows if ev is not None]
+        for name, data in (("requests", requests), ("events", events)):
+            text = "".join(json.dumps(row) + "\n" for row in data)
+            (capture / directory / f"{name}.jsonl").write_text(text, encoding="utf-8")
+
+    completed = {"Completed": {"response_id": "r", "token_usage": None}}
+    # Two runs whose calls overlap at 61_500: three calls are in flight at once across the fleet.
+    run("a", [(60_000, "x", None), (60_100, "x", "Created"), (61_900, "x", completed), (62_000, "x", None)])
+    run("b", [(61_000, "y", None), (61_200, "z", None), (61_800, "y", completed), (130_000, "z", completed)])
+    run_formatter("--fleet", "a", "--fleet", "b", "--fleet-report", "serial")
+    run_formatter("--fleet", "a", "--fleet", "b", "--fleet-report", "parallel", "--jobs", "2")
+    serial, serial_md = load_report(capture, "serial")
+    assert load_report(capture, "parallel") == (serial, serial_md)
+    timeline = serial["timeline"]
+    assert (timeline["peak_in_flight_calls"], timeline["peak_in_flight_ts_ms"]) == (3, 61_200)
+    assert timeline["requests_per_minute"] == [{"minute_ts_ms": 60_000, "requests": 4}]
+    assert serial["latency"]["request_to_completed_ms"]["max"] == 130_000 - 61_200
+
+
+def test_fleet_rejects_bad_arguments(run_formatter: RunFormatter) -> None:
+    for args, message in (
+        (("--fleet", "."), "--fleet requires --fleet-report"),
+        (("--fleet", ".", "--fleet-report", "f", *CAPTURE_ARGS), "--fleet replaces --requests/--events"),
+        (("--fleet", "missing", "--fleet-report", "f"), "--fleet matched no"),
+        (("--fleet-report", "f", *CAPTURE_ARGS), "--fleet-report requires --fleet"),
+    ):
+        result = run_formatter(*args, check=False)
+        assert result.returncode == 2 and message in result.stderr
+
+
+# --- SQLite export (--sqlite) --------------------------------------------------------------------
+
+
+def sqlite_tables(db: Path) -> dict[str, list[tuple[Any, ...]]]:
+    with sqlite3.connect(db) as conn:
+        return {
+            table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+            for table in ("calls", "input_items", "output_items", "tool_calls", "usage")
+        }
+
+
+def test_sqlite_loads_normalized_tables(capture: Path, run_formatter: RunFormatter) -> None:
+    result = run_formatter(*CAPTURE_ARGS, "--sqlite", "capture.db")
+    assert "loaded 12 requests and 12 event segments" in result.stdout
+    requests = list(cc.iter_jsonl(capture / "requests.jsonl"))
+    tables = sqlite_tables(capture / "capture.db")
+    assert [(c[0], c[1], c[2], c[3]) for c in tables["calls"]] == [
+        (i, r["conversation_id"], r["ts_ms"], r["request"]["model"]) for i, r in enumerate(requests, start=1)
+    ]
+    assert len(tables["input_items"]) == sum(len(r["request"]["input"]) for r in requests)
+    with sqlite3.connect(capture / "capture.db") as conn:
+        totals = conn.execute(f"SELECT {', '.join(f'sum({key})' for key in cc.TOKEN_KEYS)} FROM usage").fetchone()
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        # The tool-call name index serves per-tool queries.
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT count(*) FROM tool_calls WHERE name = 'web_search'").fetchall()
+    assert dict(zip(cc.TOKEN_KEYS, totals)) == capture_tokens(capture / "events.jsonl")
+    tools = Counter(
+        name for call in cc.iter_calls(capture / "requests.jsonl", capture / "events.jsonl")
+        for name in map(cc.tool_call_name, call.output_items()) if name is not None
+    )
+    assert Counter(t[2] for t in tables["tool_calls"]) == tools
+    assert {"calls_conversation_id", "calls_ts_ms", "tool_calls_name", "tool_calls_call_id"} <= indexes
+    assert "tool_calls_name" in str(plan)
+
+
+def test_sqlite_appends_only_new_calls(capture: Path, run_formatter: RunFormatter) -> None:
+    requests = (capture / "requests.jsonl").read_bytes().splitlines(keepends=True)
+    events = (capture / "events.jsonl").read_bytes().splitlines(keepends=True)
+    completed = [i for i, line in enumerate(events) if b'"Completed"' in line]
+    # Eight requests, seven closed segments, the eighth still streaming and a partial trailing line.
+    (capture / "requests.jsonl").write_bytes(b"".join(requests[:8]))
+    (capture / "events.jsonl").write_bytes(b"".join(events[: completed[6] + 3]) + events[completed[6] + 3][:20])
+    result = run_formatter(*CAPTURE_ARGS, "--sqlite", "grown.db")
+    assert "loaded 8 requests and 7 event segments" in result.stdout
+    (capture / "requests.jsonl").write_bytes(b"".join(requests))
+    (capture / "events.jsonl").write_bytes(b"".join(events))
+    result = run_formatter(*CAPTURE_ARGS, "--sqlite", "grown.db")
+    assert "loaded 4 requests and 5 event segments" in result.stdout and "reloaded" not in result.stdout
+    assert "loaded 0 requests and 0 event segments" in run_formatter(*CAPTURE_ARGS, "--sqlite", "grown.db").stdout
+    run_formatter(*CAPTURE_ARGS, "--sqlite", "fresh.db")
+    assert sqlite_tables(capture / "grown.db") == sqlite_tables(capture / "fresh.db")
+
+
+def test_sqlite_reloads_a_replaced_capture(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--sqlite", "capture.db")
+    requests = (capture / "requests.jsonl").read_bytes().splitlines(keepends=True)
+    (capture / "requests.jsonl").write_bytes(b"".join(requests[:3]))
+    result = run_formatter(*CAPTURE_ARGS, "--sqlite", "capture.db")
+    assert "loaded 3 requests and 12 event segments" in result.stdout and "reloaded from scratch" in result.stdout
+    calls = sqlite_tables(capture / "capture.db")["calls"]
+    assert len(calls) == CAPTURE_CALLS and [c[3] is not None for c in calls] == [True] * 3 + [False] * 9
+
+
+def test_sqlite_rejects_other_modes(run_formatter: RunFormatter) -> None:
+    for args in (OUT_ARGS, ("--where", "tool=*"), ("--join", "conversation"), ("--latency-report", "lat")):
+        result = run_formatter(*CAPTURE_ARGS, "--sqlite", "capture.db", *args, check=False)
+        assert result.returncode == 2 and "--sqlite loads every call" in result.stderr
+
+
+# --- Paged readable output (--page-size) ---------------------------------------------------------
+
+
+def test_page_size_splits_the_readable_view(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--out-readable", "pages", "--out-simplified", "s.md", "--page-size", "5")
+    pages = sorted(p.name for p in (capture / "pages").iterdir())
+    assert pages == ["0001.md", "0002.md", "0003.md", "index.md"]
+    sections: dict[int, str] = {}
+    for name in pages[:-1]:
+        page = call_sections((capture / "pages" / name).read_text(encoding="utf-8-sig"))
+        assert len(page) == (5 if name != "0003.md" else 2)
+        sections.update(page)
+    assert sections == call_sections(baseline()[0])
+    assert (capture / "s.md").read_text(encoding="utf-8-sig") == baseline()[1]
+    index = (capture / "pages" / "index.md").read_text(encoding="utf-8-sig")
+    assert f"(12 lines, {(capture / 'requests.jsonl').stat().st_size} bytes)" in index
+    links = re.findall(r"^\| \[#(\d+)\]\((\d{4})\.md#gpt-call-(\d+)\)", index, re.M)
+    assert [(int(call), int(page)) for call, page, _anchor in links] == [(i, (i - 1) // 5 + 1) for i in range(1, 13)]
+
+
+def test_page_size_removes_stale_pages(capture: Path, run_formatter: RunFormatter) -> None:
+    run_formatter(*CAPTURE_ARGS, "--out-readable", "pages", "--out-simplified", "s.md", "--page-size", "2")
+    (capture / "pages" / "notes.md").write_text("kept\n", encoding="utf-8")
+    run_formatter(
+        *CAPTURE_ARGS, "--calls", "3-4", "--out-readable", "pages", "--out-simplified", "s.md", "--page-size", "5"
+    )
+    assert sorted(p.name for p in (capture / "pages").iterdir()) == ["0001.md", "index.md", "notes.md"]
+    assert sorted(call_sections((capture / "pages" / "0001.md").read_text(encoding="utf-8-sig"))) == [3, 4]
+
+
+def test_page_size_is_validated(run_formatter: RunFormatter) -> None:
+    for args, message in (
+        (("--page-size", "0", *OUT_ARGS), "--page-size must be >= 1"),
+        (("--page-size", "5", "--latency-report", "lat"), "--page-size requires --out-readable"),
+        (("--page-size", "5", "--jobs", "2", *OUT_ARGS), "cannot be combined with --jobs"),
+        (("--page-size", "5", "--join", "conversation", *OUT_ARGS), "cannot be combined with --jobs"),
+    ):
+        result = run_formatter(*CAPTURE_ARGS, *args, check=False)
+        assert result.returncode == 2 and message in result.stderr